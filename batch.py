@@ -0,0 +1,269 @@
+"""Turkeller Surfer Pro — başsız toplu analiz.
+
+Örnek:
+    CDSE_CLIENT_ID=... CDSE_CLIENT_SECRET=... \\
+    python batch.py noktalar.csv --out sonuc.jsonl --cap 50 --res 120 --thr 2.8 --topn 3
+
+Girdi: CSV (lat,lon[,name] ya da coord sütunu "40.10 27.76") veya GeoJSON (Point).
+Çıktı: her nokta bittikçe bir JSONL satırı (ya da Parquet, anomali başına satır)
+ve sonunda tüm noktalar üzerinden global TopN.
+"""
+import argparse
+import csv
+import functools
+import heapq
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from utils.analysis import bbox_from_latlon, parse_coord_pair, run_analysis_from_array
+
+def read_points(path: str):
+    # CSV: lat/lon (veya latitude/longitude) ya da tek "coord" sütunu; GeoJSON: Point/MultiPoint
+    if path.lower().endswith((".geojson", ".json")):
+        with open(path, "r", encoding="utf-8") as f:
+            gj = json.load(f)
+        feats = gj.get("features", [gj]) if isinstance(gj, dict) else []
+        for i, ft in enumerate(feats):
+            geom = (ft or {}).get("geometry") or {}
+            props = (ft or {}).get("properties") or {}
+            coords = []
+            if geom.get("type") == "Point":
+                coords = [geom.get("coordinates")]
+            elif geom.get("type") == "MultiPoint":
+                coords = geom.get("coordinates") or []
+            for j, c in enumerate(coords):
+                if c and len(c) >= 2:
+                    name = props.get("name") or f"{i + 1}" + (f".{j + 1}" if len(coords) > 1 else "")
+                    yield {"name": str(name), "lat": float(c[1]), "lon": float(c[0])}
+        return
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for i, row in enumerate(csv.DictReader(f), start=1):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            lat = row.get("lat") or row.get("latitude")
+            lon = row.get("lon") or row.get("longitude")
+            if lat and lon:
+                try:
+                    lat, lon = float(lat.replace(",", ".")), float(lon.replace(",", "."))
+                except ValueError:
+                    lat, lon = None, None
+            else:
+                lat, lon = parse_coord_pair(row.get("coord", ""))
+            if lat is None or lon is None:
+                print(f"[atla] satır {i}: koordinat okunamadı", file=sys.stderr)
+                continue
+            yield {"name": row.get("name") or str(i), "lat": lat, "lon": lon}
+
+def analyse_point(point: dict, Z, bbox: list[float], params: dict):
+    # işçi sürecinde çalışır; geri yalnız küçük sonuç döner (raster değil)
+    r = run_analysis_from_array(Z, bbox, **params)
+    return {
+        "name": point["name"],
+        "lat": point["lat"],
+        "lon": point["lon"],
+        "bbox": bbox,
+        "n_components": int(len(r.components)),
+        "top": r.ranked,
+    }
+
+class GlobalTop:
+    # sınırlı min-heap: tüm noktalar üzerinden en yüksek skorlu N anomali
+    def __init__(self, n: int):
+        self.n = int(n)
+        self._heap = []
+        self._seq = itertools.count()
+
+    def add(self, point: dict, t: dict):
+        item = (t["score"], next(self._seq), {"name": point["name"], "scan_lat": point["lat"], "scan_lon": point["lon"], **t})
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, item)
+        elif item[0] > self._heap[0][0]:
+            heapq.heappushpop(self._heap, item)
+
+    def result(self):
+        return [it[2] for it in sorted(self._heap, key=lambda it: (-it[0], it[1]))]
+
+class JsonlSink:
+    def __init__(self, path: str):
+        self._f = open(path, "w", encoding="utf-8")
+
+    def write(self, rec: dict):
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+class ParquetSink:
+    # anomali başına satır; küçük row-group'larla akış halinde yazılır
+    def __init__(self, path: str, rows_per_group: int = 1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet çıktısı için pyarrow gerekli (pip install pyarrow).") from e
+        self._pa, self._pq = pa, pq
+        self._path = path
+        self._writer = None
+        self._rows = []
+        self._per = int(rows_per_group)
+
+    def write(self, rec: dict):
+        base = {"name": rec["name"], "scan_lat": rec["lat"], "scan_lon": rec["lon"], "error": rec.get("error")}
+        tops = rec.get("top") or [None]
+        for rank, t in enumerate(tops, start=1):
+            row = dict(base, rank=rank if t else None)
+            for k in ("type", "score", "peak_z", "area", "fill", "target_lat", "target_lon", "rel_depth"):
+                row[k] = t.get(k) if t else None
+            self._rows.append(row)
+        if len(self._rows) >= self._per:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+def run_batch(points, *, token, fetch, cap_m: float, res: int, params: dict, sink, global_top: GlobalTop,
+              fetch_workers: int = 4, workers: int | None = None, progress=None):
+    # çekim (I/O) iş parçacıklarında, analiz (CPU) süreç havuzunda; iki aşama da sınırlı kuyruklu
+    # token: str ya da gece boyu süren işlerde süresi dolmasın diye her çekimde çağrılan fonksiyon
+    get_token = token if callable(token) else (lambda: token)
+    points = iter(points)
+    max_fetch = max(1, int(fetch_workers))
+    workers = workers or os.cpu_count() or 1
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=max_fetch) as fex, ProcessPoolExecutor(max_workers=workers) as pex:
+        fetching, analysing = {}, {}
+
+        def feed():
+            while len(fetching) < 2 * max_fetch and len(analysing) < 2 * workers:
+                p = next(points, None)
+                if p is None:
+                    return
+                bbox = bbox_from_latlon(p["lat"], p["lon"], cap_m)
+                fetching[fex.submit(fetch, get_token(), bbox, res, res)] = (p, bbox)
+
+        feed()
+        while fetching or analysing:
+            ready, _ = wait(list(fetching) + list(analysing), return_when=FIRST_COMPLETED)
+            for fut in ready:
+                if fut in fetching:
+                    p, bbox = fetching.pop(fut)
+                    try:
+                        Z = fut.result()
+                    except Exception as e:
+                        rec = {"name": p["name"], "lat": p["lat"], "lon": p["lon"], "error": str(e)}
+                        sink.write(rec)
+                        done += 1
+                        failed += 1
+                        if progress is not None:
+                            progress(done, rec)
+                        continue
+                    analysing[pex.submit(analyse_point, p, Z, bbox, params)] = p
+                else:
+                    p = analysing.pop(fut)
+                    try:
+                        rec = fut.result()
+                    except Exception as e:
+                        rec = {"name": p["name"], "lat": p["lat"], "lon": p["lon"], "error": str(e)}
+                    failed += "error" in rec
+                    for t in rec.get("top") or []:
+                        global_top.add(p, t)
+                    sink.write(rec)
+                    done += 1
+                    if progress is not None:
+                        progress(done, rec)
+            feed()
+    # (işlenen, hatalı) nokta sayısı
+    return done, failed
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="Koordinat listesi üzerinde toplu Sentinel-1 VV anomali analizi")
+    ap.add_argument("input", help="CSV (lat,lon[,name] / coord) veya GeoJSON")
+    ap.add_argument("--out", required=True, help="çıktı dosyası (.jsonl veya .parquet)")
+    ap.add_argument("--format", choices=["jsonl", "parquet"], default=None, help="varsayılan: uzantıdan")
+    ap.add_argument("--cap", type=float, default=50, help="tarama çapı (m)")
+    ap.add_argument("--res", type=int, default=120, help="çözünürlük (px)")
+    ap.add_argument("--thr", type=float, default=2.8, help="anomali eşiği (z)")
+    ap.add_argument("--topn", type=int, default=3, help="nokta başına TopN")
+    ap.add_argument("--z", choices=["robust", "klasik", "lokal"], default="robust")
+    ap.add_argument("--z-window", type=int, default=32, help="lokal z pencere boyu (px)")
+    ap.add_argument("--stats", choices=["auto", "exact", "hist"], default="auto", help="yüzdelik/medyan seçimi")
+    ap.add_argument("--clip", type=float, nargs=2, default=(1, 99), metavar=("LO", "HI"))
+    ap.add_argument("--smooth-k", type=int, default=3, help="1 = smoothing kapalı")
+    ap.add_argument("--smooth-kind", choices=["box", "gauss", "median"], default="box")
+    ap.add_argument("--no-posneg", action="store_true", help="POS/NEG ayırma")
+    ap.add_argument("--pol", choices=["VV", "VH", "VV/VH", "VV+VH"], default="VV",
+                    help="polarizasyon; VV dışı VV+VH+dataMask'ı tek istekte çeker")
+    ap.add_argument("--transfer", choices=["uint16", "float32"], default="uint16",
+                    help="CDSE aktarımı: uint16 nicemlenmiş dB (küçük) / float32 tam hassasiyet")
+    ap.add_argument("--fetch-workers", type=int, default=4, help="eşzamanlı CDSE isteği")
+    ap.add_argument("--workers", type=int, default=None, help="analiz süreç sayısı (varsayılan: CPU)")
+    ap.add_argument("--global-top", type=int, default=100, help="global TopN boyutu")
+    ap.add_argument("--global-out", default=None, help="global TopN JSON (varsayılan: <out>.top.json)")
+    return ap
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Streamlit'siz: kimlik bilgileri ortam değişkenlerinden
+    from utils.cdse import fetch_s1_array, fetch_s1_stack, get_token_from_env
+
+    fmt = args.format or ("parquet" if args.out.lower().endswith(".parquet") else "jsonl")
+    sink = ParquetSink(args.out) if fmt == "parquet" else JsonlSink(args.out)
+    params = dict(
+        clip_lo=args.clip[0], clip_hi=args.clip[1],
+        smooth_on=args.smooth_k > 1, smooth_k=args.smooth_k,
+        z_mode={"robust": "Robust (Median+MAD)", "klasik": "Klasik (Mean+Std)", "lokal": "Lokal Robust (pencere Median+MAD)"}[args.z],
+        thr=args.thr,
+        posneg=not args.no_posneg,
+        smooth_kind=args.smooth_kind,
+        topn=args.topn,
+        stats_mode=args.stats,
+        z_window=args.z_window,
+        pol=args.pol,
+    )
+    gtop = GlobalTop(args.global_top)
+    # çift-pol yığını float32 çekilir (nicemlenmiş aktarım yalnız tek bantta)
+    if args.pol == "VV":
+        fetch = functools.partial(fetch_s1_array, transfer=args.transfer)
+    else:
+        fetch = fetch_s1_stack
+
+    def progress(done, rec):
+        msg = rec.get("error") or f"{len(rec.get('top') or [])} hedef"
+        print(f"[{done}] {rec['name']}: {msg}", file=sys.stderr)
+
+    try:
+        n, failed = run_batch(
+            read_points(args.input),
+            # token süresi dolmadan arka planda yenilenir (utils.auth.TokenManager)
+            token=get_token_from_env, fetch=fetch,
+            cap_m=args.cap, res=args.res, params=params,
+            sink=sink, global_top=gtop,
+            fetch_workers=args.fetch_workers, workers=args.workers,
+            progress=progress,
+        )
+    finally:
+        sink.close()
+
+    gpath = args.global_out or os.path.splitext(args.out)[0] + ".top.json"
+    with open(gpath, "w", encoding="utf-8") as f:
+        json.dump(gtop.result(), f, ensure_ascii=False, indent=2)
+    print(f"{n} nokta işlendi ({failed} hatalı) → {args.out} | global Top{args.global_top} → {gpath}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Analiz hattı benchmark'ı: sentetik Sentinel-1 VV GeoTIFF'ler üzerinde aşama süreleri.
+
+    python benchmarks/bench_pipeline.py                      # 120/200/300/1024
+    python benchmarks/bench_pipeline.py --full               # + 2048/4096
+    python benchmarks/bench_pipeline.py --save-baseline      # benchmarks/baseline.json yaz
+    python benchmarks/bench_pipeline.py --compare            # baseline ile karşılaştır
+
+Her boyutta speckle'lı bir VV rasterına bilinen konumlarda POS/NEG lekeler ekler;
+her aşamanın süresini (en iyi tekrar) ve tepe bellek kullanımını ölçer, ekilen
+lekelerin hâlâ bulunup bulunmadığını kontrol eder. "e2e" uygulamanın çağırdığı
+run_analysis_from_tiff_bytes'ın tamamı (aşama toplamıyla karşılaştırma için),
+"tree" kalıcılık sıralamasının / canlı eşiğin kurduğu ComponentTree'dir.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import tifffile as tiff
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.analysis import (  # noqa: E402
+    DB_Q_OFFSET, DB_Q_SCALE, classic_z, decode_tiff, robust_z, run_analysis_from_tiff_bytes, to_db,
+)
+from utils.comptree import SWEEP_MAX_PX, ComponentTree  # noqa: E402
+from utils.labeling import label_posneg  # noqa: E402
+from utils.result import grid_axes  # noqa: E402
+from utils.maptiles import encode_png, zscore_rgba  # noqa: E402
+from utils.scoring import score_components, to_records, top_n  # noqa: E402
+from utils.smoothing import box_blur  # noqa: E402
+from utils.stats import clip_stats, local_robust_z  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+UI_SIZES = [120, 200, 300]
+SIZES = UI_SIZES + [1024]
+FULL_SIZES = SIZES + [2048, 4096]
+EXCLUDED = ("classic_z", "local_z", "clip_hist", "decode_u16", "db_u16", "render_png", "tree", "e2e")
+BBOX = [27.7600, 40.1000, 27.7700, 40.1100]
+
+def synth_tiff(n: int, n_blobs: int = 8, seed: int = 0):
+    # gamma speckle (4-look) × arka plan dokusu + Gauss lekeler; lekeler ızgaraya göre ölçeklenir
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:n, :n].astype(np.float32)
+    base_db = -14.0 + 1.5 * np.sin(xx / (n / 7.0)) * np.cos(yy / (n / 5.0))
+    blobs = []
+    s = max(2.0, n / 60.0)
+    margin = int(4 * s) + 2
+    for i in range(n_blobs):
+        r, c = rng.integers(margin, n - margin, 2)
+        amp = 9.0 if i % 2 == 0 else -9.0
+        base_db += amp * np.exp(-((yy - r) ** 2 + (xx - c) ** 2) / (2 * s * s))
+        blobs.append({"r": int(r), "c": int(c), "type": "POS" if amp > 0 else "NEG"})
+    lin = (10 ** (base_db / 10.0)) * rng.gamma(4.0, 1.0 / 4.0, (n, n))
+    buf = io.BytesIO()
+    tiff.imwrite(buf, lin.astype(np.float32))
+    return buf.getvalue(), blobs
+
+def quantised_tiff(data: bytes) -> bytes:
+    # uint16 aktarım modunun karşılığı: evalscript'teki nicemleme; Process API yanıtı sıkıştırmasız
+    lin = tiff.imread(io.BytesIO(data))
+    q = np.round((10.0 * np.log10(lin) - DB_Q_OFFSET) / DB_Q_SCALE)
+    buf = io.BytesIO()
+    tiff.imwrite(buf, np.clip(q, 1, 65535).astype(np.uint16))
+    return buf.getvalue()
+
+def _timed(fn, repeat: int):
+    # en iyi süre + tek çalıştırmadaki tepe bellek (tracemalloc numpy tahsislerini görür)
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, best, peak
+
+def bench_size(n: int, repeat: int, thr: float = 2.8, smooth_k: int = 3):
+    data, blobs = synth_tiff(n, seed=n)
+    stages = {}
+
+    def rec(name, fn):
+        out, t, peak = _timed(fn, repeat)
+        stages[name] = {"s": t, "peak_mb": peak / 1e6}
+        return out
+
+    Z = rec("decode", lambda: decode_tiff(data))
+    Z_db = rec("db", lambda: to_db(Z))
+    data_u16 = quantised_tiff(data)
+    Q = rec("decode_u16", lambda: decode_tiff(data_u16))
+    rec("db_u16", lambda: to_db(Q))
+
+    def clip():
+        cs = clip_stats(Z_db, 1, 99, robust=None)
+        return np.clip(Z_db, cs["p_lo"], cs["p_hi"])
+    Z_clip = rec("clip", clip)
+    rec("clip_hist", lambda: clip_stats(Z_db, 1, 99, robust=True, method="hist"))
+    Z_s = rec("smooth", lambda: box_blur(Z_clip.astype(np.float32), k=smooth_k))
+    Z_z = rec("robust_z", lambda: robust_z(Z_s))
+    rec("classic_z", lambda: classic_z(Z_s))
+    rec("local_z", lambda: local_robust_z(Z_s))
+    pos, neg = rec("threshold", lambda: (Z_z >= thr, Z_z <= -thr))
+    labels, stats = rec("label", lambda: label_posneg(pos, neg, Z_z))
+    xs, ys = grid_axes(BBOX, n, n)
+    comps = rec("score", lambda: score_components(stats, Z_z, xs, ys))
+    ranked = to_records(top_n(comps, 20))
+    posneg = pos.view(np.int8) - neg.view(np.int8)
+    rec("render_png", lambda: encode_png(zscore_rgba(Z_z, posneg)))
+    if n * n <= SWEEP_MAX_PX:
+        rec("tree", lambda: ComponentTree(Z_z, xs, ys, posneg=True))
+    # uçtan uca: aşamalar arası kopyalar/dönüşümler dahil, cache'siz
+    rec("e2e", lambda: run_analysis_from_tiff_bytes(
+        data, BBOX, 1, 99, True, smooth_k, "Robust (Median+MAD)", thr, True, topn=20,
+    ))
+
+    # ekilen her leke, aynı türde bir bileşenin içinde mi?
+    found = 0
+    for b in blobs:
+        lab = labels[b["r"], b["c"]]
+        if lab > 0 and comps["type"][lab - 1] == b["type"]:
+            found += 1
+    # alternatif modlar, isteğe bağlı ağaç ve uçtan uca ölçüm toplamdan hariç (hat yalnız birini çalıştırır)
+    total = sum(v["s"] for k, v in stages.items() if k not in EXCLUDED)
+    return {
+        "size": n,
+        "stages": stages,
+        "total_s": total,
+        "payload_kb": {"float32": len(data) / 1024, "uint16": len(data_u16) / 1024},
+        "peak_mb": max(v["peak_mb"] for v in stages.values()),
+        "n_components": int(len(comps)),
+        "blobs_found": found,
+        "blobs_total": len(blobs),
+        "top_targets": [[round(t["target_lat"], 6), round(t["target_lon"], 6), t["type"]] for t in ranked[:5]],
+    }
+
+def compare(cur: dict, base: dict, tol: float):
+    # >tol yavaşlama = regresyon; tespitler değiştiyse ayrıca işaretle
+    rows, bad = [], False
+    bmap = {r["size"]: r for r in base.get("results", [])}
+    for r in cur["results"]:
+        b = bmap.get(r["size"])
+        if b is None:
+            continue
+        for name, st in r["stages"].items():
+            bs = b["stages"].get(name)
+            if not bs:
+                continue
+            ratio = st["s"] / max(bs["s"], 1e-9)
+            flag = "REGRESYON" if ratio > 1 + tol else ("hızlandı" if ratio < 1 - tol else "")
+            bad |= flag == "REGRESYON"
+            rows.append(f"{r['size']:>5} {name:<10} {bs['s'] * 1e3:9.2f} ms → {st['s'] * 1e3:9.2f} ms  x{ratio:5.2f} {flag}")
+        if r["blobs_found"] != b["blobs_found"] or r["top_targets"] != b["top_targets"]:
+            bad = True
+            rows.append(f"{r['size']:>5} TESPİT DEĞİŞTİ: lekeler {b['blobs_found']}→{r['blobs_found']}, top hedefler farklı")
+    return rows, bad
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="*", default=None)
+    ap.add_argument("--full", action="store_true", help="2048 ve 4096 dahil")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--compare", action="store_true")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tol", type=float, default=0.25, help="regresyon eşiği (oran)")
+    ap.add_argument("--json", default=None, help="sonuçları bu dosyaya da yaz")
+    args = ap.parse_args(argv)
+
+    sizes = args.sizes or (FULL_SIZES if args.full else SIZES)
+    results = []
+    for n in sizes:
+        r = bench_size(n, repeat=args.repeat if n <= 1024 else 1)
+        results.append(r)
+        parts = " | ".join(f"{k} {v['s'] * 1e3:.1f}ms" for k, v in r["stages"].items())
+        print(f"{n:>5}²  toplam {r['total_s'] * 1e3:8.1f} ms  e2e {r['stages']['e2e']['s'] * 1e3:8.1f} ms  tepe {r['peak_mb']:7.1f} MB  "
+              f"leke {r['blobs_found']}/{r['blobs_total']}  bileşen {r['n_components']}")
+        print(f"        {parts}")
+        print(f"        aktarım float32 {r['payload_kb']['float32']:.0f} KB → uint16 {r['payload_kb']['uint16']:.0f} KB")
+
+    out = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"baseline yazıldı → {args.baseline}")
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"baseline yok: {args.baseline} (önce --save-baseline)")
+            return 1
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            rows, bad = compare(out, json.load(f), args.tol)
+        print("\n".join(rows))
+        return 1 if bad else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
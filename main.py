@@ -1,20 +1,57 @@
+import dataclasses
+import uuid
+from datetime import date, timedelta
+
 import streamlit as st
-import numpy as np
 import plotly.graph_objects as go
 
-from utils.cdse import get_token_from_secrets, fetch_s1_tiff_bytes
-from utils.analysis import (
-    parse_coord_pair, bbox_from_latlon,
-    run_analysis_from_tiff_bytes,
-)
-from utils.storage import append_history, load_history
+from utils.cdse import get_token_from_secrets, get_token_manager, read_credentials, fetch_s1_array, fetch_s1_stack
+from utils.analysis import parse_coord_pair, run_analysis_from_array, threshold_tree
+from utils.temporal import time_slices
+from utils.prefetch import RefineScheduler, refine_bbox, refine_cap
+from utils import metrics
+from utils.storage import latest_history, nearby_history
+from utils.archive import archive_bytes, has_archive, load_scan
+from utils.jobs import FINAL, JobQueue, valid_job_id
+from utils.scan import run_scan
 from utils.geo_ui import geolocation_button, apply_qp_location
+from utils.comptree import LEVEL_MAX, LEVEL_MIN, LEVEL_STEP, SWEEP_MAX_PX
+from utils.pipeline import get_stage_cache
+from utils.scoring import to_records, top_n
+from utils.render import device_class, heatmap_figure, overlay_map_figure, surface_figure
+from utils.maptiles import start_tile_server
 
 # -------------------------
 # PAGE
 # -------------------------
 st.set_page_config(page_title="Turkeller Surfer Pro", layout="centered", initial_sidebar_state="collapsed")
 
+# telefonda daha kaba ızgara gönderilir (geolocation_button mobil hedefli)
+device = device_class(st.context.headers)
+
+RANK_OPTS = {"Skor": "score", "Kalıcılık (eşik taraması)": "stability"}
+
+# VV dışındakiler VV+VH+dataMask'ı tek istekte çeker (aynı ağ maliyeti)
+POL_OPTS = {"VV": "VV", "VH": "VH", "VV/VH oranı": "VV/VH", "Çift-pol birleşik z (VV+VH)": "VV+VH"}
+
+COMPOSITE_OPTS = {"Ortalama": "mean", "Medyan": "median", "Değişim (son vs ortalama)": "change"}
+
+@st.cache_resource(show_spinner=False)
+def get_refine_scheduler(dual: bool = False):
+    # tek bant ve çift-pol rasterları ayrı havuzlarda (anahtarlar karışmasın)
+    # refine ön çekimi: süreç genelinde tek havuz, en fazla 3 eşzamanlı istek
+    return RefineScheduler(fetch_s1_stack if dual else fetch_s1_array, max_inflight=3)
+
+@st.cache_resource(show_spinner=False)
+def get_tile_url():
+    # TURKELLER_TILE_PORT verilmişse XYZ karo sunucusu (süreç başına bir kez), yoksa None
+    return start_tile_server()
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    # analizler süreç geneli kuyrukta: sekme kapansa da biter, sonuç ?job=<id> ile geri açılır
+    return JobQueue()
+
 # -------------------------
 # LOGIN (sabit)
 # -------------------------
@@ -43,6 +80,53 @@ if "focus_lat" not in st.session_state: st.session_state.focus_lat = None
 if "focus_lon" not in st.session_state: st.session_state.focus_lon = None
 if "focus_label" not in st.session_state: st.session_state.focus_label = None
 if "coord_str" not in st.session_state: st.session_state.coord_str = "40.1048440 27.7690640"
+if "focus_refine" not in st.session_state: st.session_state.focus_refine = None
+if "sid" not in st.session_state: st.session_state.sid = uuid.uuid4().hex
+if "last_trace" not in st.session_state: st.session_state.last_trace = None
+if "job_id" not in st.session_state: st.session_state.job_id = None
+if "replay_id" not in st.session_state: st.session_state.replay_id = None
+
+def replay_scan(scan_id: int):
+    # geçmiş kaydı arşivden çizilir: iş sonucunun yerini alır
+    st.session_state.replay_id = scan_id
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+
+def goto_anomaly(t: dict, label: str, refine: dict | None):
+    # buton iş sonucunun çiziminde; tıklama callback ile işlenir
+    st.session_state.focus_lat = t["target_lat"]
+    st.session_state.focus_lon = t["target_lon"]
+    st.session_state.focus_label = label
+    st.session_state.focus_refine = refine
+
+@st.fragment
+def live_threshold(r, n: int, thr0: float, rank_by: str):
+    # eşik ağacından okuma: slider yalnız bu parçayı yeniden çalıştırır, veri/analiz tekrarlanmaz
+    if r.Z_z.size > SWEEP_MAX_PX:
+        return
+    t = st.slider(
+        "🎚️ Canlı eşik (z)", LEVEL_MIN, LEVEL_MAX, thr0, LEVEL_STEP,
+        key=f"live_thr_{thr0}", help="Bileşen ağacından anında okunur; kayda geçmez.",
+    )
+    t = round(t, 1)
+    if "tree" not in r.extra and t == round(thr0, 1):
+        # ağaç ilk slider hareketinde kurulur (yukarıdaki harita zaten bu eşikte)
+        return
+    with st.spinner("Bileşen ağacı kuruluyor..."):
+        tree = threshold_tree(r, get_stage_cache())
+    comps = tree.components(t)
+    n_neg = int((comps["type"] == "NEG").sum())
+    st.caption(f"z ≥ {t:.1f}: {len(comps) - n_neg} POS / {n_neg} NEG bileşen")
+    live_top = to_records(top_n(comps, n, by=rank_by))
+    live_r = dataclasses.replace(r, posneg=tree.posneg_map(t), labels=tree.labels(t), components=comps, ranked=live_top)
+    lfig, _ = heatmap_figure(live_r, live_top, device=device, height=420)
+    st.plotly_chart(lfig, use_container_width=True, key="live_fig")
+    for i, lt in enumerate(live_top, start=1):
+        tag = "🟢 POS" if lt["type"] == "POS" else "🔴 NEG"
+        st.write(
+            f"#{i} {tag} | peak z={lt['peak_z']:.2f} | score={lt['score']:.2f} | "
+            f"kalıcılık={lt['stability']}/{tree.n_levels} | {lt['target_lat']:.6f}, {lt['target_lon']:.6f}"
+        )
 
 # -------------------------
 # UI
@@ -76,21 +160,58 @@ with st.form("controls", clear_on_submit=False):
 
     c5, c6 = st.columns(2)
     with c5:
-        z_mode = st.selectbox("Z türü", ["Robust (Median+MAD)", "Klasik (Mean+Std)"], index=0)
+        z_mode = st.selectbox("Z türü", ["Robust (Median+MAD)", "Klasik (Mean+Std)", "Lokal Robust (pencere Median+MAD)"], index=0)
     with c6:
         clip_lo, clip_hi = st.slider("Clip % (lo/hi)", 0, 99, (1, 99))
 
     c7, c8 = st.columns(2)
     with c7:
-        smooth_on = st.checkbox("Smoothing (BoxBlur)", value=True)
+        smooth_on = st.checkbox("Smoothing", value=True)
+        smooth_kind = st.selectbox("Filtre", ["Box", "Gauss", "Median"], index=0, disabled=(not smooth_on))
     with c8:
         smooth_k = st.selectbox("Kernel", [1, 3, 5], index=1, disabled=(not smooth_on))
 
-    posneg = st.checkbox("Pozitif/Negatif ayır", value=True)
+    c13, c14 = st.columns(2)
+    with c13:
+        posneg = st.checkbox("Pozitif/Negatif ayır", value=True)
+    with c14:
+        rank_opt = st.selectbox("Sıralama", list(RANK_OPTS), index=0)
+    rank_by = RANK_OPTS[rank_opt]
+    pol_opt = st.selectbox("Polarizasyon", list(POL_OPTS), index=0)
+
+    tiled_on = st.checkbox("🧩 Geniş Alan (döşemeli tarama)", value=False)
+    c9, c10 = st.columns(2)
+    with c9:
+        wide_cap = st.slider("Geniş Alan Çapı (m)", 300, 5000, 1000, 100, disabled=(not tiled_on))
+    with c10:
+        px_m = st.selectbox("Piksel (m)", [10, 20, 40], index=0, disabled=(not tiled_on))
+
+    temporal_on = st.checkbox("⏱️ Zaman Serisi (çoklu geçiş)", value=False)
+    c11, c12 = st.columns(2)
+    with c11:
+        date_range = st.date_input(
+            "Tarih aralığı", value=(date.today() - timedelta(days=180), date.today()), disabled=(not temporal_on)
+        )
+    with c12:
+        n_acq = st.slider("Geçiş sayısı (N)", 2, 300, 24, disabled=(not temporal_on))
+    composite = st.selectbox("Kompozit", list(COMPOSITE_OPTS), index=1, disabled=(not temporal_on))
     auto_refine = st.checkbox("🎯 Oto Refine (Top1 ile tekrar tarama)", value=True)
+    near_m = st.slider("Geçmiş eşleşme yarıçapı (m)", 5, 500, 30)
+    archive_on = st.checkbox("💾 Rasterları arşivle (geçmişten anında aç / GeoTIFF)", value=True)
+    debug_on = st.checkbox("🐞 Debug: aşama süreleri ve bellek", value=False)
 
     submitted = st.form_submit_button("🔍 Analize Başla", use_container_width=True)
 
+# bu koordinatın yakınındaki önceki taramalar/anomaliler (konum indeksi, analiz beklemeden)
+if lat_val is not None and lon_val is not None:
+    near = nearby_history(lat_val, lon_val, near_m, limit=50)
+    if near:
+        with st.expander(f"🕓 Bu konumun {near_m} m yakınında {len(near)} kayıt"):
+            for h in near:
+                what = "Tarama" if h["kind"] == "scan" else f"Anomali #{h['rank']} {h.get('type') or ''}"
+                pz = f" | peak z={h['peak_z']:.2f}" if h.get("peak_z") is not None else ""
+                st.write(f"{what} — **{h['name'] or '(İsimsiz)'}** {h['ts']} | {h['dist_m']:.0f} m{pz}")
+
 st.divider()
 geolocation_button()
 
@@ -100,192 +221,260 @@ with cA:
         st.session_state.focus_lat = None
         st.session_state.focus_lon = None
         st.session_state.focus_label = None
+        st.session_state.focus_refine = None
+        for dual in (False, True):
+            get_refine_scheduler(dual).cancel(st.session_state.sid)
         st.rerun()
 with cB:
     st.caption("İpucu: Mobilde izin vermezse konumu elle gir veya `?glat=..&glon=..` ile test et.")
 
 # -------------------------
-# ANALYZE
+# ANALYZE (iş kuyruğunda; sonuç iş id'siyle alınır)
 # -------------------------
+jobs = get_job_queue()
+
 if submitted:
+    creds = read_credentials()
     if lat_val is None or lon_val is None:
         st.error("Koordinat formatı hatalı. Örn: `41.0073777 28.7962100`")
+    elif temporal_on and (not isinstance(date_range, (tuple, list)) or len(date_range) != 2):
+        st.error("Tarih aralığı için başlangıç ve bitiş seç.")
+    elif creds is None:
+        st.error("Secrets eksik: CDSE_CLIENT_ID ve CDSE_CLIENT_SECRET gerekli.")
     else:
-        with st.spinner("🛰️ Veri çekiliyor ve analiz ediliyor..."):
-            token = get_token_from_secrets()
-
-            # 1) geniş tarama
-            bbox1 = bbox_from_latlon(lat_val, lon_val, cap_m)
-            tiff_bytes1 = fetch_s1_tiff_bytes(token, bbox1, res_opt, res_opt)
-            r1 = run_analysis_from_tiff_bytes(
-                tiff_bytes1, bbox1,
-                clip_lo, clip_hi,
-                smooth_on, int(smooth_k),
-                z_mode, float(thr),
-                bool(posneg),
-            )
-            ranked1 = r1["ranked"]
-            topN1 = ranked1[: int(topn)]
-
-            used_bbox, used_r = bbox1, r1
-            refined = False
-            cap_used = int(cap_m)
-
-            # 2) oto refine
-            if auto_refine and len(topN1) > 0 and cap_m > 25:
-                top1 = topN1[0]
-                cap2 = max(20, min(30, int(cap_m * 0.5)))
-                bbox2 = bbox_from_latlon(top1["target_lat"], top1["target_lon"], cap2)
-                tiff_bytes2 = fetch_s1_tiff_bytes(token, bbox2, res_opt, res_opt)
-                r2 = run_analysis_from_tiff_bytes(
-                    tiff_bytes2, bbox2,
-                    clip_lo, clip_hi,
-                    smooth_on, int(smooth_k),
-                    z_mode, float(thr),
-                    bool(posneg),
-                )
-                used_bbox, used_r = bbox2, r2
-                refined = True
-                cap_used = int(cap2)
-                st.success(f"✅ Oto Refine: Top1 merkezine {cap2}m ile tekrar tarandı.")
-
-            Z_db_clip = used_r["Z_db_clip"]
-            X = used_r["X"]
-            Y = used_r["Y"]
-            Z_z = used_r["Z_z"]
-            ranked = used_r["ranked"]
-            topN = ranked[: int(topn)]
-            pos_mask = used_r["pos_mask"]
-            neg_mask = used_r["neg_mask"]
-
-            # =========================
-            # 2D HEATMAP (ŞEKİL GİBİ OVERLAY)
-            # =========================
-            st.subheader("🗺️ 2D Heatmap (anomali şekilleri)")
-
-            fig = go.Figure()
-
-            # Zemin VV dB
-            fig.add_trace(go.Heatmap(
-                z=Z_db_clip,
-                x=X[0, :],
-                y=Y[:, 0],
-                colorbar=dict(title="VV (dB)"),
-                name="VV"
-            ))
-
-            # POS filled overlay (beyaz dolgu + kırmızı border)
-            if np.any(pos_mask):
-                fig.add_trace(go.Contour(
-                    z=pos_mask.astype(int),
-                    x=X[0, :],
-                    y=Y[:, 0],
-                    showscale=False,
-                    contours=dict(start=0.5, end=0.5, size=1, coloring="fill"),
-                    colorscale=[[0.0, "rgba(0,0,0,0)"], [1.0, "rgba(255,255,255,0.92)"]],
-                    line=dict(width=2, color="red"),
-                    hoverinfo="skip",
-                    name="POS"
-                ))
-
-            # NEG filled overlay (beyaz dolgu + mavi border)
-            if np.any(neg_mask):
-                fig.add_trace(go.Contour(
-                    z=neg_mask.astype(int),
-                    x=X[0, :],
-                    y=Y[:, 0],
-                    showscale=False,
-                    contours=dict(start=0.5, end=0.5, size=1, coloring="fill"),
-                    colorscale=[[0.0, "rgba(0,0,0,0)"], [1.0, "rgba(255,255,255,0.92)"]],
-                    line=dict(width=2, color="deepskyblue"),
-                    hoverinfo="skip",
-                    name="NEG"
-                ))
-
-            # TopN işaretleri (POS/NEG renkle)
-            for i, t in enumerate(topN, start=1):
-                fig.add_trace(go.Scatter(
-                    x=[t["target_lon"]],
-                    y=[t["target_lat"]],
-                    mode="markers+text",
-                    text=[f"#{i}"],
-                    textposition="top center",
-                    marker=dict(size=10, color=("red" if t["type"] == "POS" else "deepskyblue")),
-                    name=f"Top {i}"
-                ))
-
-            # Odak
-            if st.session_state.focus_lat is not None and st.session_state.focus_lon is not None:
-                fig.add_trace(go.Scatter(
-                    x=[st.session_state.focus_lon],
-                    y=[st.session_state.focus_lat],
-                    mode="markers+text",
-                    text=[f"ODAK {st.session_state.focus_label or ''}"],
-                    textposition="bottom center",
-                    marker=dict(size=16, symbol="x", color="yellow"),
-                    name="Odak"
-                ))
-
-            fig.update_layout(
-                height=520,
-                margin=dict(l=0, r=0, t=30, b=0),
-                xaxis_title="Boylam",
-                yaxis_title="Enlem",
-                title="2D Isı Haritası + POS/NEG Şekilli Overlay"
+        params = dict(
+            name=scan_name.strip(), owner=st.session_state.sid,
+            lat=float(lat_val), lon=float(lon_val),
+            cap_m=int(cap_m), res=int(res_opt),
+            clip_lo=clip_lo, clip_hi=clip_hi,
+            smooth_on=smooth_on, smooth_k=int(smooth_k), smooth_kind=smooth_kind.lower(),
+            z_mode=z_mode, thr=float(thr), posneg=bool(posneg), topn=int(topn),
+            rank_by=rank_by, pol=POL_OPTS[pol_opt],
+            tiled=bool(tiled_on), wide_cap=int(wide_cap), px_m=float(px_m),
+            temporal=bool(temporal_on),
+            slices=time_slices(date_range[0], date_range[1], int(n_acq)) if temporal_on else [],
+            composite=COMPOSITE_OPTS[composite], composite_label=composite,
+            auto_refine=bool(auto_refine), near_m=int(near_m), archive=bool(archive_on),
+        )
+        dual = not (tiled_on or temporal_on) and params["pol"] != "VV"
+        job_id = jobs.submit(
+            run_scan, params, get_token_manager(creds).get, get_refine_scheduler(dual), debug=debug_on,
+            owner=st.session_state.sid, label=params["name"] or coord_in, params=params,
+        )
+        st.session_state.job_id = job_id
+        st.session_state.replay_id = None
+        st.query_params["job"] = job_id
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id: str):
+    # yalnız bu parça saniyede bir yenilenir; iş bitince tüm sayfa sonucu çizer
+    info = jobs.get(job_id)
+    if info is None or info["status"] in FINAL:
+        st.rerun()
+    label = f" — {info['label']}" if info.get("label") else ""
+    if info["status"] == "queued":
+        st.progress(0.0, text=f"⏳ Sırada{label}")
+    else:
+        st.progress(min(1.0, info["progress"]), text=f"🛰️ {info['message'] or info['stage']}{label}")
+    if info["cancel_requested"]:
+        st.caption("İptal ediliyor...")
+    elif st.button("⛔ İptal", key=f"cancel_{job_id}", use_container_width=True):
+        jobs.cancel(job_id)
+
+def render_scan(res: dict, p: dict):
+    used_r = res["r"]
+    topn, thr, rank_by = int(p["topn"]), float(p["thr"]), p["rank_by"]
+    for kind, msg in res["notes"]:
+        getattr(st, kind)(msg)
+    Z_db_clip = used_r.Z_db_clip
+    topN = used_r.ranked[:topn]
+
+    # =========================
+    # 2D HEATMAP (ŞEKİL GİBİ OVERLAY)
+    # =========================
+    st.subheader("🗺️ 2D Heatmap (anomali şekilleri)")
+
+    focus = None
+    if st.session_state.focus_lat is not None and st.session_state.focus_lon is not None:
+        focus = (st.session_state.focus_lat, st.session_state.focus_lon, st.session_state.focus_label)
+    with metrics.span("render.heatmap", px=int(Z_db_clip.size)) as sp:
+        fig, sp["lod"] = heatmap_figure(
+            used_r, topN, device=device, focus=focus,
+            title="2D Isı Haritası + POS/NEG Şekilli Overlay",
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    live_threshold(used_r, topn, thr, rank_by)
+
+    # =========================
+    # ALTLIK HARİTA (POS/NEG katmanı)
+    # =========================
+    st.subheader("🌍 Harita Üzerinde")
+    with metrics.span("render.map", px=int(Z_db_clip.size)):
+        mfig = overlay_map_figure(used_r, topN, device=device, tile_url=get_tile_url())
+        st.plotly_chart(mfig, use_container_width=True)
+
+    # =========================
+    # 3D SURFACE
+    # =========================
+    st.subheader(f"🧊 3D Surface ({used_r.extra.get('band', 'VV')} dB)")
+    with metrics.span("render.surface", px=int(Z_db_clip.size)) as sp:
+        surf, sp["lod"] = surface_figure(used_r, device=device)
+        st.plotly_chart(surf, use_container_width=True)
+
+    # =========================
+    # TOPN LIST (Z / DERİNLİK + BUTONLAR)
+    # =========================
+    st.subheader(f"🎯 Top {topn} Hedef (Harita/Kopya = TARGET)")
+
+    if not topN:
+        st.info("Bu eşikte anomali bulunamadı. Eşiği düşürmeyi deneyebilirsin.")
+        return
+    repeats = res["repeats"]
+    focus_cap = res["focus_cap"]
+    for i, t in enumerate(topN, start=1):
+        tag = "🟢 POS" if t["type"] == "POS" else "🔴 NEG"
+        # “derinlik” olarak: peak_z (işaretli) + rel_depth (göreceli)
+        st.markdown(
+            f"**#{i} {tag}** | score=`{t['score']:.2f}` | **peak z=`{t['peak_z']:.2f}`** | "
+            f"alan=`{t['area']}` px | derinlik(göreceli)=`{t['rel_depth']:.2f}`"
+            + (f" | kalıcılık=`{t['stability']}` seviye" if t.get("stability") else "")
+        )
+        st.code(f"{t['target_lat']:.8f} {t['target_lon']:.8f}", language="text")
+        if repeats[i - 1]:
+            h0 = repeats[i - 1][0]
+            st.caption(
+                f"🔁 Daha önce {len(repeats[i - 1])} kez görüldü — en yakın {h0['dist_m']:.1f} m: "
+                f"{h0['name'] or '(İsimsiz)'} {h0['ts']}"
             )
-            st.plotly_chart(fig, use_container_width=True)
-
-            # =========================
-            # 3D SURFACE
-            # =========================
-            st.subheader("🧊 3D Surface (VV dB)")
-            surf = go.Figure(data=[go.Surface(z=Z_db_clip, x=X, y=Y)])
-            surf.update_layout(height=520, margin=dict(l=0, r=0, t=30, b=0))
-            st.plotly_chart(surf, use_container_width=True)
-
-            # =========================
-            # TOPN LIST (Z / DERİNLİK + BUTONLAR)
-            # =========================
-            st.subheader(f"🎯 Top {topn} Hedef (Harita/Kopya = TARGET)")
-
-            if not topN:
-                st.info("Bu eşikte anomali bulunamadı. Eşiği düşürmeyi deneyebilirsin.")
-            else:
-                for i, t in enumerate(topN, start=1):
-                    tag = "🟢 POS" if t["type"] == "POS" else "🔴 NEG"
-                    # “derinlik” olarak: peak_z (işaretli) + rel_depth (göreceli)
-                    st.markdown(
-                        f"**#{i} {tag}** | score=`{t['score']:.2f}` | **peak z=`{t['peak_z']:.2f}`** | "
-                        f"alan=`{t['area']}` px | derinlik(göreceli)=`{t['rel_depth']:.2f}`"
-                    )
-                    st.code(f"{t['target_lat']:.8f} {t['target_lon']:.8f}", language="text")
-
-                    c1, c2 = st.columns(2)
-                    with c1:
-                        if st.button("📍 Anomaliye Git", key=f"goto_{i}", use_container_width=True):
-                            st.session_state.focus_lat = t["target_lat"]
-                            st.session_state.focus_lon = t["target_lon"]
-                            st.session_state.focus_label = f"#{i}"
-                            st.rerun()
-                    with c2:
-                        maps_url = f"https://www.google.com/maps/search/?api=1&query={t['target_lat']},{t['target_lon']}"
-                        st.link_button("🌍 Haritada Aç", maps_url, use_container_width=True)
-
-                    st.divider()
-
-            # =========================
-            # SAVE HISTORY (İSİMLİ + EŞİK + ÇAP + TARİH)
-            # =========================
-            append_history(
-                name=scan_name.strip(),
-                lat=float(lat_val),
-                lon=float(lon_val),
-                cap_m=int(cap_used),
-                thr=float(thr),
-                z_mode=z_mode,
-                top=topN[: min(len(topN), 10)],
+
+        c1, c2 = st.columns(2)
+        with c1:
+            refine = None
+            if res["can_refine"]:
+                refine = {"bbox": refine_bbox(t, focus_cap), "cap": refine_cap(focus_cap), "res": p["res"],
+                          "params": res["refine_params"]}
+            st.button(
+                "📍 Anomaliye Git", key=f"goto_{i}", use_container_width=True,
+                on_click=goto_anomaly, args=(t, f"#{i}", refine),
             )
-            st.success("✅ Analiz tamamlandı ve tarama geçmişine kaydedildi.")
+        with c2:
+            maps_url = f"https://www.google.com/maps/search/?api=1&query={t['target_lat']},{t['target_lon']}"
+            st.link_button("🌍 Haritada Aç", maps_url, use_container_width=True)
+
+        st.divider()
+
+job_id = st.session_state.job_id or st.query_params.get("job")
+if job_id and not valid_job_id(job_id):
+    # elle yazılmış / bozuk bağlantı: bulunamadı sayılır
+    st.warning("İş bulunamadı (geçersiz bağlantı).")
+    st.query_params.pop("job", None)
+    job_id = None
+if st.session_state.replay_id is not None:
+    # arşivden: mmap'li GeoTIFF döşemeleri, CDSE isteği ve analiz yok
+    loaded = load_scan(st.session_state.replay_id)
+    if loaded is None:
+        st.warning("Arşiv bulunamadı (boyut sınırıyla silinmiş olabilir).")
+    else:
+        rr, meta = loaded
+        render_scan({
+            "r": rr,
+            "notes": [("caption", f"🗂️ Arşivden açıldı: kayıt #{meta['scan_id']} — {meta.get('name') or '(İsimsiz)'}")],
+            "repeats": [[] for _ in rr.ranked],
+            "can_refine": meta.get("can_refine", False),
+            "focus_cap": meta.get("focus_cap"),
+            "refine_params": meta.get("refine_params"),
+        }, meta["params"])
+elif job_id:
+    info = jobs.get(job_id)
+    if info is None:
+        st.warning(f"İş bulunamadı: `{job_id}` (silinmiş olabilir).")
+    elif info["status"] not in FINAL:
+        job_progress(job_id)
+    elif info["status"] == "cancelled":
+        st.warning("⛔ Analiz iptal edildi.")
+    elif info["status"] == "error":
+        st.error(f"Analiz başarısız: {info['error']}")
+    else:
+        res = jobs.result(job_id)
+        if res is None:
+            st.warning("Sonuç bulunamadı (silinmiş olabilir).")
+        else:
+            st.session_state.last_trace = res["trace"]
+            st.session_state.job_id = job_id
+            render_scan(res, info["params"])
+            if job_id != st.session_state.get("job_done_shown"):
+                st.session_state.job_done_shown = job_id
+                st.success("✅ Analiz tamamlandı ve tarama geçmişine kaydedildi.")
+
+# oturumun işleri: sıradakiler, iptal, önceki sonuçlara dönüş
+my_jobs = jobs.jobs(owner=st.session_state.sid)
+if len(my_jobs) > 1 or any(j["status"] not in FINAL and j["id"] != job_id for j in my_jobs):
+    with st.expander(f"📋 İşler ({len(my_jobs)})"):
+        for j in my_jobs:
+            icon = {"queued": "⏳", "running": "🛰️", "done": "✅", "error": "❌", "cancelled": "⛔"}[j["status"]]
+            c1, c2 = st.columns([3, 1])
+            with c1:
+                st.write(f"{icon} **{j['label'] or j['id']}** — {j['stage'] or j['status']} ({j['progress'] * 100:.0f}%)")
+            with c2:
+                if j["status"] in FINAL:
+                    if j["id"] != job_id and st.button("Göster", key=f"show_{j['id']}", use_container_width=True):
+                        st.session_state.job_id = j["id"]
+                        st.session_state.replay_id = None
+                        st.query_params["job"] = j["id"]
+                        st.rerun()
+                elif st.button("İptal", key=f"jcancel_{j['id']}", use_container_width=True):
+                    jobs.cancel(j["id"])
+                    st.rerun()
+
+# -------------------------
+# DEBUG: son çalıştırmanın aşama süreleri (waterfall)
+# -------------------------
+if debug_on and st.session_state.last_trace:
+    lt = st.session_state.last_trace
+    with st.expander(f"🐞 Aşama süreleri — toplam {lt['duration_s'] * 1e3:.0f} ms", expanded=True):
+        spans = sorted((sp for sp in lt["spans"] if sp.get("start_s") is not None), key=lambda sp: sp["start_s"])
+        wf = go.Figure(go.Bar(
+            y=[f"{i:02d} {sp['name']}" for i, sp in enumerate(spans, start=1)],
+            x=[sp["dur_s"] * 1e3 for sp in spans],
+            base=[sp["start_s"] * 1e3 for sp in spans],
+            orientation="h",
+            hovertext=[
+                f"{sp['dur_s'] * 1e3:.1f} ms | {sp['thread']}"
+                + (f" | tepe {sp['peak_mb']:.1f} MB" if "peak_mb" in sp else "")
+                + (f" | {sp['attrs']}" if sp.get("attrs") else "")
+                for sp in spans
+            ],
+            hoverinfo="text",
+        ))
+        wf.update_layout(
+            height=max(240, 22 * len(spans)), margin=dict(l=0, r=0, t=10, b=0),
+            xaxis_title="ms", yaxis=dict(autorange="reversed"),
+        )
+        st.plotly_chart(wf, use_container_width=True)
+        if lt["counters"]:
+            st.write({k: v for k, v in sorted(lt["counters"].items())})
+        st.json(metrics.snapshot(), expanded=False)
+
+# -------------------------
+# ODAK REFINE (ön çekilmiş raster bellekten)
+# -------------------------
+fr = st.session_state.focus_refine
+if fr is not None and not submitted:
+    st.subheader(f"🎯 Odak Refine {st.session_state.focus_label or ''} ({fr['cap']} m)")
+    with st.spinner("🛰️ Odak refine hazırlanıyor..."):
+        token = get_token_from_secrets()
+        fdual = fr["params"].get("pol", "VV") != "VV"
+        Zf = get_refine_scheduler(fdual).get(token, fr["bbox"], fr["res"], fr["res"])
+        rf = run_analysis_from_array(Zf, fr["bbox"], **fr["params"], cache=get_stage_cache())
+
+    ftop = rf.ranked[: fr["params"]["topn"]]
+    ffig, _ = heatmap_figure(rf, ftop, device=device, overlays=False, height=420)
+    st.plotly_chart(ffig, use_container_width=True)
+    for i, t in enumerate(ftop, start=1):
+        tag = "🟢 POS" if t["type"] == "POS" else "🔴 NEG"
+        st.markdown(f"**#{i} {tag}** | score=`{t['score']:.2f}` | peak z=`{t['peak_z']:.2f}` | alan=`{t['area']}` px")
+        st.code(f"{t['target_lat']:.8f} {t['target_lon']:.8f}", language="text")
 
 # -------------------------
 # HISTORY
@@ -293,11 +482,11 @@ if submitted:
 st.divider()
 st.subheader("🕓 Tarama Geçmişi")
 
-hist = load_history()
+hist = latest_history(15)
 if not hist:
     st.info("Henüz tarama geçmişi yok.")
 else:
-    for idx, h in enumerate(hist[-15:][::-1], start=1):
+    for idx, h in enumerate(hist, start=1):
         name = h.get("name") or "(İsimsiz)"
         ts = h.get("ts") or "Tarih yok"
         lat = h.get("lat")
@@ -314,6 +503,19 @@ else:
             maps_url = f"https://www.google.com/maps/search/?api=1&query={lat},{lon}"
             st.link_button("🌍 Bu Taramayı Haritada Aç", maps_url, use_container_width=True)
 
+        # arşivlenmiş rasterlar: yeniden çekmeden aç, QGIS için indir
+        if has_archive(h["id"]):
+            ca, cb = st.columns(2)
+            with ca:
+                st.button("▶️ Arşivden Aç", key=f"replay_{h['id']}", use_container_width=True,
+                          on_click=replay_scan, args=(h["id"],))
+            with cb:
+                st.download_button(
+                    "📥 GeoTIFF (QGIS)", data=lambda sid=h["id"]: archive_bytes(sid),
+                    file_name=f"turkeller_scan_{h['id']}.tif", mime="image/tiff",
+                    key=f"dl_{h['id']}", use_container_width=True,
+                )
+
         top = h.get("top") or []
         if top:
             with st.expander("Top anomaliler (peak z / derinlik)"):
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import tifffile as tiff
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import archive  # noqa: E402
+from utils.analysis import run_analysis_from_db  # noqa: E402
+
+BBOX = [27.76, 40.10, 27.78, 40.12]
+
+def _scan(posneg=True):
+    # kuzeyde (satır 0'a yakın) belirgin bir POS, güneyde bir NEG leke
+    rng = np.random.default_rng(0)
+    Z = (rng.normal(size=(300, 400)) - 12).astype(np.float32)
+    Z[10:30, 50:90] += 8
+    Z[250:270, 300:340] -= 8
+    return run_analysis_from_db(Z, BBOX, 1, 99, True, 3, "Robust (Median+MAD)", 2.8, posneg, topn=5)
+
+def test_north_row_georeference(tmp_path):
+    r = _scan()
+    path = archive.save_scan(1, r, archive_dir=str(tmp_path))
+    with tiff.TiffFile(path) as tf:
+        page = tf.pages[0]
+        sx, sy, _ = page.tags["ModelPixelScaleTag"].value
+        tie = page.tags["ModelTiepointTag"].value
+        a = page.asarray()
+    assert (tie[3], tie[4]) == (BBOX[0], BBOX[3])
+    # dosya satırı 0, sütun c'nin merkezi: GDAL'ın göreceği koordinat
+    c = 70
+    lon, lat = tie[3] + (c + 0.5) * sx, tie[4] - 0.5 * sy
+    assert np.isclose(lon, r.xs[c]) and np.isclose(lat, r.ys[0])
+    assert lat > (BBOX[1] + BBOX[3]) / 2
+    np.testing.assert_array_equal(a[0], r.Z_db_clip[0])
+    # leke kuzey yarıda kalır
+    assert r.Z_z[20, c] > 0 and a[20, c] > np.median(a)
+
+def test_load_scan_roundtrip(tmp_path):
+    r = _scan()
+    archive.save_scan(2, r, archive_dir=str(tmp_path))
+    r2, _ = archive.load_scan(2, archive_dir=str(tmp_path))
+    np.testing.assert_array_equal(r2.Z_z, r.Z_z)
+    np.testing.assert_array_equal(r2.labels, r.labels)
+    np.testing.assert_array_equal(r2.posneg, r.posneg)
+    np.testing.assert_allclose(r2.ys, r.ys)
+    # pencere: eksenler tam ızgaranın alt kümesi
+    wb = [27.762, 40.115, 27.765, 40.119]
+    r3, _ = archive.load_scan(2, bbox=wb, archive_dir=str(tmp_path))
+    i0 = int(np.argmin(np.abs(r.ys - r3.ys[0])))
+    j0 = int(np.argmin(np.abs(r.xs - r3.xs[0])))
+    np.testing.assert_allclose(r3.ys, r.ys[i0:i0 + r3.shape[0]])
+    np.testing.assert_allclose(r3.xs, r.xs[j0:j0 + r3.shape[1]])
+    np.testing.assert_array_equal(r3.Z_z, r.Z_z[i0:i0 + r3.shape[0], j0:j0 + r3.shape[1]])
+    assert wb[1] <= r3.ys.min() and r3.ys.max() <= wb[3]
+
+def test_roundtrip_without_posneg_split(tmp_path):
+    # ayrım kapalı: |z| ≥ eşik bileşenleri hep POS, yeniden açınca NEG piksel çıkmaz
+    r = _scan(posneg=False)
+    assert (r.posneg >= 0).all() and (r.Z_z[r.labels > 0] < 0).any()
+    archive.save_scan(3, r, archive_dir=str(tmp_path))
+    r2, meta = archive.load_scan(3, archive_dir=str(tmp_path))
+    assert meta["posneg"] is False
+    np.testing.assert_array_equal(r2.posneg, r.posneg)
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import analysis  # noqa: E402
+from utils.analysis import run_analysis_from_db  # noqa: E402
+from utils.comptree import LEVELS, ComponentTree  # noqa: E402
+from utils.labeling import label_posneg  # noqa: E402
+from utils.result import grid_axes  # noqa: E402
+from utils.scoring import score_components  # noqa: E402
+
+BBOX = [27.76, 40.10, 27.78, 40.12]
+
+def _field(n=120, seed=0):
+    # iç içe tepeler (birleşen dallar) + gürültü
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:n, :n].astype(np.float32)
+    Z = rng.normal(scale=0.8, size=(n, n)).astype(np.float32)
+    for r, c, a, s in ((30, 30, 5.5, 6), (36, 44, 4.0, 4), (90, 80, -5.0, 7), (70, 20, 3.2, 3)):
+        Z += a * np.exp(-((yy - r) ** 2 + (xx - c) ** 2) / (2 * s * s))
+    return Z
+
+@pytest.mark.parametrize("posneg", [True, False])
+def test_readout_matches_direct_threshold(posneg):
+    Z = _field()
+    xs, ys = grid_axes(BBOX, *Z.shape[::-1])
+    tree = ComponentTree(Z, xs, ys, posneg=posneg)
+    for t in (1.5, 2.0, 2.8, 3.5, 4.9, 6.0):
+        if posneg:
+            pos, neg = Z >= t, Z <= -t
+        else:
+            pos, neg = np.abs(Z) >= t, np.zeros(Z.shape, dtype=bool)
+        labels, stats = label_posneg(pos, neg, Z)
+        comps = score_components(stats, Z, xs, ys, win=1)
+        np.testing.assert_array_equal(tree.labels(t), labels)
+        np.testing.assert_array_equal(tree.posneg_map(t), pos.view(np.int8) - neg.view(np.int8))
+        got = tree.components(t)
+        assert len(got) == len(comps)
+        for name in ("type", "area", "peak_z", "score", "target_lat", "target_lon"):
+            np.testing.assert_array_equal(got[name], comps[name])
+        assert (got["stability"] >= 1).all()
+
+def test_level_lookup():
+    Z = _field()
+    tree = ComponentTree(Z, *grid_axes(BBOX, *Z.shape[::-1]))
+    assert tree.level_index(2.85) is None
+    assert LEVELS[tree.nearest_level(2.86)] == 2.9
+    assert tree.nearest_level(1.0) is None and tree.nearest_level(6.2) is None
+
+def _run(Z, thr):
+    return run_analysis_from_db(Z, BBOX, 0, 100, False, 1, "Robust (Median+MAD)", thr, True,
+                                topn=5, rank_by="stability")
+
+def test_stability_ranking_snaps_off_grid_threshold():
+    r = _run(_field() - 12.0, 2.85)
+    assert r.extra["rank_by"] == "stability" and r.extra["thr_level"] in (2.8, 2.9)
+    assert r.ranked and all(t["stability"] >= 1 for t in r.ranked)
+
+def test_stability_ranking_flags_fallback(monkeypatch):
+    r = _run(_field() - 12.0, 7.5)
+    assert r.extra["rank_by"] == "score" and "eşik" in r.extra["rank_note"]
+    monkeypatch.setattr(analysis, "SWEEP_MAX_PX", 100)
+    r = _run(_field() - 12.0, 2.8)
+    assert r.extra["rank_by"] == "score" and "raster" in r.extra["rank_note"]
+    assert "tree" not in r.extra
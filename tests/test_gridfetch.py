@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gridfetch import GridFetcher, plan_cells  # noqa: E402
+
+BBOX = [27.7650, 40.1020, 27.7730, 40.1080]
+W, H = 180, 150
+
+def _centres(b, w, h):
+    # sahte sunucu: her pikselde kendi merkezinin (lon, lat)'ı; satır 0 kuzey
+    lon = b[0] + (np.arange(w) + 0.5) * (b[2] - b[0]) / w
+    lat = b[3] - (np.arange(h) + 0.5) * (b[3] - b[1]) / h
+    return np.stack(np.broadcast_arrays(lon[None, :], lat[:, None])).astype(np.float64)
+
+def _spec(window):
+    return {"evalscript": "x", "collection": "c", "extra": {"time_range": list(window)}}
+
+def test_snap_matches_direct_within_ladder_pixel(tmp_path):
+    g = GridFetcher(cache_dir=str(tmp_path))
+    snapped = g.fetch(BBOX, W, H, _spec(("a", "b")), _centres)
+    direct = _centres(BBOX, W, H)
+    plan = plan_cells(BBOX, W, H)
+    # en yakın komşu: en fazla bir merdiven pikseli kayma, kuzey-güney yönü korunur
+    assert np.abs(snapped[0] - direct[0]).max() <= plan.px_lon
+    assert np.abs(snapped[1] - direct[1]).max() <= plan.px_lat
+    assert snapped[1, 0, 0] > snapped[1, -1, 0]
+    # ince merdiven: etkin piksel istenenden küçük ama √2 kattan fazla değil
+    px = (BBOX[2] - BBOX[0]) / W
+    assert px / np.sqrt(2) < plan.px_lon <= px
+
+def test_windows_do_not_share_cells(tmp_path):
+    g = GridFetcher(cache_dir=str(tmp_path))
+    calls = []
+
+    def fetch_rect(b, w, h):
+        calls.append(b)
+        return _centres(b, w, h)
+
+    g.fetch(BBOX, W, H, _spec(("2026-01-01T00:00:00Z", "2026-01-31T00:00:00Z")), fetch_rect)
+    g.fetch(BBOX, W, H, _spec(("2026-01-01T00:00:00Z", "2026-01-31T00:00:00Z")), fetch_rect)
+    assert len(calls) == 1
+    g.fetch(BBOX, W, H, _spec(("2026-01-02T00:00:00Z", "2026-02-01T00:00:00Z")), fetch_rect)
+    assert len(calls) == 2
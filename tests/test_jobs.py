@@ -0,0 +1,46 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.jobs import JobQueue, valid_job_id  # noqa: E402
+
+def _wait(q, job_id):
+    # _run, _finish (ve budama) bitince döner
+    q._jobs[job_id].future.result(timeout=10)
+
+def test_rejects_foreign_ids(tmp_path):
+    # kuyruk dizininin dışındaki pickle id üzerinden açılamaz
+    evil = tmp_path / "evil.pkl"
+    evil.write_bytes(pickle.dumps({"x": 1}))
+    (tmp_path / "evil.json").write_text('{"status": "done"}')
+    q = JobQueue(max_workers=1, job_dir=str(tmp_path / "jobs"))
+    for job_id in ("../evil", "EVIL", "0123456789ab/..", "", None, "0123456789abc"):
+        assert not valid_job_id(job_id)
+        assert q.get(job_id) is None
+        assert q.result(job_id) is None
+        assert q.cancel(job_id) is False
+    assert valid_job_id("0123456789ab")
+
+def test_prune_keeps_foreign_files(tmp_path):
+    d = str(tmp_path)
+    other = JobQueue(max_workers=1, job_dir=d, keep=1)
+    foreign = other.submit(lambda job: 1)
+    _wait(other, foreign)
+    q = JobQueue(max_workers=1, job_dir=d, keep=2)
+    ids = [q.submit(lambda job, i=i: i) for i in range(4)]
+    for job_id in ids:
+        _wait(q, job_id)
+    left = {fn[:-5] for fn in os.listdir(d) if fn.endswith(".json")}
+    assert foreign in left
+    assert set(ids[-2:]) <= left and not set(ids[:2]) & left
+
+def test_unpicklable_result_fails_job(tmp_path):
+    q = JobQueue(max_workers=1, job_dir=str(tmp_path))
+    job_id = q.submit(lambda job: {"f": lambda: None})
+    _wait(q, job_id)
+    info = q.get(job_id)
+    assert info["status"] == "error" and "kaydedilemedi" in info["error"]
+    assert q.result(job_id) is None
+    assert not [fn for fn in os.listdir(tmp_path) if fn.endswith((".pkl", ".tmp"))]
@@ -0,0 +1,103 @@
+import os
+import sys
+from collections import deque
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.labeling import label_classes, label_components, label_posneg  # noqa: E402
+
+def bfs_label(cls_img, connectivity):
+    # referans: raster sırasında tohum, aynı sınıftaki komşulara BFS
+    h, w = cls_img.shape
+    if connectivity == 4:
+        nb = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    else:
+        nb = [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+    out = np.zeros((h, w), dtype=np.int32)
+    n = 0
+    for r in range(h):
+        for c in range(w):
+            if cls_img[r, c] == 0 or out[r, c]:
+                continue
+            n += 1
+            out[r, c] = n
+            q = deque([(r, c)])
+            while q:
+                y, x = q.popleft()
+                for dr, dc in nb:
+                    yy, xx = y + dr, x + dc
+                    if 0 <= yy < h and 0 <= xx < w and not out[yy, xx] and cls_img[yy, xx] == cls_img[r, c]:
+                        out[yy, xx] = n
+                        q.append((yy, xx))
+    return out, n
+
+def serpentine(h=31, w=40):
+    # tek bir kıvrımlı yol: koşular satırlar arasında uçlardan bağlanır
+    m = np.zeros((h, w), dtype=np.int8)
+    m[::2] = 1
+    for i, r in enumerate(range(1, h, 2)):
+        m[r, w - 1 if i % 2 == 0 else 0] = 1
+    return m
+
+def comb(h=20, w=41):
+    # sırt + dişler; dişlerin arası boş, birleşme yalnız sırtta
+    m = np.zeros((h, w), dtype=np.int8)
+    m[0] = 1
+    m[:, ::2] = 1
+    return m
+
+def diagonal_chain(n=25):
+    # yalnız köşe komşuluğuyla bağlı: 4'te n bileşen, 8'de tek bileşen
+    return np.eye(n, dtype=np.int8)
+
+def _cases():
+    rng = np.random.default_rng(0)
+    yield "serpentine", serpentine()
+    yield "comb", comb()
+    yield "comb_t", comb().T.copy()
+    yield "diagonal", diagonal_chain()
+    yield "anti_diagonal", diagonal_chain()[:, ::-1].copy()
+    yield "empty", np.zeros((7, 9), dtype=np.int8)
+    yield "full", np.ones((7, 9), dtype=np.int8)
+    yield "row", (rng.random((1, 50)) < 0.5).astype(np.int8)
+    yield "col", (rng.random((50, 1)) < 0.5).astype(np.int8)
+    for p in (0.3, 0.5, 0.6):
+        yield f"random_{p}", (rng.random((60, 70)) < p).astype(np.int8)
+    # iki sınıf bitişik: farklı sınıflar birleşmez
+    yield "two_class", rng.integers(0, 3, (50, 50)).astype(np.int8)
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("name,cls_img", list(_cases()), ids=[c[0] for c in _cases()])
+def test_matches_bfs(name, cls_img, connectivity):
+    labels, n, cls = label_classes(cls_img, connectivity)
+    ref, n_ref = bfs_label(cls_img, connectivity)
+    assert n == n_ref
+    np.testing.assert_array_equal(labels, ref)
+    if n:
+        first = np.array([np.flatnonzero(ref.ravel() == k)[0] for k in range(1, n + 1)])
+        np.testing.assert_array_equal(cls, cls_img.ravel()[first])
+
+def test_shape_components_count():
+    assert label_classes(serpentine(), 4)[1] == 1
+    assert label_classes(comb(), 4)[1] == 1
+    assert label_classes(diagonal_chain(), 4)[1] == 25
+    assert label_classes(diagonal_chain(), 8)[1] == 1
+
+def test_stats_match_brute_force():
+    rng = np.random.default_rng(1)
+    vals = rng.normal(size=(40, 50))
+    pos, neg = vals > 0.8, vals < -0.8
+    labels, stats = label_posneg(pos, neg, vals)
+    for k in range(1, labels.max() + 1):
+        rr, cc = np.nonzero(labels == k)
+        i = k - 1
+        assert stats["area"][i] == rr.size
+        assert (stats["rmin"][i], stats["rmax"][i]) == (rr.min(), rr.max())
+        assert (stats["cmin"][i], stats["cmax"][i]) == (cc.min(), cc.max())
+        v = vals[rr, cc]
+        assert stats["peak_val"][i] == (v.max() if stats["cls"][i] == 1 else v.min())
+    _, s_min = label_components(neg, 8, vals, mode="min")
+    assert (s_min["peak_val"] < -0.8).all()
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import raster_cache  # noqa: E402
+
+def test_oversized_put_survives_eviction(tmp_path):
+    d = str(tmp_path)
+    old = raster_cache.put("a" * 64, np.zeros((50, 50), np.float32), d, max_bytes=1 << 30)
+    big = np.arange(100 * 100, dtype=np.float32).reshape(100, 100)
+    # sınır tek rasterdan küçük: eskiler silinir, yeni yazılan kalır ve okunabilir
+    arr = raster_cache.put("b" * 64, big, d, max_bytes=1000)
+    np.testing.assert_array_equal(arr, big)
+    assert raster_cache.get("b" * 64, d) is not None
+    assert raster_cache.get("a" * 64, d) is None
+    assert old.shape == (50, 50)
+
+def test_put_into_survives_eviction(tmp_path):
+    d = str(tmp_path)
+    arr = raster_cache.put_into("c" * 64, (64, 64), np.float32, lambda out: out.fill(3.0), d, max_bytes=10)
+    assert float(arr[5, 5]) == 3.0 and raster_cache.get("c" * 64, d) is not None
+
+def test_concurrent_misses_fetch_once(tmp_path):
+    d = str(tmp_path)
+    calls = []
+
+    def fetch_bytes():
+        calls.append(1)
+        time.sleep(0.1)
+        return b"x"
+
+    def decode(raw, out):
+        out.fill(1.0)
+
+    with ThreadPoolExecutor(8) as ex:
+        futs = [ex.submit(raster_cache.get_or_decode, "d" * 64, fetch_bytes,
+                          lambda raw: ((16, 16), np.float32), decode, d) for _ in range(8)]
+        arrs = [f.result() for f in futs]
+    assert len(calls) == 1
+    assert all(float(a[0, 0]) == 1.0 for a in arrs)
+    assert not raster_cache._flights
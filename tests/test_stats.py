@@ -0,0 +1,87 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.stats import MAD_K, center_scale, clip_stats, quantiles  # noqa: E402
+
+QS = [0.0, 1.0, 2.5, 25.0, 50.0, 75.0, 97.5, 99.0, 100.0]
+
+def _data(seed=0):
+    # çarpık, ağır kuyruklu dB benzeri dağılım + tekrar eden değerler
+    rng = np.random.default_rng(seed)
+    x = 10 * np.log10(rng.gamma(4.0, 0.25, 200_000)) - 12
+    x[::97] = -12.0
+    return x.astype(np.float32)
+
+def test_exact_matches_numpy():
+    x = _data()
+    q, err = quantiles(x, QS, method="exact")
+    assert err == 0.0
+    np.testing.assert_allclose(q, np.percentile(x.astype(np.float64), QS), rtol=0, atol=1e-6)
+    x0 = x.copy()
+    quantiles(x, QS, method="auto")
+    np.testing.assert_array_equal(x, x0)
+
+@pytest.mark.parametrize("bins", [64, 1024, 65536])
+def test_hist_within_bin_width(bins):
+    x = _data(bins)
+    q, err = quantiles(x, QS, method="hist", bins=bins)
+    assert err == pytest.approx((float(x.max()) - float(x.min())) / bins)
+    ref = np.percentile(x.astype(np.float64), QS)
+    assert np.all(np.abs(q - ref) <= err + 1e-6)
+
+@pytest.mark.parametrize("method", ["exact", "hist", "auto"])
+def test_constant_array(method):
+    x = np.full((50, 40), -7.25, dtype=np.float32)
+    q, err = quantiles(x, QS, method=method)
+    np.testing.assert_allclose(q, -7.25)
+    assert err == 0.0
+    cs = center_scale(x, robust=True, method=method)
+    # MAD ve std sıfır: ölçek 1'e düşer (z = x - merkez)
+    assert cs["center"] == pytest.approx(-7.25) and cs["scale"] == 1.0
+    st = clip_stats(x, 1, 99, robust=True, method=method)
+    assert st["p_lo"] == st["p_hi"] == pytest.approx(-7.25) and st["scale"] == 1.0
+
+@pytest.mark.parametrize("method", ["exact", "hist"])
+def test_nan_ignored(method):
+    x = _data(3)
+    x[::5] = np.nan
+    q, err = quantiles(x, QS, method=method, bins=4096)
+    ref = np.nanpercentile(x.astype(np.float64), QS)
+    assert np.all(np.abs(q - ref) <= err + 1e-6)
+    cs = center_scale(x, robust=True, method=method, bins=4096)
+    assert cs["n"] == int(np.count_nonzero(~np.isnan(x)))
+    assert abs(cs["center"] - np.nanmedian(x)) <= cs["err"] + 1e-6
+
+def test_all_nan():
+    x = np.full(10, np.nan, dtype=np.float32)
+    q, err = quantiles(x, [50.0], method="hist")
+    assert np.isnan(q).all() and err == 0.0
+    assert center_scale(x)["n"] == 0 and np.isnan(clip_stats(x, 1, 99)["p_lo"])
+
+@pytest.mark.parametrize("bins", [256, 65536])
+def test_hist_median_mad(bins):
+    x = _data(7).astype(np.float64)
+    med = np.median(x)
+    mad = MAD_K * np.median(np.abs(x - med))
+    h = center_scale(x, robust=True, method="hist", bins=bins)
+    e = center_scale(x, robust=True, method="exact")
+    assert e["center"] == pytest.approx(med) and e["scale"] == pytest.approx(mad)
+    assert abs(h["center"] - med) <= h["err"] + 1e-9
+    # MAD yaklaşık merkez etrafında: merkez hatası + kutu hatası
+    assert abs(h["scale"] - mad) <= h["err"] + MAD_K * abs(h["center"] - med) + 1e-9
+
+def test_clip_stats_hist_within_tolerance():
+    x = _data(11)
+    ref_lo, ref_hi = np.percentile(x.astype(np.float64), [1, 99])
+    for robust in (None, True, False):
+        st = clip_stats(x, 1, 99, robust=robust, method="hist", bins=2048)
+        assert abs(st["p_lo"] - ref_lo) <= st["err"] + 1e-6
+        assert abs(st["p_hi"] - ref_hi) <= st["err"] + 1e-6
+        ex = clip_stats(x, 1, 99, robust=robust, method="exact")
+        assert ex["err"] == 0.0
+        assert ex["p_lo"] == pytest.approx(ref_lo, abs=1e-5) and ex["p_hi"] == pytest.approx(ref_hi, abs=1e-5)
@@ -0,0 +1,36 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tiling import fetch_mosaic_db, plan_tiles  # noqa: E402
+
+BBOX = [27.76, 40.10, 27.78, 40.12]
+
+class Stop(Exception):
+    pass
+
+def test_cancel_skips_queued_tiles():
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(token, b, w, h):
+        with lock:
+            calls.append(b)
+        time.sleep(0.02)
+        return np.ones((h, w), dtype=np.float32)
+
+    def on_tile(done, total, t):
+        raise Stop()
+
+    n = len(plan_tiles(BBOX, 1024, 1024, 64))
+    with pytest.raises(Stop):
+        fetch_mosaic_db(fetch, "t", BBOX, 1024, 1024, tile_px=64, max_workers=2, on_tile=on_tile)
+    time.sleep(0.1)
+    # iptalde en fazla uçuştaki (işçi sayısı kadar) ek döşeme çekilir
+    assert len(calls) <= 2 + 2 < n
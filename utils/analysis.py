@@ -1,8 +1,18 @@
 import math
 import io
+import os
+import tarfile
 import numpy as np
 import tifffile as tiff
-from collections import deque
+
+from utils import metrics
+from utils.pipeline import StageCache, array_key, bytes_key, stage_key
+from utils.smoothing import smooth
+from utils.result import AnalysisResult, grid_axes
+from utils.stats import LOCAL_WIN, center_scale, clip_stats, local_robust_z, zscore
+from utils.comptree import SWEEP_MAX_PX, ComponentTree
+from utils.labeling import label_components, label_posneg
+from utils.scoring import score_components, to_records, top_n
 
 def parse_coord_pair(s: str):
     if not s:
@@ -23,92 +33,150 @@ def bbox_from_latlon(lat: float, lon: float, cap_m: float):
     lon_f = cap_m / (40075000.0 * math.cos(math.radians(lat)) / 360.0)
     return [lon - lon_f, lat - lat_f, lon + lon_f, lat + lat_f]
 
-def box_blur(img: np.ndarray, k: int = 3):
-    if k <= 1:
-        return img
-    k = int(k)
-    pad = k // 2
-    a = np.pad(img, ((pad, pad), (pad, pad)), mode="edge").astype(np.float32)
-
-    s = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=np.float32)
-    s[1:, 1:] = np.cumsum(np.cumsum(a, axis=0), axis=1)
-
-    h, w = img.shape
-    out = np.empty((h, w), dtype=np.float32)
-
-    for r in range(h):
-        r0 = r
-        r1 = r + k
-        for c in range(w):
-            c0 = c
-            c1 = c + k
-            total = s[r1, c1] - s[r0, c1] - s[r1, c0] + s[r0, c0]
-            out[r, c] = total / (k * k)
-    return out
-
-def robust_z(x: np.ndarray):
-    valid = x[~np.isnan(x)]
-    if valid.size == 0:
+def robust_z(x: np.ndarray, method: str = "auto"):
+    cs = center_scale(x, robust=True, method=method)
+    if cs["n"] == 0:
         return x * np.nan
-    med = np.median(valid)
-    mad = np.median(np.abs(valid - med))
-    denom = (1.4826 * mad) if mad > 1e-9 else (np.std(valid) if np.std(valid) > 1e-9 else 1.0)
-    return (x - med) / denom
+    return zscore(x, cs["center"], cs["scale"])
 
 def classic_z(x: np.ndarray):
-    valid = x[~np.isnan(x)]
-    if valid.size == 0:
+    cs = center_scale(x, robust=False)
+    if cs["n"] == 0:
         return x * np.nan
-    mu = float(np.mean(valid))
-    sd = float(np.std(valid)) if float(np.std(valid)) > 1e-9 else 1.0
-    return (x - mu) / sd
+    return zscore(x, cs["center"], cs["scale"])
 
-def connected_components(mask: np.ndarray):
-    h, w = mask.shape
-    visited = np.zeros_like(mask, dtype=bool)
+def z_kind(z_mode: str) -> str:
+    # UI etiketleri: "Robust (...)", "Klasik (...)", "Lokal Robust (...)"
+    if z_mode.startswith("Lokal"):
+        return "local"
+    return "robust" if z_mode.startswith("Robust") else "classic"
+
+def connected_components(mask: np.ndarray, connectivity: int = 8):
+    # eski API (piksel listeli); yeni kod label_components / label_posneg kullanır
+    labels, stats = label_components(mask, connectivity)
     comps = []
-    neighbors = [(-1,-1),(-1,0),(-1,1),
-                 ( 0,-1),       ( 0,1),
-                 ( 1,-1),( 1,0),( 1,1)]
-    for r in range(h):
-        for c in range(w):
-            if mask[r, c] and not visited[r, c]:
-                q = deque([(r, c)])
-                visited[r, c] = True
-                pixels = []
-                rmin=rmax=r
-                cmin=cmax=c
-                while q:
-                    rr, cc = q.popleft()
-                    pixels.append((rr, cc))
-                    rmin = min(rmin, rr); rmax = max(rmax, rr)
-                    cmin = min(cmin, cc); cmax = max(cmax, cc)
-                    for dr, dc in neighbors:
-                        nr, nc = rr + dr, cc + dc
-                        if 0 <= nr < h and 0 <= nc < w and mask[nr, nc] and not visited[nr, nc]:
-                            visited[nr, nc] = True
-                            q.append((nr, nc))
-                comps.append({"pixels": pixels, "area": len(pixels), "bbox": (rmin, rmax, cmin, cmax)})
+    if not len(stats["area"]):
+        return comps
+    idx = np.flatnonzero(labels)
+    idx = idx[np.argsort(labels.flat[idx], kind="stable")]
+    rr, cc = np.divmod(idx, labels.shape[1])
+    bounds = np.r_[0, np.cumsum(stats["area"])]
+    for i in range(len(stats["area"])):
+        sl = slice(bounds[i], bounds[i + 1])
+        comps.append({
+            "pixels": list(zip(rr[sl].tolist(), cc[sl].tolist())),
+            "area": int(stats["area"][i]),
+            "bbox": (int(stats["rmin"][i]), int(stats["rmax"][i]), int(stats["cmin"][i]), int(stats["cmax"][i])),
+        })
     return comps
 
 def weighted_peak_center(peak_r, peak_c, Zz, X, Y, win=1):
+    # X/Y: 1D eksenler (xs, ys) ya da eski 2D meshgrid; koordinat eksenden okunur
+    xs = X[0, :] if np.ndim(X) == 2 else X
+    ys = Y[:, 0] if np.ndim(Y) == 2 else Y
     H, W = Zz.shape
     r0 = max(0, peak_r - win); r1 = min(H - 1, peak_r + win)
     c0 = max(0, peak_c - win); c1 = min(W - 1, peak_c + win)
 
-    rr, cc = np.meshgrid(np.arange(r0, r1 + 1), np.arange(c0, c1 + 1), indexing="ij")
-    w = np.abs(Zz[rr, cc]).astype(np.float64)
+    w = np.abs(Zz[r0:r1 + 1, c0:c1 + 1]).astype(np.float64)
     s = float(np.sum(w))
     if s <= 1e-12:
-        return float(Y[peak_r, peak_c]), float(X[peak_r, peak_c])
-    lat = float(np.sum(w * Y[rr, cc]) / s)
-    lon = float(np.sum(w * X[rr, cc]) / s)
+        return float(ys[peak_r]), float(xs[peak_c])
+    lat = float(np.sum(w.sum(axis=1) * ys[r0:r1 + 1]) / s)
+    lon = float(np.sum(w.sum(axis=0) * xs[c0:c1 + 1]) / s)
     return lat, lon
 
 def estimate_relative_depth(area_px: int, peak_abs_z: float):
     peak = max(peak_abs_z, 1e-6)
     return float(math.sqrt(max(area_px, 1)) / peak)
 
+# nicemlenmiş aktarım: evalscript dB'yi UINT16'ya çevirir (q = (dB - OFFSET) / SCALE, 0 = veri yok)
+# -60 dB'den 0.01 dB adımla (hata ≤ 0.005 dB, speckle'ın çok altında); -60 altı 1'e kırpılır
+DB_Q_OFFSET = -60.0
+DB_Q_SCALE = 0.01
+DB_Q_NODATA = 0
+# float yoldaki eps'in karşılığı: 10·log10(1e-10)
+DB_FLOOR = -100.0
+
+# dönüştürülmeden tutulan dtype'lar; diğerleri float32'ye çevrilir
+_KEEP_DTYPES = (np.dtype(np.float32), np.dtype(np.uint16))
+
+def tiff_layout(tiff_bytes: bytes):
+    # (shape, dtype): çıktı tamponunu (ör. .npy memmap) decode'dan önce ayırmak için
+    with tiff.TiffFile(io.BytesIO(tiff_bytes)) as tf:
+        page = tf.pages[0]
+        dtype = page.dtype if page.dtype in _KEEP_DTYPES else np.dtype(np.float32)
+        return tuple(page.shape), dtype
+
+def decode_tiff(tiff_bytes: bytes, out: np.ndarray | None = None) -> np.ndarray:
+    # out verilirse piksel doğrudan ona çözülür (ara dizi yok); float32/uint16 kopyalanmadan döner
+    with metrics.span("decode", bytes=len(tiff_bytes)):
+        with tiff.TiffFile(io.BytesIO(tiff_bytes)) as tf:
+            page = tf.pages[0]
+            if out is None:
+                Z = page.asarray()
+                return Z if Z.dtype in _KEEP_DTYPES else Z.astype(np.float32)
+            if out.dtype == page.dtype:
+                page.asarray(out=out)
+            else:
+                out[...] = page.asarray()
+            return out
+
+def dequantise_db(Q: np.ndarray) -> np.ndarray:
+    D = np.multiply(Q, np.float32(DB_Q_SCALE), dtype=np.float32)
+    D += np.float32(DB_Q_OFFSET)
+    D[Q == DB_Q_NODATA] = DB_FLOOR
+    return D
+
+def to_db(Z: np.ndarray) -> np.ndarray:
+    # Z: doğrusal VV (float) ya da nicemlenmiş dB (uint16)
+    eps = 1e-10
+    with metrics.span("db"):
+        if Z.dtype == np.uint16:
+            return dequantise_db(Z)
+        D = np.maximum(Z, eps)
+        np.log10(D, out=D)
+        D *= 10.0
+        return D
+
+# çift-pol yığını: tek çoklu çıktı isteğinin bantları bu sırayla, (B, H, W) float32
+STACK_BANDS = ("VV", "VH", "dataMask")
+# VV / VH: tek bant; VV/VH: çapraz-pol oranı (dB farkı); VV+VH: bant z'lerinin birleşimi
+POL_MODES = ("VV", "VH", "VV/VH", "VV+VH")
+
+def decode_tar(tar_bytes: bytes) -> dict[str, bytes]:
+    # çoklu çıktı yanıtı (application/x-tar): her çıktı "<id>.tif"
+    with tarfile.open(fileobj=io.BytesIO(tar_bytes)) as tf:
+        return {os.path.splitext(m.name)[0]: tf.extractfile(m).read() for m in tf.getmembers() if m.isfile()}
+
+def stack_layout(parts: dict[str, bytes], bands=STACK_BANDS):
+    shape, _ = tiff_layout(parts[bands[0]])
+    return (len(bands),) + tuple(shape[:2]), np.dtype(np.float32)
+
+def decode_stack(parts: dict[str, bytes], out: np.ndarray | None = None, bands=STACK_BANDS) -> np.ndarray:
+    # her bant yığının kendi dilimine çözülür (dataMask uint8 → float32 0/1)
+    if out is None:
+        shape, dtype = stack_layout(parts, bands)
+        out = np.empty(shape, dtype=dtype)
+    for i, b in enumerate(bands):
+        decode_tiff(parts[b], out=out[i])
+    return out
+
+def stack_db(S: np.ndarray, pol: str) -> np.ndarray:
+    # gereken bantlar tek vektörel geçişte dB'ye çevrilir
+    if pol not in POL_MODES:
+        raise ValueError(f"Bilinmeyen polarizasyon: {pol}")
+    sl = {"VV": slice(0, 1), "VH": slice(1, 2)}.get(pol, slice(0, 2))
+    D = to_db(S[sl])
+    if pol == "VV/VH":
+        D = D[0:1] - D[1:2]
+    # dataMask=0: bant medyanıyla doldur (z≈0; NaN smoothing'de yayılırdı)
+    miss = S[STACK_BANDS.index("dataMask")] == 0
+    if miss.any():
+        for b in D:
+            b[miss] = np.median(b[~miss]) if not miss.all() else 0.0
+    return D if pol == "VV+VH" else D[0]
+
 def run_analysis_from_tiff_bytes(
     tiff_bytes: bytes,
     bbox: list[float],
@@ -119,89 +187,272 @@ def run_analysis_from_tiff_bytes(
     z_mode: str,
     thr: float,
     posneg: bool,
+    smooth_kind: str = "box",
+    topn: int | None = None,
+    stats_mode: str = "auto",
+    z_window: int = LOCAL_WIN,
+    cache: StageCache | None = None,
+    sweep: bool = False,
+    rank_by: str = "score",
 ):
-    Z = tiff.imread(io.BytesIO(tiff_bytes)).astype(np.float32)
-    H, W = Z.shape[:2]
+    src = bytes_key(tiff_bytes) if cache is not None else None
+    k, Z = _stage(cache, "decode", src, {}, lambda: decode_tiff(tiff_bytes))
+    k, Z_db = _stage(cache, "db", k, {}, lambda: to_db(Z))
+    return run_analysis_from_db(
+        Z_db, bbox, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, thr, posneg,
+        smooth_kind=smooth_kind, topn=topn, stats_mode=stats_mode, z_window=z_window,
+        cache=cache, source_key=k, sweep=sweep, rank_by=rank_by,
+    )
 
-    X, Y = np.meshgrid(
-        np.linspace(bbox[0], bbox[2], W),
-        np.linspace(bbox[1], bbox[3], H),
+def run_analysis_from_array(
+    Z: np.ndarray,
+    bbox: list[float],
+    clip_lo: float,
+    clip_hi: float,
+    smooth_on: bool,
+    smooth_k: int,
+    z_mode: str,
+    thr: float,
+    posneg: bool,
+    smooth_kind: str = "box",
+    topn: int | None = None,
+    stats_mode: str = "auto",
+    z_window: int = LOCAL_WIN,
+    cache: StageCache | None = None,
+    sweep: bool = False,
+    rank_by: str = "score",
+    pol: str = "VV",
+):
+    # Z: doğrusal VV (memmap olabilir; to_db yeni dizi üretir, kaynağa yazılmaz)
+    # ya da STACK_BANDS yığını (3D): pol bandı/birleşimi seçer
+    if Z.ndim == 3:
+        return run_analysis_from_stack(
+            Z, bbox, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, thr, posneg,
+            smooth_kind=smooth_kind, topn=topn, stats_mode=stats_mode, z_window=z_window,
+            cache=cache, sweep=sweep, rank_by=rank_by, pol=pol,
+        )
+    if pol != "VV":
+        raise ValueError(f"{pol} için çift-pol yığını gerekli (fetch_s1_stack)")
+    src = array_key(Z) if cache is not None else None
+    k, Z_db = _stage(cache, "db", src, {}, lambda: to_db(Z))
+    return run_analysis_from_db(
+        Z_db, bbox, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, thr, posneg,
+        smooth_kind=smooth_kind, topn=topn, stats_mode=stats_mode, z_window=z_window,
+        cache=cache, source_key=k, sweep=sweep, rank_by=rank_by,
     )
 
-    eps = 1e-10
-    Z_db = 10.0 * np.log10(np.maximum(Z, eps))
+def run_analysis_from_stack(
+    S: np.ndarray,
+    bbox: list[float],
+    clip_lo: float,
+    clip_hi: float,
+    smooth_on: bool,
+    smooth_k: int,
+    z_mode: str,
+    thr: float,
+    posneg: bool,
+    smooth_kind: str = "box",
+    topn: int | None = None,
+    stats_mode: str = "auto",
+    z_window: int = LOCAL_WIN,
+    cache: StageCache | None = None,
+    sweep: bool = False,
+    rank_by: str = "score",
+    pol: str = "VV+VH",
+):
+    src = array_key(S) if cache is not None else None
+    k, D = _stage(cache, "db", src, {"pol": pol}, lambda: stack_db(S, pol))
+    if pol != "VV+VH":
+        r = run_analysis_from_db(
+            D, bbox, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, thr, posneg,
+            smooth_kind=smooth_kind, topn=topn, stats_mode=stats_mode, z_window=z_window,
+            cache=cache, source_key=k, sweep=sweep, rank_by=rank_by,
+        )
+        r.extra["band"] = pol
+        return r
+
+    # bant başına clip → smooth → z; birleşik z = (z_VV + z_VH) / √2 (Stouffer):
+    # iki polarizasyonda birlikte görülen anomali güçlenir, tek banttaki gürültü zayıflar
+    xs, ys = grid_axes(bbox, S.shape[2], S.shape[1])
+    chains = [
+        _z_chain(
+            D[i], clip_lo, clip_hi, smooth_on, smooth_k, z_mode, smooth_kind, stats_mode, z_window,
+            cache, None if k is None else stage_key("band", k, band=b),
+        )
+        for i, b in enumerate(("VV", "VH"))
+    ]
+    (k_vv, Z_db_clip, z_vv), (k_vh, _, z_vh) = chains
+    k, Z_z = _stage(cache, "combine", k_vv, {"with": k_vh},
+                    lambda: ((z_vv + z_vh) * np.float32(1 / math.sqrt(2))).astype(np.float32, copy=False))
+    r = _detect(Z_db_clip, Z_z, k, bbox, xs, ys, thr, posneg, topn, cache, sweep, rank_by)
+    r.extra["band"] = "VV"
+    r.extra["pol"] = pol
+    return r
+
+def _stage(cache: StageCache | None, name: str, parent: str | None, params: dict, compute):
+    # cache yoksa düz çağrı; varsa anahtar = üst anahtar + parametreler
+    if cache is None:
+        return None, compute()
+    key = stage_key(name, parent, **params)
+    return key, cache.get_or_compute(name, key, compute)
+
+def _clip_stage(Z_db, clip_lo, clip_hi, robust, stats_mode):
+    with metrics.span("clip", mode=stats_mode):
+        cs = clip_stats(Z_db, clip_lo, clip_hi, robust=robust, method=stats_mode)
+        return np.clip(Z_db, cs["p_lo"], cs["p_hi"]).astype(np.float32, copy=False), cs
+
+def _smooth_stage(Z_db_clip, smooth_k, smooth_kind):
+    with metrics.span("smooth", kind=smooth_kind, k=int(smooth_k)):
+        return smooth(Z_db_clip, k=int(smooth_k), kind=smooth_kind)
+
+def _normalise_stage(Z_s, kind, cs, z_mode, z_window, stats_mode):
+    with metrics.span("normalise", mode=z_mode):
+        if kind == "local":
+            Z_z = local_robust_z(Z_s, win=z_window, method=stats_mode)
+        else:
+            if cs is None:
+                cs = center_scale(Z_s, robust=(kind == "robust"), method=stats_mode)
+            Z_z = zscore(Z_s, cs["center"], cs["scale"]) if cs["n"] else Z_s * np.nan
+        return Z_z.astype(np.float32, copy=False)
+
+def _threshold_stage(Z_z, thr, posneg):
+    with metrics.span("threshold"):
+        if posneg:
+            pos_mask = (Z_z >= thr)
+            neg_mask = (Z_z <= -thr)
+        else:
+            pos_mask = (np.abs(Z_z) >= thr)
+            neg_mask = np.zeros_like(pos_mask, dtype=bool)
+        return pos_mask.view(np.int8) - neg_mask.view(np.int8)
+
+def _label_stage(pn, Z_z):
+    with metrics.span("label"):
+        return label_posneg(pn > 0, pn < 0, Z_z)
+
+def _score_stage(stats, Z_z, xs, ys):
+    with metrics.span("score"):
+        return score_components(stats, Z_z, xs, ys, win=1)
+
+def _tree_stage(Z_z, xs, ys, posneg):
+    with metrics.span("tree.build", px=int(Z_z.size)):
+        return ComponentTree(Z_z, xs, ys, posneg=posneg)
+
+def run_analysis_from_db(
+    Z_db: np.ndarray,
+    bbox: list[float],
+    clip_lo: float,
+    clip_hi: float,
+    smooth_on: bool,
+    smooth_k: int,
+    z_mode: str,
+    thr: float,
+    posneg: bool,
+    smooth_kind: str = "box",
+    topn: int | None = None,
+    stats_mode: str = "auto",
+    z_window: int = LOCAL_WIN,
+    cache: StageCache | None = None,
+    source_key: str | None = None,
+    sweep: bool = False,
+    rank_by: str = "score",
+):
+    # clip → smooth → normalise → threshold → label → score; cache verilirse her aşama
+    # içerik+parametre anahtarıyla saklanır, parametre değişince yalnız alt aşamalar koşar
+    H, W = Z_db.shape[:2]
+    xs, ys = grid_axes(bbox, W, H)
+    k, Z_db_clip, Z_z = _z_chain(
+        Z_db, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, smooth_kind, stats_mode, z_window,
+        cache, source_key,
+    )
+    return _detect(Z_db_clip, Z_z, k, bbox, xs, ys, thr, posneg, topn, cache, sweep, rank_by)
+
+def _z_chain(Z_db, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, smooth_kind, stats_mode, z_window,
+             cache, source_key):
+    # clip → (smooth) → normalise; dönüş: (anahtar, kırpılmış dB, z)
+    if cache is not None and source_key is None:
+        source_key = array_key(Z_db)
+
+    kind = z_kind(z_mode)
+    smoothed = smooth_on and smooth_k > 1
+    # smoothing yoksa clip sınırları + medyan/MAD (ya da ortalama/std) tek seçim geçişinde
+    shared = not smoothed and kind != "local"
+    robust = (kind == "robust") if shared else None
+    k, (Z_db_clip, cs) = _stage(
+        cache, "clip", source_key,
+        {"lo": clip_lo, "hi": clip_hi, "robust": robust, "method": stats_mode},
+        lambda: _clip_stage(Z_db, clip_lo, clip_hi, robust, stats_mode),
+    )
 
-    valid = Z_db[~np.isnan(Z_db)]
-    p_lo, p_hi = np.percentile(valid, [clip_lo, clip_hi])
-    Z_db_clip = np.clip(Z_db, p_lo, p_hi)
+    if smoothed:
+        k, Z_db_clip = _stage(
+            cache, "smooth", k, {"k": int(smooth_k), "kind": smooth_kind},
+            lambda: _smooth_stage(Z_db_clip, smooth_k, smooth_kind),
+        )
 
-    if smooth_on and smooth_k > 1:
-        Z_db_clip = box_blur(Z_db_clip.astype(np.float32), k=int(smooth_k))
+    k, Z_z = _stage(
+        cache, "normalise", k, {"kind": kind, "win": int(z_window), "method": stats_mode},
+        lambda: _normalise_stage(Z_db_clip, kind, cs if shared else None, z_mode, z_window, stats_mode),
+    )
+    return k, Z_db_clip, Z_z
 
-    Z_z = robust_z(Z_db_clip) if z_mode.startswith("Robust") else classic_z(Z_db_clip)
+def threshold_tree(r: AnalysisResult, cache: StageCache | None = None):
+    # canlı eşik için ağaç: sonuçta yoksa ilk kullanımda kurulur (iş pickle'ına girmez); büyük rasterda None
+    tree = r.extra.get("tree")
+    if tree is None and r.Z_z.size <= SWEEP_MAX_PX:
+        posneg = bool(r.extra.get("posneg", True))
+        _, tree = _stage(cache, "tree", array_key(r.Z_z) if cache is not None else None,
+                         {"posneg": posneg, "bbox": [float(v) for v in r.bbox]},
+                         lambda: _tree_stage(r.Z_z, r.xs, r.ys, posneg))
+        r.extra["tree"] = tree
+    return tree
 
-    if posneg:
-        pos_mask = (Z_z >= thr)
-        neg_mask = (Z_z <= -thr)
+def _detect(Z_db_clip, Z_z, k, bbox, xs, ys, thr, posneg, topn, cache, sweep, rank_by):
+    # threshold → label → score (ya da eşik ağacından okuma) → sıralama
+    # extra["rank_by"]: gerçekten uygulanan sıralama (kalıcılık hesaplanamazsa "score" + rank_note)
+    extra = {"posneg": bool(posneg), "rank_by": rank_by}
+    tree = None
+    if (sweep or rank_by == "stability") and Z_z.size <= SWEEP_MAX_PX:
+        # kalıcılık sıralaması ağaç ister (46 seviye etiketleme); diğer sıralamalarda slider'a bırakılır
+        _, tree = _stage(cache, "tree", k, {"posneg": bool(posneg), "bbox": [float(v) for v in bbox]},
+                         lambda: _tree_stage(Z_z, xs, ys, posneg))
+        extra["tree"] = tree
+    j = tree.nearest_level(thr) if tree is not None else None
+    if j is not None:
+        # ızgara dışı eşik (ör. 2.85) en yakın seviyeye oturur: kalıcılık o seviyede tanımlı
+        lvl = float(tree.levels[j])
+        if abs(lvl - float(thr)) > 1e-9:
+            extra["thr_level"] = lvl
+        with metrics.span("tree.readout", thr=lvl):
+            pn = tree.posneg_map(lvl)
+            labels = tree.labels(lvl)
+            comps = tree.components(lvl)
     else:
-        pos_mask = (np.abs(Z_z) >= thr)
-        neg_mask = np.zeros_like(pos_mask, dtype=bool)
-
-    comps_pos = connected_components(pos_mask) if np.any(pos_mask) else []
-    comps_neg = connected_components(neg_mask) if np.any(neg_mask) else []
-
-    def score_components(comps, sign_label):
-        ranked = []
-        for comp in comps:
-            pix = comp["pixels"]
-            rr = np.array([p[0] for p in pix], dtype=int)
-            cc = np.array([p[1] for p in pix], dtype=int)
-
-            vals = Z_z[rr, cc]
-            if sign_label == "POS":
-                k = int(np.argmax(vals))
-                signed_peak = float(vals[k])
-            else:
-                k = int(np.argmin(vals))
-                signed_peak = float(vals[k])
-
-            peak_abs = float(abs(signed_peak))
-            area = int(comp["area"])
-            rmin, rmax, cmin, cmax = comp["bbox"]
-
-            bbox_area = int((rmax - rmin + 1) * (cmax - cmin + 1))
-            fill = (area / bbox_area) if bbox_area > 0 else 0.0
-            score = peak_abs * math.log1p(area) * (0.6 + 0.8 * fill)
-
-            peak_r = int(rr[k])
-            peak_c = int(cc[k])
-            target_lat, target_lon = weighted_peak_center(peak_r, peak_c, Z_z, X, Y, win=1)
-
-            rel_z = estimate_relative_depth(area, peak_abs)
-
-            ranked.append({
-                "type": sign_label,
-                "score": float(score),
-                "peak_z": float(signed_peak),
-                "area": area,
-                "fill": float(fill),
-                "bbox_rc": (int(rmin), int(rmax), int(cmin), int(cmax)),
-                "target_lat": float(target_lat),
-                "target_lon": float(target_lon),
-                "rel_depth": float(rel_z),
-            })
-        ranked.sort(key=lambda d: d["score"], reverse=True)
-        return ranked
-
-    ranked = score_components(comps_pos, "POS") + score_components(comps_neg, "NEG")
-    ranked.sort(key=lambda d: d["score"], reverse=True)
-
-    return {
-        "Z_db_clip": Z_db_clip,
-        "X": X,
-        "Y": Y,
-        "Z_z": Z_z,
-        "ranked": ranked,
-        "pos_mask": pos_mask,
-        "neg_mask": neg_mask,
-    }
+        if rank_by == "stability":
+            # ağaç yok (raster büyük) ya da eşik seviye aralığı dışında: kalıcılık 0 olurdu, skorla sıralanır
+            extra["rank_by"] = rank_by = "score"
+            extra["rank_note"] = (
+                f"Kalıcılık hesaplanmadı (raster {Z_z.size} px > {SWEEP_MAX_PX}); skora göre sıralandı."
+                if tree is None else
+                f"Kalıcılık hesaplanmadı (eşik {float(thr):g} ağaç seviyelerinin dışında); skora göre sıralandı."
+            )
+        k, pn = _stage(cache, "threshold", k, {"thr": float(thr), "posneg": bool(posneg)},
+                       lambda: _threshold_stage(Z_z, thr, posneg))
+        k, (labels, stats) = _stage(cache, "label", k, {}, lambda: _label_stage(pn, Z_z))
+        # skor koordinat eksenlerine bağlı: bbox anahtara girer
+        k, comps = _stage(cache, "score", k, {"bbox": [float(v) for v in bbox]},
+                          lambda: _score_stage(stats, Z_z, xs, ys))
+    # sıralama her çağrıda (TopN değişimi yalnız bunu etkiler; kısmi seçim, ucuz)
+    ranked = to_records(top_n(comps, topn, by=rank_by))
+
+    return AnalysisResult(
+        bbox=list(bbox),
+        xs=xs,
+        ys=ys,
+        Z_db_clip=Z_db_clip,
+        Z_z=Z_z,
+        posneg=pn,
+        labels=labels,
+        components=comps,
+        ranked=ranked,
+        extra=extra,
+    )
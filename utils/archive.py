@@ -0,0 +1,182 @@
+import json
+import mmap
+import os
+import uuid
+
+import numpy as np
+import tifffile as tiff
+
+from utils import metrics
+from utils.result import AnalysisResult, grid_axes
+from utils.scoring import COMPONENT_DTYPE
+
+# taramanın rasterları: döşemeli + deflate GeoTIFF (QGIS/GDAL doğrudan açar), geçmiş id'siyle
+ARCHIVE_DIR = os.environ.get("TURKELLER_ARCHIVE_DIR", ".scan_archive")
+MAX_BYTES = int(os.environ.get("TURKELLER_ARCHIVE_MB", "512")) * 1024 * 1024
+TILE_PX = 256
+PAGES = ("Z_db_clip", "Z_z", "labels")
+
+# GeoKey: coğrafi model, PixelIsArea, WGS84 (EPSG:4326), derece
+_GEOKEYS = (1, 1, 0, 4, 1024, 0, 1, 2, 1025, 0, 1, 1, 2048, 0, 1, 4326, 2054, 0, 1, 9102)
+
+def archive_path(scan_id: int, archive_dir: str | None = None) -> str:
+    return os.path.join(archive_dir or ARCHIVE_DIR, f"scan_{int(scan_id)}.tif")
+
+def has_archive(scan_id: int, archive_dir: str | None = None) -> bool:
+    return os.path.exists(archive_path(scan_id, archive_dir))
+
+def _label_dtype(labels: np.ndarray):
+    n = int(labels.max()) if labels.size else 0
+    return np.uint8 if n < 2 ** 8 else np.uint16 if n < 2 ** 16 else np.uint32
+
+def _geotags(r: AnalysisResult, name: str):
+    # satır 0 kuzey (sonuçla aynı, çevrilmeden yazılır); bağlama noktası sol üst köşe (bbox[0], bbox[3])
+    # ModelPixelScale pozitif yazılır: GDAL bunu aşağı inen satırlar sayar (geotransform dy < 0)
+    b = r.bbox
+    H, W = r.shape
+    return [
+        (33550, "d", 3, ((b[2] - b[0]) / W, (b[3] - b[1]) / H, 0.0), True),
+        (33922, "d", 6, (0.0, 0.0, 0.0, float(b[0]), float(b[3]), 0.0), True),
+        (34735, "H", len(_GEOKEYS), _GEOKEYS, True),
+        # GDAL bant adı (QGIS katman listesinde görünür)
+        (42112, "s", 0, f'<GDALMetadata><Item name="DESCRIPTION" sample="0" role="description">{name}</Item></GDALMetadata>', True),
+    ]
+
+def save_scan(scan_id: int, r: AnalysisResult, meta: dict | None = None, archive_dir: str | None = None) -> str:
+    # üç sayfa (dB, z, etiket), her biri döşemeli; ilk sayfanın açıklaması JSON (bbox, sıralama, parametreler)
+    archive_dir = archive_dir or ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    path = archive_path(scan_id, archive_dir)
+    desc = dict(meta or {}, scan_id=int(scan_id), bbox=[float(v) for v in r.bbox], shape=list(r.shape),
+                pages=list(PAGES), band=r.extra.get("band", "VV"), posneg=bool(r.extra.get("posneg", True)),
+                ranked=r.ranked)
+    arrays = (
+        np.asarray(r.Z_db_clip, dtype=np.float32),
+        np.asarray(r.Z_z, dtype=np.float32),
+        r.labels.astype(_label_dtype(r.labels), copy=False),
+    )
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    with metrics.span("archive.write", px=int(r.Z_z.size)):
+        try:
+            with tiff.TiffWriter(tmp) as tw:
+                for i, (name, a) in enumerate(zip(PAGES, arrays)):
+                    # TIFF metinleri ASCII: JSON kaçışlı yazılır
+                    tw.write(
+                        a, tile=(TILE_PX, TILE_PX), compression="zlib", photometric="minisblack",
+                        description=json.dumps(desc) if i == 0 else None,
+                        metadata=None, extratags=_geotags(r, name),
+                    )
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+    metrics.count("archive.bytes", os.path.getsize(path))
+    evict(archive_dir)
+    return path
+
+def read_meta(scan_id: int, archive_dir: str | None = None) -> dict | None:
+    try:
+        with tiff.TiffFile(archive_path(scan_id, archive_dir)) as tf:
+            return json.loads(tf.pages[0].description)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _read_window(page, mm, r0: int, r1: int, c0: int, c1: int) -> np.ndarray:
+    # yalnız pencereye değen döşemeler mmap'ten okunup açılır (dosya satırları: 0 = kuzey)
+    th, tw = page.tilelength, page.tilewidth
+    nx = -(-page.imagewidth // tw)
+    out = np.empty((r1 - r0, c1 - c0), dtype=page.dtype)
+    n = 0
+    for ty in range(r0 // th, (r1 - 1) // th + 1):
+        for tx in range(c0 // tw, (c1 - 1) // tw + 1):
+            i = ty * nx + tx
+            off, cnt = page.dataoffsets[i], page.databytecounts[i]
+            tile = page.decode(mm[off:off + cnt], i)[0].reshape(th, tw)
+            n += 1
+            ra, rb = max(r0, ty * th), min(r1, (ty + 1) * th)
+            ca, cb = max(c0, tx * tw), min(c1, (tx + 1) * tw)
+            out[ra - r0:rb - r0, ca - c0:cb - c0] = tile[ra - ty * th:rb - ty * th, ca - tx * tw:cb - tx * tw]
+    metrics.count("archive.tiles", n)
+    return out
+
+def _window_rc(meta: dict, bbox: list[float] | None):
+    # lon/lat penceresi → merkezi pencerede kalan satır/sütun aralığı (satır 0 = kuzey); None → tamamı
+    H, W = meta["shape"]
+    if bbox is None:
+        return 0, H, 0, W
+    xs, ys = grid_axes(meta["bbox"], W, H)
+    c0, c1 = int(np.searchsorted(xs, bbox[0], "left")), int(np.searchsorted(xs, bbox[2], "right"))
+    # ys azalan: -ys artan
+    r0, r1 = int(np.searchsorted(-ys, -bbox[3], "left")), int(np.searchsorted(-ys, -bbox[1], "right"))
+    if r1 <= r0 or c1 <= c0:
+        raise ValueError("Pencere arşiv kapsamının dışında.")
+    return r0, r1, c0, c1
+
+def load_scan(scan_id: int, bbox: list[float] | None = None, archive_dir: str | None = None):
+    # → (AnalysisResult, meta) ya da arşiv yoksa None; bbox verilirse yalnız o bölgenin döşemeleri okunur
+    path = archive_path(scan_id, archive_dir)
+    if not os.path.exists(path):
+        return None
+    with metrics.span("archive.read"), tiff.TiffFile(path) as tf, open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        meta = json.loads(tf.pages[0].description)
+        H, W = meta["shape"]
+        r0, r1, c0, c1 = _window_rc(meta, bbox)
+        Z_db_clip, Z_z, labels = (_read_window(tf.pages[i], mm, r0, r1, c0, c1) for i in range(len(PAGES)))
+    # pencerenin kendi bbox'ı piksel kenarlarından: eksenler tam ızgarayla aynı kalır
+    b = meta["bbox"]
+    px, py = (b[2] - b[0]) / W, (b[3] - b[1]) / H
+    wbox = [b[0] + c0 * px, b[3] - r1 * py, b[0] + c1 * px, b[3] - r0 * py]
+    xs, ys = grid_axes(wbox, c1 - c0, r1 - r0)
+    labels = labels.astype(np.int32)
+    posneg = bool(meta.get("posneg", True))
+    ranked = meta.get("ranked") or []
+    if bbox is not None:
+        ranked = [t for t in ranked if bbox[0] <= t["target_lon"] <= bbox[2] and bbox[1] <= t["target_lat"] <= bbox[3]]
+    r = AnalysisResult(
+        bbox=wbox if bbox is not None else meta["bbox"],
+        xs=xs,
+        ys=ys,
+        Z_db_clip=Z_db_clip,
+        Z_z=Z_z,
+        # POS bileşenler z ≥ eşik, NEG z ≤ -eşik: işaret etiketten ve z'den okunur;
+        # ayrım kapalıysa (|z| ≥ eşik) her bileşen POS
+        posneg=np.where(labels > 0, np.sign(Z_z) if posneg else 1, 0).astype(np.int8),
+        labels=labels,
+        # bileşen tablosu arşivlenmez; sıralı liste açıklamadan gelir
+        components=np.zeros(0, dtype=COMPONENT_DTYPE),
+        ranked=ranked,
+        extra={"band": meta.get("band", "VV"), "posneg": posneg, "archived": True},
+    )
+    return r, meta
+
+def archive_bytes(scan_id: int, archive_dir: str | None = None) -> bytes:
+    # indirme için (st.download_button tıklanınca çağırır)
+    with open(archive_path(scan_id, archive_dir), "rb") as f:
+        return f.read()
+
+def evict(archive_dir: str | None = None, max_bytes: int = MAX_BYTES):
+    # boyut sınırı: en eski arşivler silinir (geçmiş kaydı kalır, yalnız raster tekrar çekilir)
+    archive_dir = archive_dir or ARCHIVE_DIR
+    files = []
+    for fn in os.listdir(archive_dir):
+        if fn.endswith(".tif"):
+            p = os.path.join(archive_dir, fn)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+    total = sum(f[1] for f in files)
+    for _, size, p in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(p)
+            total -= size
+            metrics.count("archive.evicted")
+        except OSError:
+            pass
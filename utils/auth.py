@@ -0,0 +1,113 @@
+import threading
+import time
+
+from utils import metrics
+
+# expires_in gelmezse (CDSE: 600 sn)
+DEFAULT_TTL = 300.0
+# bitişe bu kadar kala token geçersiz sayılır (saat kayması + istek süresi)
+EXPIRY_SKEW = 30.0
+# ömrün bu oranında arka planda yenilenir
+REFRESH_AT = 0.8
+# bu süre kullanılmayan token arka planda yenilenmez (boşta istek yağdırmasın)
+IDLE_S = 30 * 60
+RETRY_S = 15.0
+
+class TokenManager:
+    # süreç geneli token: expires_in'e göre arka planda yenilenir, aynı anda tek istek,
+    # hata cache'lenmez (bir sonraki çağrı yeniden dener)
+    def __init__(self, fetch, default_ttl: float = DEFAULT_TTL, skew: float = EXPIRY_SKEW,
+                 refresh_at: float = REFRESH_AT, idle_s: float = IDLE_S, background: bool = True):
+        # fetch() → (access_token | None, expires_in | None); hata fırlatabilir
+        self._fetch = fetch
+        self.default_ttl = float(default_ttl)
+        self.skew = float(skew)
+        self.refresh_at = float(refresh_at)
+        self.idle_s = float(idle_s)
+        self.background = bool(background)
+        self._lock = threading.Lock()        # durum
+        self._fetch_lock = threading.Lock()  # tek uçuş: aynı anda tek token isteği
+        self._token = None
+        self._expires = 0.0
+        self._last_used = 0.0
+        self._timer = None
+
+    def _valid_locked(self, now: float):
+        if self._token and now < self._expires - self.skew:
+            return self._token
+        return None
+
+    def get(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            self._last_used = now
+            tok = self._valid_locked(now)
+        if tok is not None:
+            metrics.count("cache.token.hit")
+            return tok
+        metrics.count("cache.token.miss")
+        return self._refresh(force=False)
+
+    @property
+    def expires_in(self) -> float:
+        with self._lock:
+            return max(0.0, self._expires - time.monotonic()) if self._token else 0.0
+
+    def invalidate(self, token: str | None = None):
+        # 401 gibi durumlarda: yalnız verilen token hâlâ güncelse düşürülür
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires = 0.0
+
+    def _refresh(self, force: bool) -> str:
+        with self._fetch_lock:
+            if not force:
+                # beklerken başka iş parçacığı yenilemiş olabilir
+                with self._lock:
+                    tok = self._valid_locked(time.monotonic())
+                if tok is not None:
+                    return tok
+            with metrics.span("cdse.token.request", background=force):
+                token, expires_in = self._fetch()
+            if not token:
+                raise RuntimeError("Token alınamadı (client_id/secret yanlış olabilir).")
+            ttl = float(expires_in) if expires_in else self.default_ttl
+            with self._lock:
+                self._token = token
+                self._expires = time.monotonic() + ttl
+            self._schedule(max(1.0, min(ttl * self.refresh_at, ttl - self.skew - 1.0)))
+            return token
+
+    def _schedule(self, delay: float):
+        if not self.background:
+            return
+        t = threading.Timer(delay, self._background_refresh)
+        t.daemon = True
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = t
+        t.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            idle = time.monotonic() - self._last_used > self.idle_s
+        if idle:
+            # kimse kullanmıyor: süresi dolsun, ilk çağrı yeniden alır
+            return
+        try:
+            self._refresh(force=True)
+            metrics.count("cdse.token.refresh")
+        except Exception:
+            metrics.count("cdse.token.refresh_error")
+            # eldeki token hâlâ geçerliyse süresi dolmadan tekrar dene
+            left = self.expires_in - self.skew
+            if left > 1.0:
+                self._schedule(min(RETRY_S, left / 2))
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
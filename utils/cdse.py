@@ -1,17 +1,41 @@
-import requests
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
 import streamlit as st
 
-AUTH_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
-PROCESS_URL = "https://sh.dataspace.copernicus.eu/api/v1/process"
+from utils import metrics, raster_cache
+from utils.auth import TokenManager
+from utils.gridfetch import GridFetcher
+from utils.http import get_client
+from utils.analysis import (
+    DB_Q_NODATA, DB_Q_OFFSET, DB_Q_SCALE, STACK_BANDS,
+    decode_stack, decode_tar, decode_tiff, stack_layout, tiff_layout,
+)
+
+# ortam değişkeniyle yerel stub sunucuya yönlendirilebilir
+AUTH_URL = os.environ.get("CDSE_AUTH_URL", "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token")
+PROCESS_URL = os.environ.get("CDSE_PROCESS_URL", "https://sh.dataspace.copernicus.eu/api/v1/process")
+
+CREDENTIAL_KEYS = ("CDSE_CLIENT_ID", "CDSE_CLIENT_SECRET", "CDSE_USERNAME", "CDSE_PASSWORD")
+
+def request_token(client_id: str, client_secret: str, username: str | None = None, password: str | None = None):
+    # → (access_token | None, expires_in | None)
+    metrics.count("cdse.token.request")
+    return _request_token(client_id, client_secret, username, password)
+
+def _token_response(r):
+    body = r.json()
+    return body.get("access_token"), body.get("expires_in")
 
-@st.cache_data(ttl=45 * 60, show_spinner=False)
-def cached_token(client_id: str, client_secret: str, username: str | None = None, password: str | None = None):
+def _request_token(client_id: str, client_secret: str, username: str | None = None, password: str | None = None):
     # 1) client_credentials
     try:
         data = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
-        r = requests.post(AUTH_URL, data=data, timeout=30)
+        r = get_client().post(AUTH_URL, data=data, timeout=30, deadline=60)
         if r.status_code == 200:
-            return r.json().get("access_token")
+            return _token_response(r)
     except Exception:
         pass
 
@@ -19,54 +43,218 @@ def cached_token(client_id: str, client_secret: str, username: str | None = None
     if username and password:
         try:
             data = {"grant_type": "password", "client_id": client_id, "username": username, "password": password}
-            r = requests.post(AUTH_URL, data=data, timeout=30)
+            r = get_client().post(AUTH_URL, data=data, timeout=30, deadline=60)
             if r.status_code == 200:
-                return r.json().get("access_token")
+                return _token_response(r)
         except Exception:
             pass
 
+    return None, None
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_token_manager(creds: dict) -> TokenManager:
+    # kimlik bilgisi başına süreç geneli tek yönetici: tüm oturumlar/işçiler aynı token'ı paylaşır
+    key = tuple(creds.get(k) for k in CREDENTIAL_KEYS)
+    with _managers_lock:
+        tm = _managers.get(key)
+        if tm is None:
+            tm = _managers[key] = TokenManager(lambda: request_token(*key))
+        return tm
+
+def read_credentials() -> dict | None:
+    # önce st.secrets (uygulama), yoksa ortam değişkenleri (CLI / sunucu)
+    try:
+        if "CDSE_CLIENT_ID" in st.secrets and "CDSE_CLIENT_SECRET" in st.secrets:
+            return {k: st.secrets.get(k) for k in CREDENTIAL_KEYS}
+    except Exception:
+        # Streamlit dışında secrets.toml yoksa st.secrets erişimi hata verir
+        pass
+    env = {k: os.environ.get(k) for k in CREDENTIAL_KEYS}
+    if env["CDSE_CLIENT_ID"] and env["CDSE_CLIENT_SECRET"]:
+        return env
     return None
 
 def get_token_from_secrets() -> str:
-    if "CDSE_CLIENT_ID" not in st.secrets or "CDSE_CLIENT_SECRET" not in st.secrets:
+    creds = read_credentials()
+    if creds is None:
         raise RuntimeError("Secrets eksik: CDSE_CLIENT_ID ve CDSE_CLIENT_SECRET gerekli.")
-    token = cached_token(
-        st.secrets["CDSE_CLIENT_ID"],
-        st.secrets["CDSE_CLIENT_SECRET"],
-        st.secrets.get("CDSE_USERNAME"),
-        st.secrets.get("CDSE_PASSWORD"),
-    )
-    if not token:
-        raise RuntimeError("Token alınamadı (client_id/secret yanlış olabilir).")
-    return token
+    # geçerli token bellekten; yenileme arka planda, analiz yolunda bekleme yok
+    with metrics.span("cdse.token"):
+        return get_token_manager(creds).get()
 
-@st.cache_data(ttl=30 * 60, show_spinner=False)
-def fetch_s1_tiff_bytes(token: str, bbox: list[float], width: int, height: int) -> bytes:
-    # Sentinel-1 GRD VV
-    evalscript = """
-    function setup() {
-      return { input: ["VV"], output: { id: "default", bands: 1, sampleType: "FLOAT32" } };
-    }
-    function evaluatePixel(sample) { return [sample.VV]; }
-    """
+def get_token_from_env() -> str:
+    # Streamlit'e hiç dokunmadan (CLI, işçi süreçleri)
+    creds = {k: os.environ.get(k) for k in CREDENTIAL_KEYS}
+    if not creds["CDSE_CLIENT_ID"] or not creds["CDSE_CLIENT_SECRET"]:
+        raise RuntimeError("Ortam değişkenleri eksik: CDSE_CLIENT_ID ve CDSE_CLIENT_SECRET gerekli.")
+    return get_token_manager(creds).get()
+
+# Sentinel-1 GRD VV
+S1_COLLECTION = "sentinel-1-grd"
+EVALSCRIPT_VV = """
+function setup() {
+  return { input: ["VV"], output: { id: "default", bands: 1, sampleType: "FLOAT32" } };
+}
+function evaluatePixel(sample) { return [sample.VV]; }
+"""
+# dB sunucuda hesaplanır ve UINT16'ya nicemlenir (ölçek/ofset: utils.analysis.DB_Q_*);
+# yanıt sıkıştırmasız TIFF: float32'nin yarısı bayt
+EVALSCRIPT_VV_DB_U16 = f"""
+//VERSION=3
+function setup() {{
+  return {{ input: ["VV", "dataMask"], output: {{ id: "default", bands: 1, sampleType: "UINT16" }} }};
+}}
+function evaluatePixel(sample) {{
+  if (sample.dataMask === 0 || !(sample.VV > 0)) return [{DB_Q_NODATA}];
+  const db = 10 * Math.log(sample.VV) / Math.LN10;
+  return [Math.min(65535, Math.max(1, Math.round((db - ({DB_Q_OFFSET})) / {DB_Q_SCALE})))];
+}}
+"""
+# aktarım modu: float32 (tam hassasiyet, doğrusal VV) | uint16 (nicemlenmiş dB)
+EVALSCRIPTS = {"float32": EVALSCRIPT_VV, "uint16": EVALSCRIPT_VV_DB_U16}
+TRANSFER = os.environ.get("TURKELLER_TRANSFER", "float32")
+
+# çift-pol: VV, VH ve dataMask tek istekte, ayrı çıktılar (tar içinde <id>.tif)
+# VV/VH oranı istemcide dB farkı olarak hesaplanır: ek bant aktarmaya gerek yok
+EVALSCRIPT_DUAL_POL = """
+//VERSION=3
+function setup() {
+  return {
+    input: ["VV", "VH", "dataMask"],
+    output: [
+      { id: "VV", bands: 1, sampleType: "FLOAT32" },
+      { id: "VH", bands: 1, sampleType: "FLOAT32" },
+      { id: "dataMask", bands: 1, sampleType: "UINT8" }
+    ]
+  };
+}
+function evaluatePixel(sample) {
+  return { VV: [sample.VV], VH: [sample.VH], dataMask: [sample.dataMask] };
+}
+"""
+
+def _evalscript(transfer: str | None) -> str:
+    try:
+        return EVALSCRIPTS[transfer or TRANSFER]
+    except KeyError:
+        raise ValueError(f"Bilinmeyen aktarım modu: {transfer}") from None
+
+def _process_request(token: str, bbox: list[float], width: int, height: int, evalscript: str, collection: str,
+                     time_range: tuple[str, str] | None = None, outputs: tuple[str, ...] = ("default",)) -> bytes:
+    # birden çok çıktı → tek yanıt, tar arşivi
+    data = {"type": collection}
+    if time_range is not None:
+        # zaman serisi: dilimdeki en güncel geçiş
+        data["dataFilter"] = {"timeRange": {"from": time_range[0], "to": time_range[1]}, "mosaickingOrder": "mostRecent"}
     payload = {
         "input": {
             "bounds": {"bbox": bbox, "properties": {"crs": "http://www.opengis.net/def/crs/OGC/1.3/CRS84"}},
-            "data": [{"type": "sentinel-1-grd"}],
+            "data": [data],
         },
         "output": {
             "width": width,
             "height": height,
-            "responses": [{"identifier": "default", "format": {"type": "image/tiff"}}],
+            "responses": [{"identifier": o, "format": {"type": "image/tiff"}} for o in outputs],
         },
         "evalscript": evalscript,
     }
-    res = requests.post(
-        PROCESS_URL,
-        headers={"Authorization": f"Bearer {token}"},
-        json=payload,
-        timeout=80,
-    )
+    headers = {"Authorization": f"Bearer {token}"}
+    if len(outputs) > 1:
+        headers["Accept"] = "application/tar"
+    with metrics.span("cdse.process", width=int(width), height=int(height), outputs=len(outputs)) as sp:
+        res = get_client().post(
+            PROCESS_URL,
+            headers=headers,
+            json=payload,
+            timeout=80,
+            deadline=180,
+        )
+        sp["status"] = res.status_code
+        sp["bytes"] = len(res.content)
+    metrics.count("cdse.process.requests")
+    metrics.count("cdse.bytes_in", len(res.content))
+    if res.status_code == 401:
+        # iptal edilmiş / erken dolmuş token: bir sonraki çağrı yenisini alır
+        with _managers_lock:
+            managers = list(_managers.values())
+        for tm in managers:
+            tm.invalidate(token)
     if res.status_code != 200:
         raise RuntimeError(f"CDSE HTTP {res.status_code} | {res.text[:400]}")
     return res.content
+
+# _token: st.cache_data alt çizgili argümanı anahtara katmaz → token yenilemesi cache'i düşürmez
+@st.cache_data(ttl=30 * 60, show_spinner=False)
+def fetch_s1_tiff_bytes(_token: str, bbox: list[float], width: int, height: int, transfer: str | None = None) -> bytes:
+    metrics.count("cache.tiff_bytes.miss")
+    return _process_request(_token, bbox, width, height, _evalscript(transfer), S1_COLLECTION)
+
+# global ızgaraya oturtma (isteğe bağlı): yakın taramalar aynı hücreleri paylaşır, eşzamanlı istekler tek uçuşta birleşir
+# hücreler √2 merdiveninde istenenden ince pikselle çekilip en yakın komşuyla kesilir: etkin piksel
+# küçülür (daha az look, daha yüksek speckle varyansı) → z istatistiği snap=False ile birebir aynı değil
+GRID_SNAP = os.environ.get("TURKELLER_GRID_SNAP", "0") == "1"
+# zaman aralığı verilmemiş hücre çekimleri bu pencereden (en güncel geçiş); anahtara da girer
+GRID_LOOKBACK_DAYS = int(os.environ.get("TURKELLER_GRID_LOOKBACK_DAYS", "30"))
+_grid = GridFetcher()
+
+def grid_window(now: datetime | None = None) -> tuple[str, str]:
+    # bitiş: dünün UTC gün başı (alım gecikmesi payı); aynı gün çekilen hücreler aynı pencereyi
+    # paylaşır, farklı pencerelerin hücreleri farklı anahtarla tek mozaikte karışmaz
+    end = (now or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    start = end - timedelta(days=GRID_LOOKBACK_DAYS)
+    return start.strftime("%Y-%m-%dT%H:%M:%SZ"), end.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _single_band(raw: bytes) -> np.ndarray:
+    Z = decode_tiff(raw)
+    return Z[..., 0] if Z.ndim == 3 else Z
+
+def fetch_s1_array(token: str, bbox: list[float], width: int, height: int,
+                   time_range: tuple[str, str] | None = None, transfer: str | None = None,
+                   snap: bool | None = None) -> np.ndarray:
+    # kalıcı disk cache (.npy, memmap): yeniden başlatmada ve token yenilemesinde korunur
+    # float32 → doğrusal VV; uint16 → nicemlenmiş dB (to_db ikisini de çözer)
+    evalscript = _evalscript(transfer)
+    extra = {} if time_range is None else {"time_range": list(time_range)}
+
+    if GRID_SNAP if snap is None else snap:
+        # hücreler cache'ten / tek istekte; kullanıcı bbox'ı hücre mozaiğinden kesilir
+        tr = time_range or grid_window()
+        return _grid.fetch(
+            bbox, width, height,
+            {"evalscript": evalscript, "collection": S1_COLLECTION, "extra": {"time_range": list(tr)}},
+            lambda b, w, h: _single_band(_process_request(token, b, w, h, evalscript, S1_COLLECTION, tr)),
+        )
+
+    key = raster_cache.raster_key(bbox, width, height, evalscript, S1_COLLECTION, **extra)
+    # yanıt doğrudan cache dosyasının memmap'ine çözülür (ara float dizi / astype kopyası yok);
+    # aynı anahtarı eşzamanlı isteyen oturumlar tek isteği bekler (raster_cache tek uçuş)
+    Z = raster_cache.get_or_decode(
+        key,
+        lambda: _process_request(token, bbox, width, height, evalscript, S1_COLLECTION, time_range),
+        tiff_layout,
+        decode_tiff,
+    )
+    return Z[..., 0] if Z.ndim == 3 else Z
+
+def fetch_s1_stack(token: str, bbox: list[float], width: int, height: int,
+                   time_range: tuple[str, str] | None = None, snap: bool | None = None) -> np.ndarray:
+    # (len(STACK_BANDS), H, W) float32 yığın; tek bantlı çekimle aynı istek sayısı
+    extra = {} if time_range is None else {"time_range": list(time_range)}
+
+    def _request(b, w, h, tr=time_range):
+        return decode_tar(_process_request(
+            token, b, w, h, EVALSCRIPT_DUAL_POL, S1_COLLECTION, tr, outputs=STACK_BANDS,
+        ))
+
+    if GRID_SNAP if snap is None else snap:
+        tr = time_range or grid_window()
+        return _grid.fetch(
+            bbox, width, height,
+            {"evalscript": EVALSCRIPT_DUAL_POL, "collection": S1_COLLECTION, "extra": {"time_range": list(tr)}},
+            lambda b, w, h: decode_stack(_request(b, w, h, tr)),
+        )
+
+    key = raster_cache.raster_key(bbox, width, height, EVALSCRIPT_DUAL_POL, S1_COLLECTION, **extra)
+    return raster_cache.get_or_decode(key, lambda: _request(bbox, width, height), stack_layout, decode_stack)
@@ -0,0 +1,146 @@
+import numpy as np
+
+from utils.labeling import label_posneg
+from utils.scoring import COMPONENT_DTYPE, score_components
+
+# eşik slider'ı ile aynı ızgara (1.5 … 6.0, adım 0.1)
+LEVEL_MIN = 1.5
+LEVEL_MAX = 6.0
+LEVEL_STEP = 0.1
+LEVELS = np.round(np.arange(LEVEL_MIN, LEVEL_MAX + LEVEL_STEP / 2, LEVEL_STEP), 1)
+# bundan büyük rasterlarda ağaç kurulmaz (seviye başına bir etiketleme)
+SWEEP_MAX_PX = 1_500_000
+
+class ComponentTree:
+    # nicemlenmiş max-tree (POS) / min-tree (NEG): her seviyenin bileşenleri bir kez etiketlenir,
+    # üst seviyedeki bileşen alt seviyede tepe pikselinin düştüğü bileşene bağlanır
+    def __init__(self, Z_z: np.ndarray, xs: np.ndarray, ys: np.ndarray, posneg: bool = True,
+                 levels: np.ndarray = LEVELS, connectivity: int = 8):
+        self.shape = Z_z.shape
+        self.posneg = bool(posneg)
+        self._Z_z = Z_z
+        zmax = float(np.nanmax(np.abs(Z_z))) if np.any(~np.isnan(Z_z)) else -np.inf
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.n_levels = len(self.levels)
+        # z'nin ulaştığı seviyelerin üstü boş: etiketlenmez
+        self._used = int(np.searchsorted(self.levels, zmax, side="right"))
+
+        self._comps = []
+        self._offset = np.zeros(self._used + 1, dtype=np.int64)
+        parents = []
+        node_of_px = np.full(Z_z.size, -1, dtype=np.int64)
+        a = np.abs(Z_z).ravel()
+        with np.errstate(invalid="ignore"):
+            # piksel hangi en üst seviyeye kadar bir bileşende
+            q = np.searchsorted(self.levels, np.where(np.isnan(a), -np.inf, a), side="right") - 1
+        prev = None
+        for j in range(self._used):
+            thr = self.levels[j]
+            pos, neg = self._masks(thr)
+            labels, stats = label_posneg(pos, neg, Z_z, connectivity)
+            comps = score_components(stats, Z_z, xs, ys, win=1)
+            off = self._offset[j]
+            self._offset[j + 1] = off + len(comps)
+            if prev is None:
+                parents.append(np.full(len(comps), -1, dtype=np.int64))
+            else:
+                parents.append(prev.ravel()[stats["peak_idx"]].astype(np.int64) - 1 + self._offset[j - 1])
+            top = np.flatnonzero(q == j)
+            node_of_px[top] = labels.ravel()[top].astype(np.int64) - 1 + off
+            self._comps.append(comps)
+            prev = labels
+        self._parent = np.concatenate(parents) if parents else np.zeros(0, dtype=np.int64)
+        self._node_of_px = node_of_px
+        self._level_of = np.repeat(np.arange(self._used), np.diff(self._offset))
+        self._peak = np.abs(np.concatenate([c["peak_z"] for c in self._comps])) if self._comps else np.zeros(0)
+        self._lifetime = self._persistence()
+        for j, c in enumerate(self._comps):
+            c["stability"] = self._lifetime[self._offset[j]:self._offset[j + 1]]
+
+    def _masks(self, thr: float):
+        Z_z = self._Z_z
+        if self.posneg:
+            return Z_z >= thr, Z_z <= -thr
+        return np.abs(Z_z) >= thr, np.zeros(Z_z.shape, dtype=bool)
+
+    def _persistence(self):
+        # yaşlı kuralı: birleşmede tepesi yüksek dal yaşar, diğeri o seviyede ölür;
+        # kalıcılık = dalın ayrı bileşen olarak görüldüğü seviye sayısı
+        n = len(self._parent)
+        branch = np.full(n, -1, dtype=np.int64)
+        birth, death = [], []
+        for j in range(self._used - 1, -1, -1):
+            lo, hi = self._offset[j], self._offset[j + 1]
+            if j + 1 < self._used:
+                clo, chi = self._offset[j + 1], self._offset[j + 2]
+                child = np.arange(clo, chi)
+                par = self._parent[child]
+                # ebeveyn başına tepesi en yüksek çocuk (eşitlikte küçük indeks) dalı sürdürür
+                order = np.lexsort((child, -self._peak[child], par))
+                child, par = child[order], par[order]
+                first = np.r_[True, par[1:] != par[:-1]]
+                branch[par[first]] = branch[child[first]]
+                for b in branch[child[~first]]:
+                    death[b] = j + 1
+            new = np.flatnonzero(branch[lo:hi] < 0) + lo
+            branch[new] = np.arange(len(birth), len(birth) + len(new))
+            birth.extend([j] * len(new))
+            death.extend([0] * len(new))
+        birth = np.asarray(birth, dtype=np.int64)
+        death = np.asarray(death, dtype=np.int64)
+        self._branch = branch
+        return (birth - death + 1)[branch].astype(np.int32) if n else np.zeros(0, dtype=np.int32)
+
+    def level_index(self, thr: float):
+        # slider değeri ızgarada değilse None (doğrudan eşikleme yapılır)
+        j = int(round((float(thr) - self.levels[0]) / LEVEL_STEP))
+        if 0 <= j < self.n_levels and abs(self.levels[j] - float(thr)) < 1e-9:
+            return j
+        return None
+
+    def nearest_level(self, thr: float):
+        # ızgara aralığındaki (yarım adım payıyla) eşik için en yakın seviye; dışındaysa None
+        j = int(round((float(thr) - self.levels[0]) / LEVEL_STEP))
+        return j if 0 <= j < self.n_levels else None
+
+    def components(self, thr: float) -> np.ndarray:
+        j = self.level_index(thr)
+        if j is None:
+            raise KeyError(thr)
+        if j >= self._used:
+            return np.zeros(0, dtype=COMPONENT_DTYPE)
+        return self._comps[j]
+
+    def posneg_map(self, thr: float) -> np.ndarray:
+        j = self.level_index(thr)
+        pos, neg = self._masks(float(thr) if j is None else self.levels[j])
+        return pos.view(np.int8) - neg.view(np.int8)
+
+    def labels(self, thr: float) -> np.ndarray:
+        # seviye j'deki etiket = pikselin en üst düğümünün j'deki atası (düğüm sayısı kadar iş + tek gather)
+        j = self.level_index(thr)
+        if j is None:
+            raise KeyError(thr)
+        out = np.zeros(self._node_of_px.size, dtype=np.int32)
+        if j < self._used:
+            anc = np.arange(len(self._parent), dtype=np.int64)
+            for lvl in range(self._used - 1, j, -1):
+                m = self._level_of[anc] == lvl
+                anc[m] = self._parent[anc[m]]
+            px = np.flatnonzero(self._node_of_px >= 0)
+            node = anc[self._node_of_px[px]]
+            keep = self._level_of[node] == j
+            out[px[keep]] = (node[keep] - self._offset[j] + 1).astype(np.int32)
+        return out.reshape(self.shape)
+
+    def counts(self):
+        # seviye başına (POS, NEG) bileşen sayısı: canlı eşik göstergesi için
+        out = np.zeros((self.n_levels, 2), dtype=np.int64)
+        for j, c in enumerate(self._comps):
+            neg = int(np.count_nonzero(c["type"] == "NEG"))
+            out[j] = (len(c) - neg, neg)
+        return out
+
+    @property
+    def nbytes(self):
+        return int(self._node_of_px.nbytes + self._parent.nbytes + sum(c.nbytes for c in self._comps))
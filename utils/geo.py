@@ -1,13 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
+
+from utils.maptiles import encode_png, zscore_rgba
 
 def zscore_to_heatmap(z, threshold=2.0):
-    mask = np.abs(z) >= threshold
-    z_masked = np.where(mask, z, np.nan)
+    # |z| ≥ eşik pikselleri ıraksak renkte, gerisi saydam: RGBA uint8 (st.image doğrudan çizer)
+    return zscore_rgba(np.asarray(z, dtype=np.float32), threshold=threshold)
 
-    fig, ax = plt.subplots()
-    cax = ax.imshow(z_masked, cmap='seismic', vmin=-np.nanmax(np.abs(z)), vmax=np.nanmax(np.abs(z)))
-    fig.colorbar(cax, ax=ax, orientation='vertical', shrink=0.7, label="Z-Score")
-    ax.set_title("Pozitif / Negatif Anomali Heatmap")
-    ax.axis('off')
-    return fig
+def zscore_to_png(z, threshold=2.0) -> bytes:
+    return encode_png(zscore_to_heatmap(z, threshold))
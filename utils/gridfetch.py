@@ -0,0 +1,161 @@
+import math
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils import metrics, raster_cache
+
+# global piksel merdiveni: seviye L → 2^(-L/2) derece (√2 adım); istenen pikselden ince ilk seviye
+# hücre = CELL_PX × CELL_PX piksel, (-180, 90)'dan hizalı: yakın taramalar aynı hücreleri paylaşır
+CELL_PX = 32
+# tek istekte en fazla (Process API sınırı 2500 px)
+MAX_RECT_PX = 2048
+
+@dataclass(frozen=True)
+class GridPlan:
+    lx: int
+    ly: int
+    cx0: int
+    cy0: int
+    cx1: int  # dahil
+    cy1: int
+    cell_px: int
+
+    @property
+    def px_lon(self):
+        return 2.0 ** (-self.lx / 2)
+
+    @property
+    def px_lat(self):
+        return 2.0 ** (-self.ly / 2)
+
+    def cell_bbox(self, cx: int, cy: int):
+        # satırlar kuzeyden güneye (yanıt rasterı ile aynı)
+        w, h = self.cell_px * self.px_lon, self.cell_px * self.px_lat
+        return [-180.0 + cx * w, 90.0 - (cy + 1) * h, -180.0 + (cx + 1) * w, 90.0 - cy * h]
+
+    def cells(self):
+        return [(cx, cy) for cy in range(self.cy0, self.cy1 + 1) for cx in range(self.cx0, self.cx1 + 1)]
+
+def _level(px_deg: float) -> int:
+    return max(0, math.ceil(-2.0 * math.log2(px_deg) - 1e-9))
+
+def plan_cells(bbox: list[float], width: int, height: int, cell_px: int = CELL_PX) -> GridPlan | None:
+    # kapsama çok büyükse None (doğrudan çekilir)
+    lx = _level((bbox[2] - bbox[0]) / width)
+    ly = _level((bbox[3] - bbox[1]) / height)
+    cw, ch = cell_px * 2.0 ** (-lx / 2), cell_px * 2.0 ** (-ly / 2)
+    cx0 = math.floor((bbox[0] + 180.0) / cw)
+    cx1 = math.floor((bbox[2] + 180.0) / cw - 1e-9)
+    cy0 = math.floor((90.0 - bbox[3]) / ch)
+    cy1 = math.floor((90.0 - bbox[1]) / ch - 1e-9)
+    if max(cx1 - cx0 + 1, cy1 - cy0 + 1) * cell_px > MAX_RECT_PX:
+        return None
+    return GridPlan(lx, ly, cx0, cy0, cx1, cy1, cell_px)
+
+def cut(mosaic: np.ndarray, plan: GridPlan, bbox: list[float], width: int, height: int) -> np.ndarray:
+    # kullanıcı ızgarasının piksel merkezleri → hücre mozaiğinde en yakın piksel
+    # (ince ızgaradan seçim: uint16/maske karışmaz; ama etkin piksel istenenden ≤ √2 kat küçük,
+    # speckle varyansı ve z istatistiği doğrudan çekimden farklı olabilir)
+    x0 = -180.0 + plan.cx0 * plan.cell_px * plan.px_lon
+    y1 = 90.0 - plan.cy0 * plan.cell_px * plan.px_lat
+    lon = bbox[0] + (np.arange(width) + 0.5) * ((bbox[2] - bbox[0]) / width)
+    lat = bbox[3] - (np.arange(height) + 0.5) * ((bbox[3] - bbox[1]) / height)
+    ci = np.clip(np.floor((lon - x0) / plan.px_lon).astype(np.int64), 0, mosaic.shape[-1] - 1)
+    ri = np.clip(np.floor((y1 - lat) / plan.px_lat).astype(np.int64), 0, mosaic.shape[-2] - 1)
+    return mosaic[..., ri[:, None], ci[None, :]]
+
+class GridFetcher:
+    # hücre bazlı raster cache + süreç geneli tek uçuş: aynı hücreyi isteyen oturumlar tek isteği bekler
+    def __init__(self, cell_px: int = CELL_PX, cache_dir: str | None = None):
+        self.cell_px = int(cell_px)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._inflight = {}  # hücre anahtarı -> Future
+
+    def _key(self, plan: GridPlan, cx: int, cy: int, spec: dict) -> str:
+        return raster_cache.raster_key(
+            plan.cell_bbox(cx, cy), self.cell_px, self.cell_px,
+            spec["evalscript"], spec["collection"],
+            grid=[plan.lx, plan.ly, cx, cy], **spec.get("extra", {}),
+        )
+
+    def fetch(self, bbox: list[float], width: int, height: int, spec: dict, fetch_rect):
+        # fetch_rect(bbox, w, h) → (H, W) ya da (B, H, W); spec: evalscript/collection/extra (anahtar)
+        plan = plan_cells(bbox, width, height, self.cell_px)
+        if plan is None:
+            metrics.count("grid.direct")
+            return fetch_rect(list(bbox), int(width), int(height))
+
+        cells = plan.cells()
+        keys = {c: self._key(plan, *c, spec) for c in cells}
+        got, mine, waits = {}, [], {}
+        for c in cells:
+            arr = raster_cache.get(keys[c], self.cache_dir)
+            if arr is not None:
+                got[c] = arr
+        with self._lock:
+            for c in cells:
+                if c in got:
+                    continue
+                fut = self._inflight.get(keys[c])
+                if fut is None:
+                    fut = self._inflight[keys[c]] = Future()
+                    mine.append(c)
+                waits[c] = fut
+        # disk kontrolü ile sahiplenme arasında başka iş parçacığı yazmış olabilir
+        for c in list(mine):
+            arr = raster_cache.get(keys[c], self.cache_dir)
+            if arr is not None:
+                self._resolve(keys[c], arr)
+                mine.remove(c)
+        metrics.count("grid.cell.hit", len(got))
+        metrics.count("grid.cell.miss", len(mine))
+        metrics.count("grid.cell.wait", len(waits) - len(mine))
+
+        if mine:
+            self._fetch_cells(plan, mine, keys, fetch_rect)
+        for c, fut in waits.items():
+            got[c] = fut.result()
+
+        first = got[cells[0]]
+        cp = self.cell_px
+        ny, nx = plan.cy1 - plan.cy0 + 1, plan.cx1 - plan.cx0 + 1
+        mosaic = np.empty(first.shape[:-2] + (ny * cp, nx * cp), dtype=first.dtype)
+        for (cx, cy), arr in got.items():
+            r, c = (cy - plan.cy0) * cp, (cx - plan.cx0) * cp
+            mosaic[..., r:r + cp, c:c + cp] = arr
+        return cut(mosaic, plan, bbox, int(width), int(height))
+
+    def _fetch_cells(self, plan: GridPlan, mine: list, keys: dict, fetch_rect):
+        # sahiplenilen hücrelerin dış dikdörtgeni tek istekte; hata cache'lenmez, bekleyenlere iletilir
+        cp = self.cell_px
+        cx0, cx1 = min(c[0] for c in mine), max(c[0] for c in mine)
+        cy0, cy1 = min(c[1] for c in mine), max(c[1] for c in mine)
+        b0, b1 = plan.cell_bbox(cx0, cy1), plan.cell_bbox(cx1, cy0)
+        rect = [b0[0], b0[1], b1[2], b1[3]]
+        try:
+            metrics.count("grid.request")
+            with metrics.span("grid.fetch", cells=len(mine)):
+                A = fetch_rect(rect, (cx1 - cx0 + 1) * cp, (cy1 - cy0 + 1) * cp)
+            for cx, cy in mine:
+                r, c = (cy - cy0) * cp, (cx - cx0) * cp
+                arr = raster_cache.put(keys[(cx, cy)], A[..., r:r + cp, c:c + cp], self.cache_dir, trim=False)
+                self._resolve(keys[(cx, cy)], arr)
+        except BaseException as e:
+            for c in mine:
+                self._resolve(keys[c], None, e)
+            raise
+        raster_cache.evict(self.cache_dir)
+
+    def _resolve(self, key: str, arr, exc: BaseException | None = None):
+        with self._lock:
+            fut = self._inflight.pop(key, None)
+        if fut is None or fut.done():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(arr)
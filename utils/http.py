@@ -0,0 +1,110 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def _retry_after(res) -> float | None:
+    # Retry-After: saniye ya da HTTP tarihi
+    val = res.headers.get("Retry-After") if res is not None else None
+    if not val:
+        return None
+    try:
+        return max(0.0, float(val))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(val).timestamp() - time.time())
+    except Exception:
+        return None
+
+class HttpClient:
+    # keep-alive havuzlu oturum + 429/5xx için jitter'lı üstel geri çekilme + eşzamanlılık sınırı
+    def __init__(
+        self,
+        pool_size: int = 16,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        max_concurrency: int = 8,
+        retry_statuses=RETRY_STATUSES,
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.retry_statuses = tuple(retry_statuses)
+        self._sem = threading.BoundedSemaphore(max(1, int(max_concurrency)))
+
+    def backoff(self, attempt: int) -> float:
+        # "full jitter": aynı anda kısılan istemciler aynı anda geri dönmesin
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, *, timeout: float = 30.0, deadline: float | None = None, **kwargs):
+        # timeout: tek deneme; deadline: tüm denemeler + beklemeler için toplam süre (sn)
+        t_end = None if deadline is None else time.monotonic() + float(deadline)
+        attempt = 0
+        while True:
+            remaining = None if t_end is None else t_end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"HTTP deadline aşıldı: {method} {url}")
+            per_try = timeout if remaining is None else min(timeout, remaining)
+
+            res, err = None, None
+            with self._sem:
+                try:
+                    res = self.session.request(method, url, timeout=per_try, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    err = e
+
+            retryable = err is not None or res.status_code in self.retry_statuses
+            if not retryable or attempt >= self.max_retries:
+                if err is not None:
+                    raise err
+                return res
+
+            wait = _retry_after(res)
+            if wait is None:
+                wait = self.backoff(attempt)
+            if t_end is not None and time.monotonic() + wait >= t_end:
+                # beklemek deadline'ı aşacaksa son cevabı/hatayı olduğu gibi ver
+                if err is not None:
+                    raise err
+                return res
+            time.sleep(wait)
+            attempt += 1
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def configure_client(**kwargs) -> HttpClient:
+    global _client
+    with _client_lock:
+        _client = HttpClient(**kwargs)
+        return _client
+
+def get_client() -> HttpClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient(
+                    pool_size=int(os.environ.get("CDSE_HTTP_POOL", "16")),
+                    max_retries=int(os.environ.get("CDSE_HTTP_RETRIES", "4")),
+                    max_concurrency=int(os.environ.get("CDSE_HTTP_CONCURRENCY", "8")),
+                )
+    return _client
@@ -0,0 +1,275 @@
+import json
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+
+JOB_DIR = os.environ.get("TURKELLER_JOB_DIR", ".jobs")
+JOB_WORKERS = int(os.environ.get("TURKELLER_JOB_WORKERS", "2"))
+# diskte tutulan bitmiş iş sayısı (eskiler silinir); bellekte sonuçları tutulan iş sayısı
+JOB_KEEP = int(os.environ.get("TURKELLER_JOB_KEEP", "50"))
+JOB_KEEP_MEM = 8
+
+FINAL = ("done", "error", "cancelled")
+# submit'in ürettiği biçim (uuid4 hex, 12 hane); dışarıdan gelen id'ler dosya yoluna girmeden denetlenir
+_JOB_ID = re.compile(r"[0-9a-f]{12}")
+
+def valid_job_id(job_id) -> bool:
+    return isinstance(job_id, str) and _JOB_ID.fullmatch(job_id) is not None
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    # iş fonksiyonu aşama/ilerlemeyi buradan bildirir; her bildirim iptal noktasıdır
+    def __init__(self, job_id: str, owner: str, label: str, params: dict | None):
+        self.id = job_id
+        self.owner = owner
+        self.label = label
+        self.params = params or {}
+        self.status = "queued"
+        self.stage = None
+        self.progress = 0.0
+        self.message = ""
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stages = []  # [aşama, başlangıç, bitiş]
+        self.result = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def set_stage(self, name: str, progress: float | None = None, message: str = ""):
+        self.check()
+        now = time.time()
+        with self._lock:
+            if self.stages and self.stages[-1][2] is None:
+                self.stages[-1][2] = now
+            self.stages.append([name, now, None])
+            self.stage = name
+            self.message = message
+            if progress is not None:
+                self.progress = float(progress)
+
+    def set_progress(self, progress: float, message: str | None = None):
+        self.check()
+        with self._lock:
+            self.progress = float(progress)
+            if message is not None:
+                self.message = message
+
+    def _close_stage(self):
+        with self._lock:
+            if self.stages and self.stages[-1][2] is None:
+                self.stages[-1][2] = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "owner": self.owner,
+                "label": self.label,
+                "params": self.params,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "message": self.message,
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "stages": [list(s) for s in self.stages],
+                "cancel_requested": self._cancel.is_set(),
+            }
+
+class JobQueue:
+    # analizler betik iş parçacığı dışında, sınırlı havuzda; bitenler diskte (id ile geri alınır)
+    def __init__(self, max_workers: int = JOB_WORKERS, job_dir: str = JOB_DIR, keep: int = JOB_KEEP):
+        self.job_dir = job_dir
+        self.keep = int(keep)
+        self._ex = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> Job (bu süreçte gönderilenler)
+        self._finished = []  # bu kuyruğun bitirdiği işler, eskiden yeniye (diskten yalnız bunlar silinir)
+        os.makedirs(job_dir, exist_ok=True)
+
+    def submit(self, fn, *args, owner: str = "", label: str = "", params: dict | None = None, **kwargs) -> str:
+        # fn(job, *args, **kwargs) → sonuç (pickle edilebilir)
+        job = Job(uuid.uuid4().hex[:12], owner, label, params)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._save_meta(job)
+        job.future = self._ex.submit(self._run, job, fn, args, kwargs)
+        metrics.count("jobs.submitted")
+        return job.id
+
+    def _run(self, job: Job, fn, args, kwargs):
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+            return
+        with job._lock:
+            job.status = "running"
+            job.started = time.time()
+        self._save_meta(job)
+        try:
+            res = fn(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            self._finish(job, "error")
+        else:
+            job.result = res
+            try:
+                self._save_result(job)
+            except Exception as e:
+                # pickle edilemeyen sonuç / dolu disk: iş "running"de kalmaz
+                job.result = None
+                job.error = f"Sonuç kaydedilemedi: {type(e).__name__}: {e}"
+                self._finish(job, "error")
+            else:
+                self._finish(job, "done")
+
+    def _finish(self, job: Job, status: str):
+        job._close_stage()
+        with job._lock:
+            job.status = status
+            job.finished = time.time()
+            if status == "done":
+                job.progress = 1.0
+        metrics.count(f"jobs.{status}")
+        self._save_meta(job)
+        with self._lock:
+            self._finished.append(job.id)
+        self._prune()
+
+    def cancel(self, job_id: str) -> bool:
+        if not valid_job_id(job_id):
+            return False
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINAL:
+            return False
+        job._cancel.set()
+        # kuyruktaysa hemen; çalışıyorsa bir sonraki aşama/ilerleme bildiriminde durur
+        if job.future is not None and job.future.cancel():
+            self._finish(job, "cancelled")
+        return True
+
+    def get(self, job_id: str) -> dict | None:
+        if not valid_job_id(job_id):
+            return None
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        meta = self._load_meta(job_id)
+        if meta is not None and meta["status"] not in FINAL:
+            # bu süreçte yok ama bitmemiş görünüyor: süreç yeniden başladı
+            meta["status"] = "error"
+            meta["error"] = "İş yarıda kaldı (sunucu yeniden başladı)."
+        return meta
+
+    def result(self, job_id: str):
+        if not valid_job_id(job_id):
+            return None
+        job = self._jobs.get(job_id)
+        if job is not None and job.result is not None:
+            return job.result
+        try:
+            with open(self._path(job_id, ".pkl"), "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def jobs(self, owner: str | None = None, limit: int = 20) -> list[dict]:
+        # bu süreçteki + diskteki işler, yeniden eskiye
+        seen, out = set(), []
+        with self._lock:
+            mem = list(self._jobs.values())
+        for job in mem:
+            seen.add(job.id)
+            out.append(job.snapshot())
+        for fn in os.listdir(self.job_dir):
+            if fn.endswith(".json") and valid_job_id(fn[:-5]) and fn[:-5] not in seen:
+                meta = self.get(fn[:-5])
+                if meta is not None:
+                    out.append(meta)
+        if owner is not None:
+            out = [m for m in out if m.get("owner") == owner]
+        out.sort(key=lambda m: m.get("created") or 0, reverse=True)
+        return out[:limit]
+
+    def _path(self, job_id: str, ext: str) -> str:
+        if not valid_job_id(job_id):
+            raise ValueError(f"Geçersiz iş id'si: {job_id!r}")
+        return os.path.join(self.job_dir, job_id + ext)
+
+    def _write(self, path: str, write):
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _save_meta(self, job: Job):
+        meta = job.snapshot()
+        self._write(self._path(job.id, ".json"),
+                    lambda f: f.write(json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")))
+
+    def _load_meta(self, job_id: str) -> dict | None:
+        if not valid_job_id(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_result(self, job: Job):
+        with metrics.span("jobs.persist"):
+            self._write(self._path(job.id, ".pkl"),
+                        lambda f: pickle.dump(job.result, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _prune(self):
+        # bellekte yalnız son işlerin sonuçları; diskte bu kuyruğun bitirdiği son `keep` iş
+        # (.jobs/ paylaşımlı olabilir: başka süreçlerin dosyalarına dokunulmaz)
+        with self._lock:
+            done = [j for j in self._jobs.values() if j.status in FINAL]
+            for job in done[:-JOB_KEEP_MEM]:
+                del self._jobs[job.id]
+            n = max(0, len(self._finished) - self.keep)
+            old, self._finished = self._finished[:n], self._finished[n:]
+        for job_id in old:
+            for ext in (".json", ".pkl"):
+                try:
+                    os.remove(self._path(job_id, ext))
+                except OSError:
+                    pass
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job._cancel.set()
+        self._ex.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,129 @@
+import numpy as np
+
+POS = 1
+NEG = 2
+
+def _runs(cls_img: np.ndarray):
+    # satır koşuları: aynı sınıftan (≠0) kesintisiz yatay segmentler, raster sırasında
+    h, w = cls_img.shape
+    cp = np.zeros((h, w + 2), dtype=np.int8)
+    cp[:, 1:-1] = cls_img
+    ch = cp[:, 1:] != cp[:, :-1]
+    rs, c0 = np.nonzero(ch & (cp[:, 1:] != 0))
+    _, c1 = np.nonzero(ch & (cp[:, :-1] != 0))
+    cls = cp[rs, c0 + 1]
+    return rs.astype(np.int64), c0.astype(np.int64), c1.astype(np.int64), cls
+
+def _run_pairs(rs, c0, c1, cls, w: int, connectivity: int):
+    # bir üst satırdaki örtüşen koşular; arama searchsorted ile, piksel başına iş yok
+    d = 1 if connectivity == 8 else 0
+    stride = w + 2
+    key_c0 = rs * stride + c0
+    key_c1 = rs * stride + c1
+    base = (rs - 1) * stride
+    lo = np.searchsorted(key_c1, base + c0 - d, side="right")
+    hi = np.searchsorted(key_c0, base + c1 + d, side="left")
+    cnt = np.maximum(hi - lo, 0)
+    u = np.repeat(np.arange(rs.size), cnt)
+    if u.size == 0:
+        return u, u
+    first = np.repeat(lo, cnt)
+    offs = np.arange(u.size) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+    v = first + offs
+    keep = cls[u] == cls[v]
+    return u[keep], v[keep]
+
+def _compress(parent: np.ndarray):
+    while True:
+        gp = parent[parent]
+        if np.array_equal(gp, parent):
+            return parent
+        parent = gp
+
+def _union_find(n: int, u: np.ndarray, v: np.ndarray):
+    # dizi tabanlı union-find: kökleri küçük indekse bağla (hook) + yol sıkıştırma
+    parent = np.arange(n, dtype=np.int64)
+    while u.size:
+        ru = parent[u]
+        rv = parent[v]
+        live = ru != rv
+        if not np.any(live):
+            break
+        u, v, ru, rv = u[live], v[live], ru[live], rv[live]
+        np.minimum.at(parent, np.maximum(ru, rv), np.minimum(ru, rv))
+        parent = _compress(parent)
+    return parent
+
+def label_classes(cls_img: np.ndarray, connectivity: int = 8):
+    # cls_img: 0 = arka plan, diğer değerler ayrı sınıf (farklı sınıflar birleşmez)
+    if connectivity not in (4, 8):
+        raise ValueError("connectivity 4 veya 8 olmalı")
+    cls_img = np.asarray(cls_img, dtype=np.int8)
+    h, w = cls_img.shape
+    labels = np.zeros((h, w), dtype=np.int32)
+    rs, c0, c1, cls = _runs(cls_img)
+    if rs.size == 0:
+        return labels, 0, np.zeros(0, dtype=np.int8)
+
+    u, v = _run_pairs(rs, c0, c1, cls, w, connectivity)
+    root = _union_find(rs.size, u, v)
+
+    # kökler raster sırasında ilk koşu → etiketler BFS taramasıyla aynı sırada (1..N)
+    roots, run_lab = np.unique(root, return_inverse=True)
+    run_lab = run_lab.astype(np.int32) + 1
+    labels.flat[np.flatnonzero(cls_img)] = np.repeat(run_lab, c1 - c0)
+    return labels, int(roots.size), cls[roots].astype(np.int8)
+
+def label_stats(labels: np.ndarray, n: int, values: np.ndarray | None = None, sign=None):
+    # etiket başına kompakt diziler; indeks 0 → etiket 1
+    w = labels.shape[1]
+    idx = np.flatnonzero(labels)
+    # etikete göre kararlı sıralama: grup içinde raster sırası korunur
+    order = np.argsort(labels.flat[idx], kind="stable")
+    idx = idx[order]
+    lab = labels.flat[idx].astype(np.int64) - 1
+    rr = idx // w
+    cc = idx % w
+
+    area = np.bincount(lab, minlength=n).astype(np.int64)
+    starts = np.r_[0, np.cumsum(area)[:-1]] if n else np.zeros(0, dtype=np.int64)
+    ends = starts + area - 1
+    stats = {
+        "area": area,
+        "rmin": rr[starts] if n else rr[:0],
+        "rmax": rr[ends] if n else rr[:0],
+        "cmin": np.minimum.reduceat(cc, starts) if n else cc[:0],
+        "cmax": np.maximum.reduceat(cc, starts) if n else cc[:0],
+    }
+
+    if values is not None:
+        vals = np.asarray(values).flat[idx].astype(np.float64)
+        s = np.ones(n) if sign is None else np.broadcast_to(np.asarray(sign, dtype=np.float64), (n,))
+        key = vals * s[lab]
+        if n:
+            gmax = np.maximum.reduceat(key, starts)
+            hit = np.flatnonzero(key == gmax[lab])
+            # her grupta ilk eşleşen piksel (raster sırasında ilk tepe)
+            first = hit[np.r_[True, lab[hit][1:] != lab[hit][:-1]]]
+            peak = idx[first]
+        else:
+            peak = idx[:0]
+        stats["peak_idx"] = peak.astype(np.int64)
+        stats["peak_val"] = np.asarray(values).flat[peak].astype(np.float64)
+    return stats
+
+def label_components(mask: np.ndarray, connectivity: int = 8, values: np.ndarray | None = None, mode: str = "max"):
+    labels, n, _ = label_classes(np.asarray(mask, dtype=bool).astype(np.int8), connectivity)
+    sign = None if mode == "max" else -1.0
+    return labels, label_stats(labels, n, values, sign)
+
+def label_posneg(pos_mask: np.ndarray, neg_mask: np.ndarray, values: np.ndarray | None = None, connectivity: int = 8):
+    # POS ve NEG tek geçişte; stats["cls"] = 1 (POS) / 2 (NEG), tepe POS'ta max, NEG'de min
+    cls_img = np.zeros(pos_mask.shape, dtype=np.int8)
+    cls_img[pos_mask] = POS
+    cls_img[neg_mask] = NEG
+    labels, n, cls = label_classes(cls_img, connectivity)
+    sign = np.where(cls == NEG, -1.0, 1.0)
+    stats = label_stats(labels, n, values, sign)
+    stats["cls"] = cls
+    return labels, stats
@@ -0,0 +1,243 @@
+import base64
+import hashlib
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+
+from utils import metrics
+
+try:
+    from PIL import Image
+except ImportError:  # WebP yalnız Pillow ile; yoksa PNG
+    Image = None
+
+TILE_PX = 256
+# sunucu yalnız port verilirse açılır (Streamlit keyfi yol sunmaz); URL tarayıcının gördüğü adres
+TILE_PORT = int(os.environ.get("TURKELLER_TILE_PORT", "0"))
+TILE_URL = os.environ.get("TURKELLER_TILE_URL")
+TILE_CACHE_MB = int(os.environ.get("TURKELLER_TILE_CACHE_MB", "64"))
+# bellekte tutulan sonuç sayısı (karo isteği id ile gelir)
+MAX_RESULTS = 32
+PNG_LEVEL = 6
+MASK_ALPHA = 230
+
+# seismic benzeri ıraksak renk: koyu mavi → mavi → beyaz → kırmızı → koyu kırmızı
+_ANCHORS = np.array([
+    [0.0, 0.0, 0.0, 0.3],
+    [0.25, 0.0, 0.0, 1.0],
+    [0.5, 1.0, 1.0, 1.0],
+    [0.75, 1.0, 0.0, 0.0],
+    [1.0, 0.5, 0.0, 0.0],
+])
+
+def diverging_lut(n: int = 256, alpha: int = MASK_ALPHA) -> np.ndarray:
+    # (2, n, 4) uint8: [0] görünmez (RGB de 0 → iyi sıkışır), [1] renkli
+    t = np.linspace(0.0, 1.0, n)
+    rgb = np.stack([np.interp(t, _ANCHORS[:, 0], _ANCHORS[:, i]) for i in (1, 2, 3)], axis=-1)
+    lut = np.zeros((2, n, 4), dtype=np.uint8)
+    lut[1, :, :3] = np.round(rgb * 255)
+    lut[1, :, 3] = alpha
+    return lut
+
+LUT = diverging_lut()
+
+def color_index(Z_z: np.ndarray, vmax: float | None = None) -> np.ndarray:
+    # z → 0..255 (simetrik ölçek, -vmax..+vmax); NaN ortaya
+    Z = np.asarray(Z_z, dtype=np.float32)
+    if vmax is None:
+        vmax = float(np.nanmax(np.abs(Z))) if np.isfinite(Z).any() else 1.0
+    vmax = vmax if vmax > 0 else 1.0
+    idx = np.nan_to_num(Z, nan=0.0) * np.float32(127.5 / vmax)
+    idx += np.float32(127.5)
+    np.clip(idx, 0, 255, out=idx)
+    return idx.astype(np.uint8)
+
+def zscore_rgba(Z_z: np.ndarray, posneg: np.ndarray | None = None, threshold: float = 2.0,
+                vmax: float | None = None) -> np.ndarray:
+    # görünür pikseller: POS/NEG maskesi, yoksa |z| ≥ eşik; tek LUT okuması
+    vis = (np.asarray(posneg) != 0) if posneg is not None else (np.abs(np.nan_to_num(Z_z)) >= threshold)
+    return LUT[vis.view(np.uint8), color_index(Z_z, vmax)]
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+def encode_png(rgba: np.ndarray, level: int = PNG_LEVEL) -> bytes:
+    # RGBA8, filtre 0; satır başına filtre baytı tek kopyada eklenir
+    H, W = rgba.shape[:2]
+    raw = np.zeros((H, 1 + W * 4), dtype=np.uint8)
+    raw[:, 1:] = np.ascontiguousarray(rgba, dtype=np.uint8).reshape(H, W * 4)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _chunk(b"IHDR", struct.pack(">IIBBBBB", W, H, 8, 6, 0, 0, 0))
+        + _chunk(b"IDAT", zlib.compress(raw.data, level))
+        + _chunk(b"IEND", b"")
+    )
+
+def encode_tile(rgba: np.ndarray, fmt: str = "png") -> tuple[bytes, str]:
+    # → (bayt, mime); Pillow yoksa webp isteği PNG'ye düşer
+    if fmt == "webp" and Image is not None:
+        buf = BytesIO()
+        Image.fromarray(rgba, "RGBA").save(buf, "WEBP", quality=80, method=2)
+        return buf.getvalue(), "image/webp"
+    return encode_png(rgba), "image/png"
+
+def png_data_uri(rgba: np.ndarray) -> str:
+    return "data:image/png;base64," + base64.b64encode(encode_png(rgba)).decode("ascii")
+
+# -------------------------
+# sonuç kaydı: renk indeksi / görünürlük bir kez hesaplanır, karolar yalnız örnekleme + LUT
+# -------------------------
+class _Layer:
+    __slots__ = ("idx", "vis", "dx", "dy", "bbox")
+
+    def __init__(self, r):
+        self.idx = color_index(r.Z_z)
+        self.vis = (r.posneg != 0).view(np.uint8)
+        self.bbox = [float(v) for v in r.bbox]
+        H, W = self.idx.shape
+        self.dx = (self.bbox[2] - self.bbox[0]) / W
+        self.dy = (self.bbox[3] - self.bbox[1]) / H
+
+    def sample(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        # içine düşülen piksel; kapsam dışı görünmez (satır 0 = bbox[3], kuzey)
+        H, W = self.idx.shape
+        c = np.floor((lon - self.bbox[0]) / self.dx).astype(np.int64)
+        r = np.floor((self.bbox[3] - lat) / self.dy).astype(np.int64)
+        inside = ((c >= 0) & (c < W))[None, :] & ((r >= 0) & (r < H))[:, None]
+        c = np.clip(c, 0, W - 1)
+        r = np.clip(r, 0, H - 1)
+        vis = self.vis[r[:, None], c[None, :]] & inside
+        return LUT[vis.view(np.uint8), self.idx[r[:, None], c[None, :]]]
+
+_lock = threading.Lock()
+_layers = OrderedDict()  # id -> _Layer
+_tiles = OrderedDict()   # (id, z, x, y, fmt) -> (bayt, mime)
+_tile_bytes = 0
+
+def layer_id(r) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    h.update(np.ascontiguousarray(r.Z_z).data)
+    h.update(np.ascontiguousarray(r.posneg).data)
+    h.update(repr([round(float(v), 9) for v in r.bbox]).encode())
+    return h.hexdigest()
+
+def register(r) -> str:
+    # sonucu karo sunumuna aç; aynı içerik aynı id (tarayıcı cache'i de geçerli kalır)
+    lid = layer_id(r)
+    with _lock:
+        if lid in _layers:
+            _layers.move_to_end(lid)
+            return lid
+    layer = _Layer(r)
+    with _lock:
+        _layers[lid] = layer
+        while len(_layers) > MAX_RESULTS:
+            _layers.popitem(last=False)
+    return lid
+
+def tile_lonlat(z: int, x: int, y: int, size: int = TILE_PX):
+    # Web Mercator karo piksel merkezleri (satır 0 = kuzey)
+    n = size * 2.0 ** z
+    px = (x * size + np.arange(size) + 0.5) / n
+    py = (y * size + np.arange(size) + 0.5) / n
+    lon = px * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * py))))
+    return lon, lat
+
+def tile_bounds(z: int, x: int, y: int):
+    n = 2.0 ** z
+    lat = lambda t: math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * t / n))))
+    return [x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)]
+
+_EMPTY = {}
+
+def _empty(fmt: str):
+    if fmt not in _EMPTY:
+        _EMPTY[fmt] = encode_tile(np.zeros((TILE_PX, TILE_PX, 4), dtype=np.uint8), fmt)
+    return _EMPTY[fmt]
+
+def render_tile(lid: str, z: int, x: int, y: int, fmt: str = "png"):
+    # → (bayt, mime) ya da kayıt yoksa None
+    global _tile_bytes
+    key = (lid, int(z), int(x), int(y), fmt)
+    with _lock:
+        hit = _tiles.get(key)
+        if hit is not None:
+            _tiles.move_to_end(key)
+        layer = _layers.get(lid)
+    if hit is not None:
+        metrics.count("tile.cache.hit")
+        return hit
+    if layer is None:
+        return None
+    b = tile_bounds(z, x, y)
+    lb = layer.bbox
+    if b[0] > lb[2] or b[2] < lb[0] or b[1] > lb[3] or b[3] < lb[1]:
+        metrics.count("tile.empty")
+        return _empty(fmt)
+    metrics.count("tile.cache.miss")
+    with metrics.span("render.tile", z=int(z)):
+        lon, lat = tile_lonlat(z, x, y)
+        out = encode_tile(layer.sample(lon, lat), fmt)
+    with _lock:
+        if key not in _tiles:
+            _tiles[key] = out
+            _tile_bytes += len(out[0])
+        while _tile_bytes > TILE_CACHE_MB * 1024 * 1024 and _tiles:
+            _, old = _tiles.popitem(last=False)
+            _tile_bytes -= len(old[0])
+    return out
+
+def render_extent(r, max_px: int = 1024) -> np.ndarray:
+    # sonucun kendi kapsamı tek görüntü (satır 0 kuzey, olduğu gibi); uzun kenar max_px'e seyreltilir
+    f = max(1, math.ceil(max(r.shape) / max(int(max_px), 1)))
+    return zscore_rgba(r.Z_z[::f, ::f], r.posneg[::f, ::f])
+
+# -------------------------
+# XYZ karo sunucusu: /tiles/<id>/<z>/<x>/<y>.png|webp
+# -------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        try:
+            _, lid, z, x, last = parts
+            y, fmt = last.split(".")
+            out = render_tile(lid, int(z), int(x), int(y), fmt if fmt in ("png", "webp") else "png")
+        except ValueError:
+            out = None
+        if out is None:
+            self.send_error(404)
+            return
+        data, mime = out
+        self.send_response(200)
+        self.send_header("Content-Type", mime)
+        self.send_header("Content-Length", str(len(data)))
+        # id içerik hash'i: karo değişmez
+        self.send_header("Cache-Control", "public, max-age=86400, immutable")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+_server = None
+
+def start_tile_server(port: int = TILE_PORT) -> str | None:
+    # süreç başına bir kez; port 0 → kapalı (harita tek görüntü katmanıyla çizilir)
+    global _server
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="tiles", daemon=True).start()
+    return (TILE_URL or f"http://localhost:{int(port)}").rstrip("/") + "/tiles"
@@ -0,0 +1,162 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+log = logging.getLogger("turkeller.metrics")
+
+# yapılandırılmış loglar: TURKELLER_METRICS_LOG=info (trace özetleri) | debug (her span)
+if os.environ.get("TURKELLER_METRICS_LOG"):
+    _h = logging.StreamHandler()
+    _h.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_h)
+    log.setLevel(os.environ["TURKELLER_METRICS_LOG"].upper())
+    log.propagate = False
+
+_current = contextvars.ContextVar("turkeller_trace", default=None)
+_span_stack = contextvars.ContextVar("turkeller_span_stack", default=())
+
+# süreç geneli toplamlar (tüm oturumlar): span adı → count/total/max, sayaçlar
+_agg_lock = threading.Lock()
+_agg_spans = {}
+_agg_counters = {}
+
+class Trace:
+    # tek analiz çalışmasının span'ları ve sayaçları (waterfall için)
+    def __init__(self, name: str, track_memory: bool = False):
+        self.name = name
+        self.t0 = time.perf_counter()
+        self.t1 = None
+        self.spans = []
+        self.counters = {}
+        self.track_memory = track_memory
+        self._lock = threading.Lock()
+
+    def add_span(self, rec: dict):
+        with self._lock:
+            self.spans.append(rec)
+
+    def add(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def duration(self):
+        return (self.t1 or time.perf_counter()) - self.t0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "duration_s": self.duration(),
+                "spans": list(self.spans),
+                "counters": dict(self.counters),
+            }
+
+def start_trace(name: str, track_memory: bool = False):
+    tr = Trace(name, track_memory)
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        tr._started_tm = True
+    tr._token = _current.set(tr)
+    return tr
+
+def end_trace(tr: Trace):
+    tr.t1 = time.perf_counter()
+    try:
+        _current.reset(tr._token)
+    except (ValueError, AttributeError):
+        _current.set(None)
+    if getattr(tr, "_started_tm", False):
+        tracemalloc.stop()
+    d = tr.to_dict()
+    log.info(json.dumps({"event": "trace", "name": tr.name, "duration_s": round(d["duration_s"], 6),
+                         "counters": d["counters"], "n_spans": len(d["spans"])}, ensure_ascii=False))
+    return d
+
+@contextmanager
+def trace(name: str, track_memory: bool = False):
+    # st.stop()/hata olsa da trace kapanır (iş parçacığında eski trace asılı kalmaz)
+    tr = start_trace(name, track_memory)
+    try:
+        yield tr
+    finally:
+        end_trace(tr)
+
+def current_trace():
+    return _current.get()
+
+@contextmanager
+def span(name: str, **attrs):
+    tr = _current.get()
+    mem = tr is not None and tr.track_memory and tracemalloc.is_tracing()
+    if mem:
+        tracemalloc.reset_peak()
+    stack = _span_stack.get()
+    tok = _span_stack.set(stack + ({"child_peak": 0},))
+    t0 = time.perf_counter()
+    err = None
+    try:
+        yield attrs
+    except BaseException as e:
+        err = type(e).__name__
+        raise
+    finally:
+        t1 = time.perf_counter()
+        me = _span_stack.get()[-1]
+        _span_stack.reset(tok)
+        rec = {"name": name, "start_s": None, "dur_s": t1 - t0, "thread": threading.current_thread().name}
+        if attrs:
+            rec["attrs"] = attrs
+        if err:
+            rec["error"] = err
+        if mem:
+            # iç span'lar peak'i sıfırladığı için onların tepesiyle birleştir
+            peak = max(tracemalloc.get_traced_memory()[1], me["child_peak"])
+            rec["peak_mb"] = peak / 1e6
+            if stack:
+                stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+        _record(name, rec["dur_s"])
+        if tr is not None:
+            rec["start_s"] = t0 - tr.t0
+            tr.add_span(rec)
+        log.debug(json.dumps({"event": "span", **rec}, ensure_ascii=False, default=str))
+
+def count(name: str, n: float = 1):
+    with _agg_lock:
+        _agg_counters[name] = _agg_counters.get(name, 0) + n
+    tr = _current.get()
+    if tr is not None:
+        tr.add(name, n)
+
+def _record(name: str, dur: float):
+    with _agg_lock:
+        a = _agg_spans.get(name)
+        if a is None:
+            a = _agg_spans[name] = {"count": 0, "total_s": 0.0, "max_s": 0.0}
+        a["count"] += 1
+        a["total_s"] += dur
+        a["max_s"] = max(a["max_s"], dur)
+
+def snapshot(reset: bool = False):
+    # süreç geneli metrik anlık görüntüsü (JSON'a uygun)
+    with _agg_lock:
+        out = {
+            "spans": {k: dict(v, mean_s=v["total_s"] / max(v["count"], 1)) for k, v in _agg_spans.items()},
+            "counters": dict(_agg_counters),
+        }
+        if reset:
+            _agg_spans.clear()
+            _agg_counters.clear()
+    return out
+
+def bind(fn):
+    # iş parçacığı havuzuna verilen işin span'ları aynı trace'e düşsün
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import metrics
+
+# aşama ara sonuçları için bellek bütçesi (süreç geneli, LRU)
+MAX_BYTES = int(os.environ.get("TURKELLER_STAGE_CACHE_MB", "512")) * 1024 * 1024
+
+STAGES = ("decode", "db", "clip", "smooth", "normalise", "combine", "threshold", "label", "score", "tree")
+
+def array_key(a: np.ndarray) -> str:
+    # içerik anahtarı: aynı raster (yeniden çekilmiş olsa da) aynı anahtar
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{a.dtype.str}{a.shape}".encode())
+    h.update(np.ascontiguousarray(a).data)
+    return h.hexdigest()
+
+def bytes_key(b: bytes) -> str:
+    return hashlib.blake2b(b, digest_size=16).hexdigest()
+
+def stage_key(stage: str, parent: str, **params) -> str:
+    # aşama anahtarı = üst aşamanın anahtarı + bu aşamanın parametreleri
+    spec = json.dumps({"stage": stage, "parent": parent, "params": params}, sort_keys=True, default=str)
+    return hashlib.blake2b(spec.encode("utf-8"), digest_size=16).hexdigest()
+
+def _nbytes(v) -> int:
+    if isinstance(v, np.ndarray):
+        return v.nbytes
+    if isinstance(v, dict):
+        return sum(_nbytes(x) for x in v.values())
+    if isinstance(v, (list, tuple)):
+        return sum(_nbytes(x) for x in v)
+    return int(getattr(v, "nbytes", 64))
+
+def _freeze(v):
+    # cache'teki diziler paylaşılır: yanlışlıkla yerinde yazma hata versin
+    if isinstance(v, np.ndarray):
+        v.flags.writeable = False
+    elif isinstance(v, dict):
+        for x in v.values():
+            _freeze(x)
+    elif isinstance(v, (list, tuple)):
+        for x in v:
+            _freeze(x)
+    return v
+
+class StageCache:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._d = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, stage: str, key: str, compute):
+        with self._lock:
+            hit = self._d.get(key)
+            if hit is not None:
+                self._d.move_to_end(key)
+        if hit is not None:
+            metrics.count(f"stage.{stage}.hit")
+            return hit[0]
+        metrics.count(f"stage.{stage}.miss")
+        value = _freeze(compute())
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key not in self._d:
+                self._d[key] = (value, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes and self._d:
+                _, (_, s) = self._d.popitem(last=False)
+                self._bytes -= s
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._d.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._d)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_stage_cache() -> StageCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StageCache()
+        return _cache
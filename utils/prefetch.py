@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+from utils.analysis import bbox_from_latlon
+
+def refine_cap(cap_m: float) -> int:
+    # main.py'deki oto refine çapı: geniş çapın yarısı, 20–30 m arası
+    return max(20, min(30, int(cap_m * 0.5)))
+
+def refine_bbox(target: dict, cap_m: float):
+    return bbox_from_latlon(target["target_lat"], target["target_lon"], refine_cap(cap_m))
+
+def _key(bbox, width: int, height: int):
+    return (tuple(round(float(v), 9) for v in bbox), int(width), int(height))
+
+class RefineScheduler:
+    # TopK adayların refine rasterlarını sıralama çıkar çıkmaz arka planda çeker
+    def __init__(self, fetch, max_inflight: int = 3, max_ready: int = 16):
+        self._fetch = fetch
+        self._ex = ThreadPoolExecutor(max_workers=max(1, int(max_inflight)), thread_name_prefix="refine")
+        self._max_ready = int(max_ready)
+        self._lock = threading.Lock()
+        self._futs = OrderedDict()  # key -> Future
+        self._owners = {}           # owner -> set(key)
+
+    def schedule(self, owner: str, token: str, bboxes, width: int, height: int):
+        # owner'ın önceki, artık istenmeyen bekleyen işleri iptal edilir
+        keys = [_key(b, width, height) for b in bboxes]
+        with self._lock:
+            self._retain_locked(owner, set(keys))
+            for k, b in zip(keys, bboxes):
+                self._owners.setdefault(owner, set()).add(k)
+                if k in self._futs:
+                    self._futs.move_to_end(k)
+                    continue
+                self._futs[k] = self._ex.submit(self._fetch, token, list(b), int(width), int(height))
+            self._trim_locked()
+        return keys
+
+    def get(self, token: str, bbox, width: int, height: int, timeout: float | None = None):
+        k = _key(bbox, width, height)
+        with self._lock:
+            fut = self._futs.get(k)
+            if fut is not None:
+                self._futs.move_to_end(k)
+        if fut is not None and not fut.cancelled():
+            metrics.count("prefetch.hit" if fut.done() else "prefetch.wait")
+            try:
+                with metrics.span("prefetch.wait"):
+                    return fut.result(timeout=timeout)
+            except Exception:
+                # ön çekim hatası: doğrudan yeniden dene (client zaten retry yapar)
+                with self._lock:
+                    if self._futs.get(k) is fut:
+                        del self._futs[k]
+        else:
+            metrics.count("prefetch.miss")
+        return self._fetch(token, list(bbox), int(width), int(height))
+
+    def is_ready(self, bbox, width: int, height: int) -> bool:
+        fut = self._futs.get(_key(bbox, width, height))
+        return fut is not None and fut.done() and not fut.cancelled()
+
+    def cancel(self, owner: str):
+        with self._lock:
+            self._retain_locked(owner, set())
+
+    def _retain_locked(self, owner: str, keep: set):
+        old = self._owners.get(owner, set())
+        for k in old - keep:
+            # başka oturum da istiyorsa dokunma
+            if any(k in ks for o, ks in self._owners.items() if o != owner):
+                continue
+            fut = self._futs.get(k)
+            if fut is not None and fut.cancel():
+                del self._futs[k]
+        self._owners[owner] = old & keep
+
+    def _trim_locked(self):
+        # biten sonuçlar bellekte sınırlı tutulur (en eski önce)
+        done = [k for k, f in self._futs.items() if f.done()]
+        while len(self._futs) > self._max_ready and done:
+            k = done.pop(0)
+            del self._futs[k]
+            for ks in self._owners.values():
+                ks.discard(k)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: tahliye kilidi olmadan da güvenli (os.replace atomik)
+    fcntl = None
+
+CACHE_DIR = os.environ.get("TURKELLER_RASTER_CACHE", ".raster_cache")
+MAX_BYTES = int(os.environ.get("TURKELLER_RASTER_CACHE_MB", "1024")) * 1024 * 1024
+
+def raster_key(bbox: list[float], width: int, height: int, evalscript: str, collection: str, **extra) -> str:
+    # token anahtara girmez: token yenilense de raster aynı kalır
+    spec = {
+        "bbox": [round(float(v), 9) for v in bbox],
+        "width": int(width),
+        "height": int(height),
+        "evalscript": " ".join(evalscript.split()),
+        "collection": collection,
+    }
+    spec.update(extra)
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _path(key: str, cache_dir: str | None = None) -> str:
+    return os.path.join(cache_dir or CACHE_DIR, key[:2], key + ".npy")
+
+@contextmanager
+def _lock(cache_dir: str):
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, ".lock"), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def get(key: str, cache_dir: str | None = None):
+    p = _path(key, cache_dir)
+    try:
+        arr = np.load(p, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # yarım/bozuk dosya: sil, yeniden çekilsin
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+        return None
+    try:
+        os.utime(p)  # LRU: son erişim zamanı
+    except OSError:
+        pass
+    return arr
+
+def put(key: str, arr: np.ndarray, cache_dir: str | None = None, max_bytes: int | None = None, trim: bool = True):
+    # trim=False: çok sayıda küçük yazımda (ızgara hücreleri) tahliye bir kez, sonda çağrılır
+    cache_dir = cache_dir or CACHE_DIR
+    p = _path(key, cache_dir)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    tmp = f"{p}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(arr, dtype=_dtype(arr.dtype)))
+    # aynı anahtarı yazan başka süreç varsa son yazan kazanır; içerik aynı
+    os.replace(tmp, p)
+    # memmap tahliyeden önce açılır: tek raster sınırdan büyükse ya da başka süreç arada
+    # tahliye ederse dosya silinse de dönen dizi geçerli kalır
+    arr = np.load(p, mmap_mode="r")
+    if trim:
+        evict(cache_dir, MAX_BYTES if max_bytes is None else max_bytes, keep=p)
+    return arr
+
+def _dtype(dtype) -> np.dtype:
+    # nicemlenmiş dB (uint16) olduğu gibi saklanır: diskte yarı boyut
+    return np.dtype(np.uint16) if dtype == np.uint16 else np.dtype(np.float32)
+
+def put_into(key: str, shape, dtype, fill, cache_dir: str | None = None, max_bytes: int | None = None):
+    # fill(out) diziyi doğrudan .npy memmap'ine yazar: decode → disk, bellekte ara dizi yok
+    cache_dir = cache_dir or CACHE_DIR
+    p = _path(key, cache_dir)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    tmp = f"{p}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=_dtype(dtype), shape=tuple(shape))
+        fill(out)
+        out.flush()
+        del out
+        os.replace(tmp, p)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    arr = np.load(p, mmap_mode="r")
+    evict(cache_dir, MAX_BYTES if max_bytes is None else max_bytes, keep=p)
+    return arr
+
+def evict(cache_dir: str | None = None, max_bytes: int | None = None, keep: str | None = None):
+    # keep: az önce yazılan dosya, sınırı tek başına aşsa da silinmez
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    with _lock(cache_dir):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(cache_dir):
+            for fn in files:
+                if not fn.endswith(".npy"):
+                    continue
+                fp = os.path.join(root, fn)
+                try:
+                    info = os.stat(fp)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, fp))
+                total += info.st_size
+        if total <= max_bytes:
+            return 0
+        removed = 0
+        for _, size, fp in sorted(entries):
+            if total <= max_bytes:
+                break
+            if fp == keep:
+                continue
+            try:
+                # POSIX'te açık memmap'ler silmeden etkilenmez
+                os.remove(fp)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+_flights = {}  # anahtar -> [kilit, bekleyen sayısı]
+_flights_lock = threading.Lock()
+
+@contextmanager
+def _single_flight(key: str):
+    # süreç geneli anahtar kilidi: aynı rasteri eşzamanlı isteyen oturumlardan yalnız biri çeker
+    with _flights_lock:
+        ent = _flights.setdefault(key, [threading.Lock(), 0])
+        ent[1] += 1
+    try:
+        with ent[0]:
+            yield
+    finally:
+        with _flights_lock:
+            ent[1] -= 1
+            if ent[1] == 0:
+                del _flights[key]
+
+def _get_or_miss(key: str, cache_dir: str | None, miss):
+    arr = get(key, cache_dir)
+    if arr is not None:
+        metrics.count("cache.raster.hit")
+        return arr
+    with _single_flight(key):
+        # kilidi beklerken ilk çeken yazmış olabilir; hata cache'lenmez, sıradaki yeniden dener
+        arr = get(key, cache_dir)
+        if arr is not None:
+            metrics.count("cache.raster.wait")
+            return arr
+        metrics.count("cache.raster.miss")
+        return miss()
+
+def get_or_fetch(key: str, fetch, cache_dir: str | None = None):
+    return _get_or_miss(key, cache_dir, lambda: put(key, fetch(), cache_dir))
+
+def get_or_decode(key: str, fetch_bytes, layout, decode, cache_dir: str | None = None):
+    # fetch_bytes() → ham yanıt; layout(raw) → (shape, dtype); decode(raw, out) memmap'e çözer
+    def miss():
+        raw = fetch_bytes()
+        shape, dtype = layout(raw)
+        return put_into(key, shape, dtype, lambda out: decode(raw, out=out), cache_dir)
+    return _get_or_miss(key, cache_dir, miss)
@@ -0,0 +1,224 @@
+import hashlib
+import math
+import re
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+
+from utils import maptiles
+
+# ekran sınıfına göre en uzun kenar (px); büyük ızgaralar bloklanarak buna indirilir
+LOD = {
+    "mobile": {"heatmap": 200, "surface": 80},
+    "desktop": {"heatmap": 512, "surface": 160},
+}
+_MOBILE_RE = re.compile(r"Mobi|Android|iPhone|iPad|iPod", re.I)
+_FIG_CACHE_MAX = 16
+
+_fig_lock = threading.Lock()
+_fig_cache = OrderedDict()
+
+def device_class(headers) -> str:
+    # tarayıcı viewport'u sunucuya gelmez: User-Agent ile telefon/masaüstü ayrımı
+    ua = ""
+    try:
+        ua = (headers or {}).get("User-Agent") or ""
+    except Exception:
+        pass
+    return "mobile" if _MOBILE_RE.search(ua) else "desktop"
+
+def lod_factor(shape, max_px: int) -> int:
+    return max(1, math.ceil(max(shape) / max(int(max_px), 1)))
+
+def block_reduce(a: np.ndarray, f: int, how: str = "mean", center: float | None = None) -> np.ndarray:
+    # f×f bloklar; kenar bloklar NaN dolgulu (kısmi blok yalnız kendi pikselleriyle)
+    # how: mean | max | extreme (merkezden en uzak değer: hem tepe hem çukur korunur)
+    if f <= 1:
+        return a
+    H, W = a.shape
+    ny, nx = -(-H // f), -(-W // f)
+    is_bool = a.dtype == bool
+    src = a.astype(np.float32) if (is_bool or a.dtype.kind != "f") else a
+    pad = np.full((ny * f, nx * f), np.nan, dtype=src.dtype)
+    pad[:H, :W] = src
+    blocks = pad.reshape(ny, f, nx, f).transpose(0, 2, 1, 3).reshape(ny, nx, f * f)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if how == "mean":
+            out = np.nanmean(blocks, axis=-1)
+        elif how == "max":
+            out = np.nanmax(blocks, axis=-1)
+        elif how == "extreme":
+            c = np.nanmedian(src) if center is None else center
+            dev = np.abs(blocks - c)
+            dev[np.isnan(dev)] = -1.0
+            out = np.take_along_axis(blocks, dev.argmax(axis=-1)[..., None], axis=-1)[..., 0]
+        else:
+            raise ValueError(f"Bilinmeyen indirgeme: {how}")
+    return (out > 0) if is_bool else out.astype(a.dtype, copy=False)
+
+def block_axis(v: np.ndarray, f: int) -> np.ndarray:
+    # blok merkezlerinin koordinatı
+    if f <= 1:
+        return v
+    n = -(-len(v) // f)
+    pad = np.full(n * f, np.nan)
+    pad[:len(v)] = v
+    return np.nanmean(pad.reshape(n, f), axis=1)
+
+def _fig_key(kind: str, r, *parts) -> str:
+    # içerik anahtarı: her rerun'da yeniden hesaplanan aynı sonuç da cache'ten gelir
+    h = hashlib.blake2b(digest_size=16)
+    h.update(kind.encode())
+    h.update(np.ascontiguousarray(r.Z_db_clip).data)
+    h.update(np.ascontiguousarray(r.posneg).data)
+    h.update(np.ascontiguousarray(r.xs).data)
+    h.update(np.ascontiguousarray(r.ys).data)
+    h.update(repr(parts).encode())
+    return h.hexdigest()
+
+def _cached(key: str, build):
+    with _fig_lock:
+        fig = _fig_cache.get(key)
+        if fig is not None:
+            _fig_cache.move_to_end(key)
+            return fig
+    fig = build()
+    with _fig_lock:
+        _fig_cache[key] = fig
+        while len(_fig_cache) > _FIG_CACHE_MAX:
+            _fig_cache.popitem(last=False)
+    return fig
+
+def _topn_trace(top: list[dict]):
+    # TopN işaretleri tek trace'te (öğe başına trace yerine)
+    return go.Scatter(
+        x=np.array([t["target_lon"] for t in top]),
+        y=np.array([t["target_lat"] for t in top]),
+        mode="markers+text",
+        text=[f"#{i}" for i in range(1, len(top) + 1)],
+        textposition="top center",
+        marker=dict(size=10, color=["red" if t["type"] == "POS" else "deepskyblue" for t in top]),
+        name="TopN",
+    )
+
+def _mask_contour(mask: np.ndarray, xs, ys, color: str, name: str):
+    return go.Contour(
+        z=mask.view(np.uint8),
+        x=xs,
+        y=ys,
+        showscale=False,
+        contours=dict(start=0.5, end=0.5, size=1, coloring="fill"),
+        colorscale=[[0.0, "rgba(0,0,0,0)"], [1.0, "rgba(255,255,255,0.92)"]],
+        line=dict(width=2, color=color),
+        hoverinfo="skip",
+        name=name,
+    )
+
+def heatmap_figure(r, top: list[dict], device: str = "desktop", focus: tuple | None = None,
+                   overlays: bool = True, height: int = 520, title: str | None = None):
+    # focus: (lat, lon, etiket) ya da None
+    f = lod_factor(r.shape, LOD[device]["heatmap"])
+
+    def build():
+        xs, ys = block_axis(r.xs, f), block_axis(r.ys, f)
+        fig = go.Figure()
+        # zemin blok ortalaması; maskeler blok max → küçük anomali de görünür kalır
+        fig.add_trace(go.Heatmap(
+            z=block_reduce(r.Z_db_clip, f, "mean"),
+            x=xs,
+            y=ys,
+            colorbar=dict(title=f"{r.extra.get('band', 'VV')} (dB)"),
+            name=r.extra.get("band", "VV"),
+        ))
+        if overlays:
+            pos, neg = r.pos_mask, r.neg_mask
+            if np.any(pos):
+                fig.add_trace(_mask_contour(block_reduce(pos, f, "max"), xs, ys, "red", "POS"))
+            if np.any(neg):
+                fig.add_trace(_mask_contour(block_reduce(neg, f, "max"), xs, ys, "deepskyblue", "NEG"))
+        if top:
+            fig.add_trace(_topn_trace(top))
+        if focus is not None:
+            fig.add_trace(go.Scatter(
+                x=[focus[1]],
+                y=[focus[0]],
+                mode="markers+text",
+                text=[f"ODAK {focus[2] or ''}"],
+                textposition="bottom center",
+                marker=dict(size=16, symbol="x", color="yellow"),
+                name="Odak",
+            ))
+        fig.update_layout(
+            height=height,
+            margin=dict(l=0, r=0, t=30, b=0),
+            xaxis_title="Boylam",
+            yaxis_title="Enlem",
+            title=title,
+        )
+        return fig
+
+    tops = tuple((t["target_lat"], t["target_lon"], t["type"]) for t in top)
+    return _cached(_fig_key("heatmap", r, r.extra.get("band"), device, f, focus, overlays, height, title, tops), build), f
+
+def surface_figure(r, device: str = "desktop", height: int = 520):
+    f = lod_factor(r.shape, LOD[device]["surface"])
+
+    def build():
+        # yüzeyde tepe/çukur kaybolmasın: blok içinde medyandan en uzak değer
+        z = block_reduce(r.Z_db_clip, f, "extreme")
+        fig = go.Figure(data=[go.Surface(z=z, x=block_axis(r.xs, f), y=block_axis(r.ys, f))])
+        fig.update_layout(height=height, margin=dict(l=0, r=0, t=30, b=0))
+        return fig
+
+    return _cached(_fig_key("surface", r, device, f, height), build), f
+
+def _map_zoom(bbox, px: int = 640) -> float:
+    # kapsam ~px genişliğe sığsın (Web Mercator, 256 px karo)
+    w = max(bbox[2] - bbox[0], 1e-9)
+    return float(np.clip(math.log2(360.0 * px / (256.0 * w)) - 0.3, 0, 22))
+
+def overlay_map_figure(r, top: list[dict], device: str = "desktop", tile_url: str | None = None,
+                       height: int = 520):
+    # gerçek altlık üzerinde POS/NEG katmanı: karo sunucusu varsa XYZ (her zoomda yeniden örneklenir),
+    # yoksa kapsamın tek PNG'si (NumPy LUT; matplotlib/figür kurulmaz)
+    lid = maptiles.register(r) if tile_url else maptiles.layer_id(r)
+
+    def build():
+        b = r.bbox
+        if tile_url:
+            layer = dict(sourcetype="raster", source=[f"{tile_url}/{lid}/{{z}}/{{x}}/{{y}}.png"],
+                         sourceattribution="Sentinel-1 z", opacity=0.9)
+        else:
+            rgba = maptiles.render_extent(r, LOD[device]["heatmap"] * 2)
+            layer = dict(sourcetype="image", source=maptiles.png_data_uri(rgba), opacity=0.9,
+                         coordinates=[[b[0], b[3]], [b[2], b[3]], [b[2], b[1]], [b[0], b[1]]])
+        fig = go.Figure()
+        if top:
+            fig.add_trace(go.Scattermap(
+                lon=[t["target_lon"] for t in top],
+                lat=[t["target_lat"] for t in top],
+                mode="markers+text",
+                text=[f"#{i}" for i in range(1, len(top) + 1)],
+                textposition="top center",
+                marker=dict(size=10, color=["red" if t["type"] == "POS" else "deepskyblue" for t in top]),
+                name="TopN",
+            ))
+        fig.update_layout(
+            height=height,
+            margin=dict(l=0, r=0, t=0, b=0),
+            map=dict(
+                style="open-street-map",
+                center=dict(lon=(b[0] + b[2]) / 2, lat=(b[1] + b[3]) / 2),
+                zoom=_map_zoom(b),
+                layers=[layer],
+            ),
+            showlegend=False,
+        )
+        return fig
+
+    tops = tuple((t["target_lat"], t["target_lon"], t["type"]) for t in top)
+    return _cached(_fig_key("map", r, lid, device, tile_url, height, tops), build)
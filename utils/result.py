@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field, fields
+
+import numpy as np
+
+# kalıcı kopyaya (iş pickle'ı) girmeyen ek alanlar: gerekince yeniden kurulur
+TRANSIENT_EXTRA = ("tree",)
+
+def grid_axes(bbox: list[float], width: int, height: int):
+    # piksel merkezleri, Process API rasterı ile aynı yerleşim: satır 0 → kuzey (bbox[3]), sütun 0 → batı (bbox[0])
+    dx = (bbox[2] - bbox[0]) / width
+    dy = (bbox[3] - bbox[1]) / height
+    return (
+        bbox[0] + (np.arange(width) + 0.5) * dx,
+        bbox[3] - (np.arange(height) + 0.5) * dy,
+    )
+
+@dataclass(slots=True, eq=False)
+class AnalysisResult:
+    # ızgara 1D eksenlerle (W + H değer) tutulur; X/Y meshgrid yalnız istenince üretilir
+    bbox: list[float]
+    xs: np.ndarray
+    ys: np.ndarray
+    Z_db_clip: np.ndarray  # float32
+    Z_z: np.ndarray        # float32
+    posneg: np.ndarray     # int8: +1 POS, -1 NEG, 0 arka plan
+    labels: np.ndarray     # int32 bileşen etiketleri (0 = yok)
+    components: np.ndarray
+    ranked: list[dict]
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def shape(self):
+        return self.Z_z.shape
+
+    @property
+    def transform(self):
+        # afin (piksel merkezi): lon = x0 + c·dx, lat = y0 + r·dy; satır 0 kuzey → dy < 0
+        dx = (self.xs[-1] - self.xs[0]) / (len(self.xs) - 1) if len(self.xs) > 1 else 0.0
+        dy = (self.ys[-1] - self.ys[0]) / (len(self.ys) - 1) if len(self.ys) > 1 else 0.0
+        return float(self.xs[0]), float(dx), float(self.ys[0]), float(dy)
+
+    def lonlat(self, r, c):
+        return self.xs[c], self.ys[r]
+
+    @property
+    def pos_mask(self):
+        return self.posneg > 0
+
+    @property
+    def neg_mask(self):
+        return self.posneg < 0
+
+    @property
+    def X(self):
+        return np.broadcast_to(self.xs[None, :], self.shape)
+
+    @property
+    def Y(self):
+        return np.broadcast_to(self.ys[:, None], self.shape)
+
+    # eski dict API'si: r["Z_z"], r["X"], r["n_acq"] ...
+    def __getitem__(self, key: str):
+        if key in self.extra:
+            return self.extra[key]
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value):
+        self.extra[key] = value
+
+    def __contains__(self, key: str):
+        return key in self.extra or hasattr(self, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getstate__(self):
+        state = {f.name: getattr(self, f.name) for f in fields(self)}
+        state["extra"] = {k: v for k, v in self.extra.items() if k not in TRANSIENT_EXTRA}
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            object.__setattr__(self, k, v)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.xs, self.ys, self.Z_db_clip, self.Z_z, self.posneg, self.labels, self.components))
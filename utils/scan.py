@@ -0,0 +1,152 @@
+from utils import metrics
+from utils.analysis import bbox_from_latlon, run_analysis_from_array
+from utils.archive import save_scan
+from utils.cdse import fetch_s1_array, fetch_s1_stack
+from utils.pipeline import get_stage_cache
+from utils.prefetch import refine_bbox, refine_cap
+from utils.storage import append_history, find_repeats
+from utils.temporal import run_temporal_scan
+from utils.tiling import run_tiled_scan
+
+# refine ön çekimi: en fazla bu kadar aday
+REFINE_PREFETCH_K = 3
+
+def analysis_params(p: dict) -> dict:
+    # formdan gelen parametrelerin analiz fonksiyonlarına giden kısmı
+    return dict(
+        clip_lo=p["clip_lo"], clip_hi=p["clip_hi"],
+        smooth_on=p["smooth_on"], smooth_k=int(p["smooth_k"]),
+        z_mode=p["z_mode"], thr=float(p["thr"]),
+        posneg=bool(p["posneg"]),
+        smooth_kind=p["smooth_kind"],
+        topn=int(p["topn"]),
+    )
+
+def run_scan(job, p: dict, token_fn, sched, debug: bool = False) -> dict:
+    # çekim → analiz → (refine çekimi → analiz) → kayıt; iş kuyruğunda çalışır, Streamlit'e dokunmaz
+    with metrics.trace("analysis", track_memory=debug) as tr:
+        out = _scan(job, p, token_fn, sched)
+    out["trace"] = tr.to_dict()
+    return out
+
+def _scan(job, p: dict, token_fn, sched) -> dict:
+    notes = []
+    job.set_stage("token", 0.02, "Kimlik doğrulanıyor...")
+    token = token_fn()
+    # raster aynıysa (disk cache) yalnız değişen parametrenin alt aşamaları yeniden hesaplanır
+    cache = get_stage_cache()
+    ap = analysis_params(p)
+    lat, lon, res = p["lat"], p["lon"], int(p["res"])
+    cap_m = int(p["cap_m"])
+    # geniş alan ve zaman serisi tek bant (VV) çalışır
+    pol = "VV" if (p["tiled"] or p["temporal"]) else p["pol"]
+    dual = pol != "VV"
+    # eşik ağacı yalnız kalıcılık sıralamasında peşin; canlı slider kendisi kurar
+    sweep = p["rank_by"] == "stability"
+    if pol != p["pol"]:
+        notes.append(("info", "Geniş alan / zaman serisi yalnız VV ile çalışır; polarizasyon seçimi uygulanmadı."))
+
+    # 1) geniş tarama
+    if p["tiled"]:
+        # km ölçeğinde alan: döşemeler paralel çekilir, tek mozaikte analiz edilir
+        bbox1 = bbox_from_latlon(lat, lon, p["wide_cap"])
+        job.set_stage("fetch", 0.05, "Döşemeler çekiliyor...")
+        r1 = run_tiled_scan(
+            fetch_s1_array, token, bbox1, float(p["px_m"]),
+            ap["clip_lo"], ap["clip_hi"], ap["smooth_on"], ap["smooth_k"], ap["z_mode"], ap["thr"], ap["posneg"],
+            smooth_kind=ap["smooth_kind"], topn=ap["topn"], cache=cache,
+            on_tile=lambda done, total, _t: job.set_progress(0.05 + 0.6 * done / total, f"Döşeme {done}/{total}"),
+        )
+        cap_m = int(p["wide_cap"])
+    elif p["temporal"]:
+        # N geçiş akış halinde indirgenir; analiz zamansal kompozit üzerinde
+        bbox1 = bbox_from_latlon(lat, lon, cap_m)
+        job.set_stage("fetch", 0.05, "Geçişler çekiliyor...")
+        r1 = run_temporal_scan(
+            fetch_s1_array, token, bbox1, res, res, [tuple(s) for s in p["slices"]], p["composite"],
+            ap["clip_lo"], ap["clip_hi"], ap["smooth_on"], ap["smooth_k"], ap["z_mode"], ap["thr"], ap["posneg"],
+            smooth_kind=ap["smooth_kind"], topn=ap["topn"], cache=cache,
+            on_slice=lambda done, total: job.set_progress(0.05 + 0.6 * done / total, f"Geçiş {done}/{total}"),
+        )
+        notes.append(("caption", f"⏱️ {r1.extra['n_acq']} geçiş işlendi ({p['composite_label']})."))
+    else:
+        bbox1 = bbox_from_latlon(lat, lon, cap_m)
+        job.set_stage("fetch", 0.1, "Veri çekiliyor...")
+        # çift-pol: VV, VH, dataMask tek istekte (yığın)
+        Z1 = (fetch_s1_stack if dual else fetch_s1_array)(token, bbox1, res, res)
+        job.set_stage("analyse", 0.45, "Analiz ediliyor...")
+        r1 = run_analysis_from_array(Z1, bbox1, **ap, cache=cache, sweep=sweep, rank_by=p["rank_by"], pol=pol)
+    topN1 = r1.ranked[: ap["topn"]]
+
+    used_r = r1
+    refined = False
+    cap_used = cap_m
+
+    # sıralama hazır: TopK refine rasterları arka planda çekilmeye başlar
+    # zaman serisinde refine tek geçişle yapılmaz (kompozitle karşılaştırılamaz)
+    can_refine = not p["temporal"]
+    prefetch_bboxes = [refine_bbox(t, cap_m) for t in topN1[:REFINE_PREFETCH_K]] if (can_refine and cap_m > 25) else []
+    sched.schedule(p["owner"], token, prefetch_bboxes, res, res)
+
+    # 2) oto refine
+    if p["auto_refine"] and can_refine and len(topN1) > 0 and cap_m > 25:
+        cap2 = refine_cap(cap_m)
+        bbox2 = refine_bbox(topN1[0], cap_m)
+        job.set_stage("refine.fetch", 0.7, "Refine verisi çekiliyor...")
+        Z2 = sched.get(token, bbox2, res, res)
+        job.set_stage("refine.analyse", 0.85, "Refine analizi...")
+        used_r = run_analysis_from_array(Z2, bbox2, **ap, cache=cache, sweep=sweep, rank_by=p["rank_by"], pol=pol)
+        refined = True
+        cap_used = int(cap2)
+        notes.append(("success", f"✅ Oto Refine: Top1 merkezine {cap2}m ile tekrar tarandı."))
+
+    topN = used_r.ranked[: ap["topn"]]
+    if used_r.extra.get("rank_by", p["rank_by"]) != p["rank_by"]:
+        notes.append(("warning", used_r.extra.get("rank_note")
+                      or "Bu tarama türünde kalıcılık hesaplanmaz; skora göre sıralandı."))
+    if "thr_level" in used_r.extra:
+        notes.append(("caption", f"Kalıcılık için eşik ağaç seviyesine oturtuldu: z ≥ {used_r.extra['thr_level']:.1f}"))
+    # "Anomaliye Git" refine'ları: listelenen adaylar da ön çekime eklenir
+    focus_cap = cap_used if refined else cap_m
+    if can_refine:
+        prefetch_bboxes += [refine_bbox(t, focus_cap) for t in topN[:REFINE_PREFETCH_K]]
+        sched.schedule(p["owner"], token, prefetch_bboxes, res, res)
+
+    # kayıt öncesi: her hedef daha önce görülmüş bir anomaliyi tekrar ediyor mu?
+    job.set_stage("history", 0.95, "Kaydediliyor...")
+    repeats = find_repeats(topN, p["near_m"])
+    with metrics.span("history.append"):
+        scan_id = append_history(
+            name=p["name"],
+            lat=float(lat),
+            lon=float(lon),
+            cap_m=int(cap_used),
+            thr=float(p["thr"]),
+            z_mode=p["z_mode"],
+            top=topN[: min(len(topN), 10)],
+        )
+    refine_params = dict(ap, sweep=sweep, rank_by=p["rank_by"], pol=pol)
+    if p.get("archive", True):
+        # geçmişten yeniden açma: rasterlar + sıralama diskte (CDSE'ye ve analize gerek kalmaz)
+        job.set_stage("archive", 0.97, "Rasterlar arşivleniyor...")
+        try:
+            save_scan(scan_id, used_r, {
+                "name": p["name"],
+                "params": {k: p[k] for k in ("thr", "z_mode", "rank_by", "topn", "res", "near_m")},
+                "can_refine": can_refine, "focus_cap": focus_cap, "refine_params": refine_params,
+            })
+        except Exception as e:
+            # arşiv isteğe bağlı: sonuç ve geçmiş kaydı yine döner
+            metrics.count("archive.error")
+            notes.append(("warning", f"Rasterlar arşivlenemedi: {e}"))
+    return {
+        "scan_id": scan_id,
+        "r": used_r,
+        "pol": pol,
+        "dual": dual,
+        "can_refine": can_refine,
+        "focus_cap": focus_cap,
+        "repeats": repeats,
+        "notes": notes,
+        "refine_params": refine_params,
+    }
@@ -0,0 +1,116 @@
+import numpy as np
+
+from utils.labeling import NEG
+
+COMPONENT_DTYPE = np.dtype([
+    ("type", "U3"),
+    ("score", "f8"),
+    ("peak_z", "f8"),
+    ("area", "i8"),
+    ("fill", "f8"),
+    ("rmin", "i8"), ("rmax", "i8"), ("cmin", "i8"), ("cmax", "i8"),
+    ("peak_r", "i8"), ("peak_c", "i8"),
+    ("target_lat", "f8"),
+    ("target_lon", "f8"),
+    ("rel_depth", "f8"),
+    ("stability", "i4"),  # eşik taramasında ayrı bileşen kaldığı seviye sayısı (0 = hesaplanmadı)
+])
+
+def weighted_peak_centers(peak_r, peak_c, Zz: np.ndarray, xs: np.ndarray, ys: np.ndarray, win: int = 1):
+    # tüm tepeler için |z| ağırlıklı merkez; pencere kenarda kırpılır (meshgrid yok)
+    H, W = Zz.shape
+    peak_r = np.asarray(peak_r, dtype=np.int64)
+    peak_c = np.asarray(peak_c, dtype=np.int64)
+    n = peak_r.size
+    sw = np.zeros(n); sy = np.zeros(n); sx = np.zeros(n)
+    for dr in range(-win, win + 1):
+        r = peak_r + dr
+        rok = (r >= 0) & (r < H)
+        r = np.clip(r, 0, H - 1)
+        for dc in range(-win, win + 1):
+            c = peak_c + dc
+            ok = rok & (c >= 0) & (c < W)
+            c = np.clip(c, 0, W - 1)
+            w = np.where(ok, np.abs(Zz[r, c]).astype(np.float64), 0.0)
+            sw += w
+            sy += w * ys[r]
+            sx += w * xs[c]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lat = np.where(sw <= 1e-12, ys[peak_r], sy / sw)
+        lon = np.where(sw <= 1e-12, xs[peak_c], sx / sw)
+    return lat, lon
+
+def score_components(stats: dict, Zz: np.ndarray, xs: np.ndarray, ys: np.ndarray, win: int = 1):
+    # label_posneg istatistiklerinden tüm bileşenleri tek seferde puanla
+    n = len(stats["area"])
+    out = np.zeros(n, dtype=COMPONENT_DTYPE)
+    if n == 0:
+        return out
+    W = Zz.shape[1]
+    area = stats["area"].astype(np.int64)
+    signed_peak = stats["peak_val"].astype(np.float64)
+    peak_abs = np.abs(signed_peak)
+    bbox_area = (stats["rmax"] - stats["rmin"] + 1) * (stats["cmax"] - stats["cmin"] + 1)
+    fill = np.where(bbox_area > 0, area / np.maximum(bbox_area, 1), 0.0)
+    peak_r, peak_c = np.divmod(stats["peak_idx"], W)
+    lat, lon = weighted_peak_centers(peak_r, peak_c, Zz, xs, ys, win=win)
+
+    out["type"] = np.where(stats["cls"] == NEG, "NEG", "POS")
+    out["score"] = peak_abs * np.log1p(area) * (0.6 + 0.8 * fill)
+    out["peak_z"] = signed_peak
+    out["area"] = area
+    out["fill"] = fill
+    for k in ("rmin", "rmax", "cmin", "cmax"):
+        out[k] = stats[k]
+    out["peak_r"] = peak_r
+    out["peak_c"] = peak_c
+    out["target_lat"] = lat
+    out["target_lon"] = lon
+    # estimate_relative_depth ile aynı: sqrt(alan) / |tepe|
+    out["rel_depth"] = np.sqrt(np.maximum(area, 1)) / np.maximum(peak_abs, 1e-6)
+    return out
+
+def top_n(comps: np.ndarray, n: int | None = None, by: str = "score"):
+    # skora göre azalan; n verilirse yalnız ilk n kısmi seçimle (tam sort yok)
+    # by="stability": önce kalıcılık (eşik seviyesi sayısı), eşitlikte skor
+    if comps.size == 0:
+        return comps
+    if by == "stability":
+        idx = np.arange(comps.size)
+        idx = idx[np.lexsort((idx, comps["type"] == "NEG", -comps["score"], -comps["stability"]))]
+        return comps[idx if n is None else idx[:max(int(n), 0)]]
+    if by != "score":
+        raise ValueError(f"Bilinmeyen sıralama: {by}")
+    score = comps["score"]
+    if n is None or n >= comps.size:
+        idx = np.arange(comps.size)
+    else:
+        n = max(int(n), 0)
+        if n == 0:
+            return comps[:0]
+        idx = np.argpartition(-score, n - 1)[:n]
+    # eşit skorlarda önce POS, sonra etiket sırası (eski sıralamayla aynı)
+    idx = idx[np.lexsort((idx, comps["type"][idx] == "NEG", -score[idx]))]
+    return comps[idx]
+
+def to_records(comps: np.ndarray) -> list[dict]:
+    # main.py ve geçmiş kaydının beklediği sözlük biçimi
+    out = []
+    for c in comps:
+        out.append({
+            "type": str(c["type"]),
+            "score": float(c["score"]),
+            "peak_z": float(c["peak_z"]),
+            "area": int(c["area"]),
+            "fill": float(c["fill"]),
+            "bbox_rc": (int(c["rmin"]), int(c["rmax"]), int(c["cmin"]), int(c["cmax"])),
+            "target_lat": float(c["target_lat"]),
+            "target_lon": float(c["target_lon"]),
+            "rel_depth": float(c["rel_depth"]),
+            "stability": int(c["stability"]),
+        })
+    return out
+
+def to_dataframe(comps: np.ndarray):
+    import pandas as pd
+    return pd.DataFrame.from_records(comps)
@@ -0,0 +1,137 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+KERNELS = ("box", "gauss", "median")
+
+def _as_stack(img: np.ndarray):
+    # 2D (H,W) veya yığın (N,H,W) kabul et; içeride hep (N,H,W) float32 çalış
+    a = np.asarray(img)
+    if a.ndim == 2:
+        return a[None, ...].astype(np.float32, copy=False), True
+    if a.ndim == 3:
+        return a.astype(np.float32, copy=False), False
+    raise ValueError(f"2D veya 3D raster bekleniyor, gelen ndim={a.ndim}")
+
+def _pad_edge(a: np.ndarray, pad: int):
+    return np.pad(a, ((0, 0), (pad, pad), (pad, pad)), mode="edge")
+
+def _integral(a: np.ndarray):
+    # summed-area table; float64 ile büyük rasterlarda da yuvarlama hatası birikmez
+    n, h, w = a.shape
+    s = np.zeros((n, h + 1, w + 1), dtype=np.float64)
+    np.cumsum(a, axis=1, dtype=np.float64, out=s[:, 1:, 1:])
+    np.cumsum(s[:, 1:, 1:], axis=2, out=s[:, 1:, 1:])
+    return s
+
+def _box_from_integral(s: np.ndarray, k: int, off: int, h: int, w: int):
+    # s, kenardan `off` fazladan pad'lenmiş girdinin integrali
+    r0, c0 = off, off
+    r1, c1 = off + k, off + k
+    total = (
+        s[:, r1:r1 + h, c1:c1 + w]
+        - s[:, r0:r0 + h, c1:c1 + w]
+        - s[:, r1:r1 + h, c0:c0 + w]
+        + s[:, r0:r0 + h, c0:c0 + w]
+    )
+    return (total / (k * k)).astype(np.float32)
+
+def box_blur(img: np.ndarray, k: int = 3):
+    if k <= 1:
+        return img
+    k = int(k)
+    stack, single = _as_stack(img)
+    _, h, w = stack.shape
+    s = _integral(_pad_edge(stack, k // 2))
+    out = _box_from_integral(s, k, 0, h, w)
+    return out[0] if single else out
+
+def box_blur_multi(img: np.ndarray, ks):
+    # birden çok kernel boyutu tek integral görüntüden: çıktı (len(ks), [N,] H, W)
+    ks = [int(k) for k in ks]
+    stack, single = _as_stack(img)
+    _, h, w = stack.shape
+    pmax = max(k // 2 for k in ks) if ks else 0
+    s = _integral(_pad_edge(stack, pmax))
+    outs = []
+    for k in ks:
+        if k <= 1:
+            outs.append(stack.copy())
+        else:
+            outs.append(_box_from_integral(s, k, pmax - k // 2, h, w))
+    out = np.stack(outs, axis=0) if outs else np.empty((0,) + stack.shape, dtype=np.float32)
+    return out[:, 0] if single else out
+
+def gaussian_kernel_1d(k: int, sigma: float | None = None):
+    k = int(k)
+    if sigma is None:
+        # OpenCV ile aynı varsayılan: k'dan sigma
+        sigma = 0.3 * ((k - 1) * 0.5 - 1) + 0.8
+    x = np.arange(k, dtype=np.float64) - (k - 1) / 2.0
+    g = np.exp(-0.5 * (x / sigma) ** 2)
+    return g / g.sum()
+
+def _conv1d(a: np.ndarray, g: np.ndarray, axis: int):
+    # kaydırılmış dilimlerin ağırlıklı toplamı (kernel küçük, raster büyük)
+    k = g.size
+    n = a.shape[axis] - (k - 1)
+    out = np.zeros(a.shape[:axis] + (n,) + a.shape[axis + 1:], dtype=np.float32)
+    for i, wi in enumerate(g):
+        sl = [slice(None)] * a.ndim
+        sl[axis] = slice(i, i + n)
+        out += np.float32(wi) * a[tuple(sl)]
+    return out
+
+def gaussian_blur(img: np.ndarray, k: int = 3, sigma: float | None = None):
+    if k <= 1:
+        return img
+    k = int(k)
+    stack, single = _as_stack(img)
+    g = gaussian_kernel_1d(k, sigma)
+    pad = k // 2
+    a = _pad_edge(stack, pad)
+    if k % 2 == 0:
+        a = a[:, :-1, :-1]
+    out = _conv1d(_conv1d(a, g, axis=1), g, axis=2)
+    return out[0] if single else out
+
+def median_blur(img: np.ndarray, k: int = 3, rows_per_chunk: int = 256):
+    if k <= 1:
+        return img
+    k = int(k)
+    stack, single = _as_stack(img)
+    n, h, w = stack.shape
+    pad = k // 2
+    a = _pad_edge(stack, pad)
+    out = np.empty((n, h, w), dtype=np.float32)
+    kk = k * k
+    mid = kk // 2
+    # pencere görünümü kopyasız; tam sort yerine partition, bellek için satır bloklarıyla
+    for r0 in range(0, h, rows_per_chunk):
+        r1 = min(h, r0 + rows_per_chunk)
+        win = sliding_window_view(a[:, r0:r1 + k - 1, :w + k - 1], (k, k), axis=(1, 2))
+        win = win.reshape(n, r1 - r0, w, kk)
+        if kk % 2:
+            out[:, r0:r1] = np.partition(win, mid, axis=-1)[..., mid]
+        else:
+            part = np.partition(win, (mid - 1, mid), axis=-1)
+            out[:, r0:r1] = 0.5 * (part[..., mid - 1] + part[..., mid])
+    return out[0] if single else out
+
+def smooth(img: np.ndarray, k: int = 3, kind: str = "box"):
+    kind = (kind or "box").lower()
+    if kind.startswith("box"):
+        return box_blur(img, k)
+    if kind.startswith("gauss"):
+        return gaussian_blur(img, k)
+    if kind.startswith("med"):
+        return median_blur(img, k)
+    raise ValueError(f"Bilinmeyen smoothing türü: {kind}")
+
+def smooth_stack(stack: np.ndarray, ks, kind: str = "box"):
+    # (N,H,W) yığını × birden çok k; çıktı (len(ks), N, H, W)
+    if np.ndim(ks) == 0:
+        ks = [ks]
+    if (kind or "box").lower().startswith("box"):
+        return box_blur_multi(stack, ks)
+    stack, _ = _as_stack(stack)
+    return np.stack([smooth(stack, k, kind) if k > 1 else stack.copy() for k in ks], axis=0)
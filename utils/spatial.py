@@ -0,0 +1,112 @@
+import math
+import sqlite3
+
+# sabit global ızgara: 0.002° (~220 m enlemde); sorgu = hücre anahtarlarıyla eşitlik araması
+CELL_DEG = 0.002
+_NX = 200000  # 360 / CELL_DEG + pay
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geo_points (
+    scan_id INTEGER NOT NULL,
+    kind    TEXT NOT NULL,      -- 'scan' (tarama merkezi) | 'anomaly' (top hedefi)
+    rank    INTEGER NOT NULL,   -- anomali sırası (1..), tarama için 0
+    cell    INTEGER NOT NULL,
+    lat     REAL NOT NULL,
+    lon     REAL NOT NULL,
+    type    TEXT,
+    peak_z  REAL,
+    score   REAL
+);
+CREATE INDEX IF NOT EXISTS geo_points_cell ON geo_points (cell, kind);
+"""
+
+def _cxcy(lat: float, lon: float):
+    return int(math.floor(lon / CELL_DEG)), int(math.floor(lat / CELL_DEG))
+
+def cell_of(lat: float, lon: float) -> int:
+    cx, cy = _cxcy(lat, lon)
+    return (cy + _NX // 2) * _NX + (cx + _NX // 2)
+
+def _cells_for_bbox(lat0: float, lon0: float, lat1: float, lon1: float):
+    cx0, cy0 = _cxcy(lat0, lon0)
+    cx1, cy1 = _cxcy(lat1, lon1)
+    return [
+        (cy + _NX // 2) * _NX + (cx + _NX // 2)
+        for cy in range(cy0, cy1 + 1)
+        for cx in range(cx0, cx1 + 1)
+    ]
+
+def distance_m(lat1, lon1, lat2, lon2):
+    # kısa mesafede eşdikdörtgen yaklaşım yeterli (< 0.1% hata, birkaç km)
+    k = math.cos(math.radians(0.5 * (lat1 + lat2)))
+    dx = (lon2 - lon1) * 40075000.0 * k / 360.0
+    dy = (lat2 - lat1) * 111320.0
+    return math.hypot(dx, dy)
+
+def index_record(con: sqlite3.Connection, scan_id: int, rec: dict):
+    # append_history ile aynı işlemde: tarama merkezi + top anomaliler
+    rows = []
+    if rec.get("lat") is not None and rec.get("lon") is not None:
+        lat, lon = float(rec["lat"]), float(rec["lon"])
+        rows.append((scan_id, "scan", 0, cell_of(lat, lon), lat, lon, None, None, None))
+    for i, t in enumerate(rec.get("top") or [], start=1):
+        lat, lon = t.get("target_lat"), t.get("target_lon")
+        if lat is None or lon is None:
+            continue
+        lat, lon = float(lat), float(lon)
+        rows.append((scan_id, "anomaly", i, cell_of(lat, lon), lat, lon,
+                     t.get("type"), t.get("peak_z"), t.get("score")))
+    if rows:
+        con.executemany(
+            "INSERT INTO geo_points (scan_id, kind, rank, cell, lat, lon, type, peak_z, score) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+def _query_cells(con: sqlite3.Connection, cells, kind: str | None):
+    out = []
+    # SQLite değişken sınırı için parça parça
+    for i in range(0, len(cells), 500):
+        part = cells[i:i + 500]
+        q = (
+            "SELECT g.scan_id, g.kind, g.rank, g.lat, g.lon, g.type, g.peak_z, g.score, s.name, s.ts "
+            "FROM geo_points g JOIN scans s ON s.id = g.scan_id "
+            f"WHERE g.cell IN ({','.join('?' * len(part))})"
+        )
+        args = list(part)
+        if kind is not None:
+            q += " AND g.kind = ?"
+            args.append(kind)
+        out.extend(con.execute(q, args).fetchall())
+    return out
+
+def _as_dict(row, dist=None):
+    d = {
+        "scan_id": row[0], "kind": row[1], "rank": row[2],
+        "lat": row[3], "lon": row[4],
+        "type": row[5], "peak_z": row[6], "score": row[7],
+        "name": row[8] or "", "ts": row[9],
+    }
+    if dist is not None:
+        d["dist_m"] = dist
+    return d
+
+def query_bbox(con: sqlite3.Connection, lat0: float, lon0: float, lat1: float, lon1: float, kind: str | None = None):
+    cells = _cells_for_bbox(min(lat0, lat1), min(lon0, lon1), max(lat0, lat1), max(lon0, lon1))
+    out = []
+    for r in _query_cells(con, cells, kind):
+        if min(lat0, lat1) <= r[3] <= max(lat0, lat1) and min(lon0, lon1) <= r[4] <= max(lon0, lon1):
+            out.append(_as_dict(r))
+    return out
+
+def query_radius(con: sqlite3.Connection, lat: float, lon: float, radius_m: float, kind: str | None = None, limit: int | None = None):
+    dlat = radius_m / 111320.0
+    dlon = radius_m / (40075000.0 * max(math.cos(math.radians(lat)), 1e-6) / 360.0)
+    cells = _cells_for_bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+    out = []
+    for r in _query_cells(con, cells, kind):
+        d = distance_m(lat, lon, r[3], r[4])
+        if d <= radius_m:
+            out.append(_as_dict(r, d))
+    out.sort(key=lambda d: d["dist_m"])
+    return out[:limit] if limit else out
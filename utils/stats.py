@@ -0,0 +1,198 @@
+import math
+import warnings
+
+import numpy as np
+
+# "auto": bu kadar geçerli pikselin üstünde histogram (yaklaşık) seçim
+EXACT_MAX = 32_000_000
+HIST_BINS = 65536
+_CHUNK = 1 << 22
+MAD_K = 1.4826
+LOCAL_WIN = 32
+
+def _lerp(a, b, t):
+    # np.percentile (linear) ile aynı formül: sonuçlar birebir eşleşsin
+    out = a + (b - a) * t
+    return np.where(t >= 0.5, b - (b - a) * (1 - t), out)
+
+def _ranks(n: int, qs) -> np.ndarray:
+    return np.asarray(qs, dtype=np.float64) / 100.0 * (n - 1)
+
+def _method(n: int, method: str) -> str:
+    if method == "auto":
+        return "hist" if n > EXACT_MAX else "exact"
+    if method not in ("exact", "hist"):
+        raise ValueError(f"Bilinmeyen istatistik modu: {method}")
+    return method
+
+def _select_exact(v: np.ndarray, ranks: np.ndarray):
+    # tek partition çağrısı tüm sıra istatistiklerini yerine koyar (v yerinde değişir)
+    n = v.size
+    lo = np.floor(ranks).astype(np.intp)
+    hi = np.minimum(lo + 1, n - 1)
+    v.partition(np.unique(np.r_[lo, hi]))
+    a = v[lo].astype(np.float64)
+    b = v[hi].astype(np.float64)
+    return _lerp(a, b, ranks - lo)
+
+def _select_hist(v: np.ndarray, ranks: np.ndarray, bins: int, center: float | None = None):
+    # parça parça histogram (ek bellek sabit); hata ≤ kutu genişliği = (max - min) / bins
+    def chunks():
+        for i in range(0, v.size, _CHUNK):
+            c = v[i:i + _CHUNK]
+            yield c if center is None else np.abs(c - center)
+
+    lo, hi = math.inf, -math.inf
+    for c in chunks():
+        lo, hi = min(lo, float(c.min())), max(hi, float(c.max()))
+    if not hi > lo:
+        return np.full(len(ranks), lo), 0.0
+    w = (hi - lo) / bins
+    counts = np.zeros(bins, dtype=np.int64)
+    for c in chunks():
+        idx = ((c - lo) * (1.0 / w)).astype(np.intp)
+        np.minimum(idx, bins - 1, out=idx)
+        counts += np.bincount(idx, minlength=bins)
+    cdf = np.cumsum(counts)
+
+    def order_stat(k):
+        # k. sıra istatistiği kendi kutusunda (kutu içinde düzgün dağılım varsayımı)
+        b = np.minimum(np.searchsorted(cdf, k, side="right"), bins - 1)
+        prev = np.where(b > 0, cdf[b - 1], 0)
+        frac = np.clip((k - prev + 0.5) / np.maximum(counts[b], 1), 0.0, 1.0)
+        return lo + (b + frac) * w
+
+    # np.percentile gibi komşu iki sıra istatistiği arasında doğrusal: seyrek kuyrukta
+    # ikisi farklı kutularda olabilir, tek kutu içi interpolasyon hatayı kutu genişliğini aşırırdı
+    k = np.floor(ranks)
+    return _lerp(order_stat(k), order_stat(np.minimum(k + 1, v.size - 1)), ranks - k), w
+
+def quantiles(x: np.ndarray, qs, method: str = "auto", bins: int = HIST_BINS):
+    # NaN'sız yüzdelikler; dönüş: (değerler, hata sınırı — exact için 0)
+    v = x[~np.isnan(x)]
+    if v.size == 0:
+        return np.full(len(qs), np.nan), 0.0
+    if _method(v.size, method) == "exact":
+        return _select_exact(v, _ranks(v.size, qs)), 0.0
+    return _select_hist(v, _ranks(v.size, qs), bins)
+
+def _scale_from(v: np.ndarray, center: float, robust: bool, method: str, bins: int):
+    # v: merkezlenecek kopya (yerinde değişir); robust: 1.4826·MAD, yoksa std; ikisi de ~0 ise 1
+    n = v.size
+    if not robust:
+        sd = float(v.std(dtype=np.float64))
+        return (sd if sd > 1e-9 else 1.0), 0.0
+    if method == "exact":
+        v -= center
+        s1 = float(v.sum(dtype=np.float64))
+        np.abs(v, out=v)
+        mad = float(_select_exact(v, _ranks(n, [50.0]))[0])
+        err = 0.0
+    else:
+        mad, err = _select_hist(v, _ranks(n, [50.0]), bins, center=center)
+        mad = float(mad[0])
+    if mad > 1e-9:
+        return MAD_K * mad, MAD_K * err
+    # MAD sıfır (düz sahne): std'ye düş
+    if method == "exact":
+        var = float(np.dot(v.astype(np.float64), v.astype(np.float64))) / n - (s1 / n) ** 2
+    else:
+        var = float(v.var(dtype=np.float64))
+    sd = math.sqrt(max(var, 0.0))
+    return (sd if sd > 1e-9 else 1.0), 0.0
+
+def center_scale(x: np.ndarray, robust: bool = True, method: str = "auto", bins: int = HIST_BINS):
+    # robust: (medyan, 1.4826·MAD); klasik: (ortalama, std)
+    v = x[~np.isnan(x)]
+    if v.size == 0:
+        return {"center": math.nan, "scale": math.nan, "n": 0, "err": 0.0}
+    m = _method(v.size, method)
+    if not robust:
+        center, err = float(v.mean(dtype=np.float64)), 0.0
+    elif m == "exact":
+        center, err = float(_select_exact(v, _ranks(v.size, [50.0]))[0]), 0.0
+    else:
+        c, err = _select_hist(v, _ranks(v.size, [50.0]), bins)
+        center = float(c[0])
+    scale, serr = _scale_from(v, center, robust, m, bins)
+    return {"center": center, "scale": scale, "n": int(v.size), "err": max(err, serr)}
+
+def clip_stats(x: np.ndarray, clip_lo: float, clip_hi: float, robust: bool | None = True,
+               method: str = "auto", bins: int = HIST_BINS):
+    # tek geçiş: clip yüzdelikleri + (istenirse) clip edilmiş verinin merkez/ölçeği
+    # clip monoton olduğundan clip(x)'in sıra istatistikleri = x'in sıra istatistiklerinin clip'i
+    v = x[~np.isnan(x)]
+    if v.size == 0:
+        return {"p_lo": math.nan, "p_hi": math.nan, "center": math.nan, "scale": math.nan, "n": 0, "err": 0.0}
+    n = v.size
+    m = _method(n, method)
+    qs = [clip_lo, clip_hi, 50.0] if robust else [clip_lo, clip_hi]
+    if m == "exact":
+        ranks = _ranks(n, qs)
+        lo = np.floor(ranks).astype(np.intp)
+        hi = np.minimum(lo + 1, n - 1)
+        v.partition(np.unique(np.r_[lo, hi]))
+        a = v[lo].astype(np.float64)
+        b = v[hi].astype(np.float64)
+        p_lo, p_hi = _lerp(a[:2], b[:2], (ranks - lo)[:2])
+        err = 0.0
+        if robust:
+            center = float(_lerp(np.clip(a[2], p_lo, p_hi), np.clip(b[2], p_lo, p_hi), ranks[2] - lo[2]))
+    else:
+        vals, err = _select_hist(v, _ranks(n, qs), bins)
+        p_lo, p_hi = vals[0], vals[1]
+        if robust:
+            center = float(np.clip(vals[2], p_lo, p_hi))
+    out = {"p_lo": float(p_lo), "p_hi": float(p_hi), "n": int(n), "err": err}
+    if robust is None:
+        return out
+    np.clip(v, p_lo, p_hi, out=v)
+    if not robust:
+        center = float(v.mean(dtype=np.float64))
+    scale, serr = _scale_from(v, center, robust, m, bins)
+    out.update(center=center, scale=scale, err=max(err, serr))
+    return out
+
+def zscore(x: np.ndarray, center: float, scale: float) -> np.ndarray:
+    return (x - center) / scale
+
+def _upsample(grid: np.ndarray, H: int, W: int, b: int) -> np.ndarray:
+    # blok merkezlerinden piksellere çift doğrusal ara değer (ayrılabilir)
+    ny, nx = grid.shape
+
+    def axis(n, nb):
+        pos = np.clip((np.arange(n) + 0.5) / b - 0.5, 0, nb - 1)
+        i0 = np.floor(pos).astype(np.intp)
+        i1 = np.minimum(i0 + 1, nb - 1)
+        return i0, i1, (pos - i0).astype(np.float32)
+
+    y0, y1, ty = axis(H, ny)
+    x0, x1, tx = axis(W, nx)
+    rows = grid[y0] * (1 - ty)[:, None] + grid[y1] * ty[:, None]
+    return rows[:, x0] * (1 - tx)[None, :] + rows[:, x1] * tx[None, :]
+
+def local_center_scale(x: np.ndarray, win: int = LOCAL_WIN, method: str = "auto"):
+    # win×win bloklarda medyan/MAD, sonra piksele çift doğrusal; boş/düz bloklar global değere düşer
+    H, W = x.shape
+    b = max(4, int(win))
+    ny, nx = -(-H // b), -(-W // b)
+    g = center_scale(x, robust=True, method=method)
+    xp = np.full((ny * b, nx * b), np.nan, dtype=np.float32)
+    xp[:H, :W] = x
+    blocks = xp.reshape(ny, b, nx, b).transpose(0, 2, 1, 3).reshape(ny, nx, b * b)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # tamamen NaN bloklar
+        med = np.nanmedian(blocks, axis=-1)
+        np.subtract(blocks, med[..., None], out=blocks)
+        np.abs(blocks, out=blocks)
+        mad = np.nanmedian(blocks, axis=-1)
+    scale = MAD_K * mad
+    med = np.where(np.isnan(med), g["center"], med).astype(np.float32)
+    scale = np.where(~(scale > 1e-9), g["scale"], scale).astype(np.float32)
+    return _upsample(med, H, W, b), _upsample(scale, H, W, b)
+
+def local_robust_z(x: np.ndarray, win: int = LOCAL_WIN, method: str = "auto") -> np.ndarray:
+    if not np.any(~np.isnan(x)):
+        return x * np.nan
+    center, scale = local_center_scale(x, win, method)
+    return (x - center) / scale
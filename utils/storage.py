@@ -1,8 +1,48 @@
 import json
 import os
+import sqlite3
+import threading
 from datetime import datetime
 
-HISTORY_FILE = "scan_history.json"
+from utils import spatial
+
+HISTORY_FILE = "scan_history.json"  # eski sürüm (tüm dosya yeniden yazılıyordu) → tek seferlik taşınır
+HISTORY_DB = os.environ.get("TURKELLER_HISTORY_DB", "scan_history.db")
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    name   TEXT NOT NULL DEFAULT '',
+    ts     TEXT NOT NULL,
+    lat    REAL,
+    lon    REAL,
+    cap_m  INTEGER,
+    thr    REAL,
+    z_mode TEXT,
+    top    TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _connect() -> sqlite3.Connection:
+    # iş parçacığı başına tek bağlantı; WAL: okuyucular yazanı beklemez, yazanlar sıraya girer
+    con = getattr(_local, "con", None)
+    if con is not None and getattr(_local, "path", None) == HISTORY_DB:
+        return con
+    con = sqlite3.connect(HISTORY_DB, timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(_SCHEMA)
+    con.executescript(spatial.SCHEMA)
+    _local.con, _local.path = con, HISTORY_DB
+    _migrate_legacy(con)
+    _backfill_spatial(con)
+    return con
 
 def _read_history_raw():
     if not os.path.exists(HISTORY_FILE):
@@ -17,32 +57,114 @@ def _read_history_raw():
     except Exception:
         return []
 
+def _normalize_record(it: dict) -> dict:
+    # eski sürümlerle uyumluluk (timestamp/ts vs.)
+    ts = it.get("ts") or it.get("timestamp") or "Tarih yok"
+    lat = it.get("lat") if it.get("lat") is not None else it.get("latitude")
+    lon = it.get("lon") if it.get("lon") is not None else it.get("longitude")
+
+    return {
+        "name": it.get("name") or it.get("scan_name") or "",
+        "ts": ts,
+        "lat": lat,
+        "lon": lon,
+        "cap_m": it.get("cap_m") if it.get("cap_m") is not None else it.get("cap"),
+        "thr": it.get("thr") if it.get("thr") is not None else it.get("threshold"),
+        "z_mode": it.get("z_mode"),
+        "top": it.get("top") or [],
+    }
+
+def _migrate_legacy(con: sqlite3.Connection):
+    if not os.path.exists(HISTORY_FILE):
+        return
+    if con.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+        return
+    # IMMEDIATE: iki süreç aynı anda taşımaya kalkarsa biri bekler, sonra bayrağı görür
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if con.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone() is None:
+            rows = [_normalize_record(it) for it in _read_history_raw() if isinstance(it, dict)]
+            con.executemany(
+                "INSERT INTO scans (name, ts, lat, lon, cap_m, thr, z_mode, top) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [_row_values(r) for r in rows],
+            )
+            con.execute(
+                "INSERT INTO meta (key, value) VALUES ('legacy_migrated', ?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def _backfill_spatial(con: sqlite3.Connection):
+    # konum indeksi sonradan eklendi: mevcut kayıtlar bir kez indekslenir
+    if con.execute("SELECT 1 FROM meta WHERE key = 'spatial_v1'").fetchone():
+        return
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if con.execute("SELECT 1 FROM meta WHERE key = 'spatial_v1'").fetchone() is None:
+            con.execute("DELETE FROM geo_points")
+            for row in con.execute(f"SELECT {_COLS} FROM scans").fetchall():
+                rec = _from_row(row)
+                spatial.index_record(con, rec["id"], rec)
+            con.execute("INSERT INTO meta (key, value) VALUES ('spatial_v1', ?)", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def _row_values(r: dict):
+    return (
+        str(r.get("name") or ""),
+        str(r.get("ts") or "Tarih yok"),
+        r.get("lat"),
+        r.get("lon"),
+        r.get("cap_m"),
+        r.get("thr"),
+        r.get("z_mode"),
+        json.dumps(r.get("top") or [], ensure_ascii=False),
+    )
+
+def _from_row(row) -> dict:
+    try:
+        top = json.loads(row[8]) if row[8] else []
+    except Exception:
+        top = []
+    return {
+        "id": row[0],
+        "name": row[1] or "",
+        "ts": row[2] or "Tarih yok",
+        "lat": row[3],
+        "lon": row[4],
+        "cap_m": row[5],
+        "thr": row[6],
+        "z_mode": row[7],
+        "top": top,
+    }
+
+_COLS = "id, name, ts, lat, lon, cap_m, thr, z_mode, top"
+
 def load_history() -> list[dict]:
-    raw = _read_history_raw()
+    # tüm kayıtlar, eskiden yeniye (eski API)
+    rows = _connect().execute(f"SELECT {_COLS} FROM scans ORDER BY id").fetchall()
+    return [_from_row(r) for r in rows]
 
-    out = []
-    for it in raw:
-        if not isinstance(it, dict):
-            continue
-
-        # eski sürümlerle uyumluluk (timestamp/ts vs.)
-        ts = it.get("ts") or it.get("timestamp") or "Tarih yok"
-        lat = it.get("lat") if it.get("lat") is not None else it.get("latitude")
-        lon = it.get("lon") if it.get("lon") is not None else it.get("longitude")
-
-        out.append({
-            "name": it.get("name") or it.get("scan_name") or "",
-            "ts": ts,
-            "lat": lat,
-            "lon": lon,
-            "cap_m": it.get("cap_m") if it.get("cap_m") is not None else it.get("cap"),
-            "thr": it.get("thr") if it.get("thr") is not None else it.get("threshold"),
-            "z_mode": it.get("z_mode"),
-            "top": it.get("top") or [],
-        })
-    return out
+def latest_history(n: int = 15, offset: int = 0) -> list[dict]:
+    # sayfalı okuma: en yeniden eskiye; yalnız istenen satırlar okunur
+    rows = _connect().execute(
+        f"SELECT {_COLS} FROM scans ORDER BY id DESC LIMIT ? OFFSET ?", (int(n), int(offset))
+    ).fetchall()
+    return [_from_row(r) for r in rows]
 
-def append_history(*, name: str, lat: float, lon: float, cap_m: int, thr: float, z_mode: str, top: list[dict]):
+def history_count() -> int:
+    return int(_connect().execute("SELECT COUNT(*) FROM scans").fetchone()[0])
+
+def get_history(scan_id: int) -> dict | None:
+    row = _connect().execute(f"SELECT {_COLS} FROM scans WHERE id = ?", (int(scan_id),)).fetchone()
+    return _from_row(row) if row else None
+
+def append_history(*, name: str, lat: float, lon: float, cap_m: int, thr: float, z_mode: str, top: list[dict]) -> int:
     # None yazılmasını tamamen engelle
     rec = {
         "name": str(name or ""),
@@ -54,9 +176,33 @@ def append_history(*, name: str, lat: float, lon: float, cap_m: int, thr: float,
         "z_mode": str(z_mode),
         "top": top,
     }
+    # tek satır ekleme: geçmiş büyüse de maliyet sabit, eşzamanlı yazanlar birbirini ezmez
+    con = _connect()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        cur = con.execute(
+            "INSERT INTO scans (name, ts, lat, lon, cap_m, thr, z_mode, top) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            _row_values(rec),
+        )
+        scan_id = int(cur.lastrowid)
+        spatial.index_record(con, scan_id, rec)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return scan_id
 
-    hist = load_history()
-    hist.append(rec)
+def nearby_history(lat: float, lon: float, radius_m: float, kind: str | None = None, limit: int | None = None) -> list[dict]:
+    # kind: 'scan' | 'anomaly' | None; mesafeye göre artan
+    return spatial.query_radius(_connect(), float(lat), float(lon), float(radius_m), kind, limit)
 
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(hist, f, ensure_ascii=False, indent=2)
+def history_in_bbox(bbox: list[float], kind: str | None = None) -> list[dict]:
+    return spatial.query_bbox(_connect(), bbox[1], bbox[0], bbox[3], bbox[2], kind)
+
+def find_repeats(top: list[dict], radius_m: float) -> list[list[dict]]:
+    # her yeni anomali için aynı türden, yarıçap içindeki önceki anomaliler
+    out = []
+    for t in top:
+        hits = nearby_history(t["target_lat"], t["target_lon"], radius_m, kind="anomaly")
+        out.append([h for h in hits if h.get("type") == t.get("type")])
+    return out
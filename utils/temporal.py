@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from utils import metrics
+from utils.pipeline import StageCache
+from utils.analysis import to_db, run_analysis_from_db
+
+# yaklaşık medyan histogramı: [-35, 10] dB, 0.5 dB kutu → hata ≤ 0.5 dB (kutu içi doğrusal)
+HIST_LO_DB = -35.0
+HIST_HI_DB = 10.0
+HIST_BINS = 90
+
+COMPOSITES = ("mean", "median", "change")
+
+class StreamingStack:
+    # piksel başına Welford ortalama/varyans + sabit kutulu histogram; bellek N'den bağımsız
+    def __init__(self, shape, lo: float = HIST_LO_DB, hi: float = HIST_HI_DB, bins: int = HIST_BINS):
+        self.shape = tuple(shape)
+        self.n = np.zeros(self.shape, dtype=np.uint16)
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self.m2 = np.zeros(self.shape, dtype=np.float64)
+        self.lo, self.hi, self.bins = float(lo), float(hi), int(bins)
+        self.hist = np.zeros((self.bins,) + self.shape, dtype=np.uint16)
+        self.last = np.full(self.shape, np.nan, dtype=np.float32)
+        self._last_t = np.full(self.shape, -np.inf)
+        self.count = 0
+
+    def update(self, x_db: np.ndarray, t: float = 0.0):
+        ok = np.isfinite(x_db)
+        if not np.any(ok):
+            return
+        self.count += 1
+        x = np.where(ok, x_db, 0.0).astype(np.float64)
+        n = self.n + ok
+        delta = np.where(ok, x - self.mean, 0.0)
+        self.mean += delta / np.maximum(n, 1)
+        self.m2 += delta * np.where(ok, x - self.mean, 0.0)
+        self.n = n.astype(np.uint16)
+
+        b = np.clip(((x - self.lo) / (self.hi - self.lo) * self.bins).astype(np.int64), 0, self.bins - 1)
+        rr, cc = np.nonzero(ok)
+        self.hist[b[rr, cc], rr, cc] += 1
+
+        # "son" görüntü: zaman sırası karışık gelse de en geç tarihli piksel
+        newer = ok & (t >= self._last_t)
+        self.last[newer] = x_db[newer]
+        self._last_t[newer] = t
+
+    def variance(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.n > 1, self.m2 / (self.n.astype(np.float64) - 1), np.nan)
+
+    def mean_db(self):
+        return np.where(self.n > 0, self.mean, np.nan).astype(np.float32)
+
+    def median_db(self):
+        # kümülatif histogramda n/2 kutusu + kutu içi doğrusal interpolasyon
+        cum = np.cumsum(self.hist, axis=0, dtype=np.int32)
+        half = self.n.astype(np.float64) / 2.0
+        k = np.minimum((cum < half[None, ...]).sum(axis=0), self.bins - 1)
+        below = np.where(k > 0, np.take_along_axis(cum, np.maximum(k - 1, 0)[None, ...], 0)[0], 0)
+        inbin = np.take_along_axis(self.hist, k[None, ...], 0)[0].astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.clip(np.where(inbin > 0, (half - below) / inbin, 0.5), 0.0, 1.0)
+        width = (self.hi - self.lo) / self.bins
+        med = self.lo + (k + frac) * width
+        return np.where(self.n > 0, med, np.nan).astype(np.float32)
+
+    def change_db(self):
+        # son görüntünün zamansal dağılıma göre sapması (z benzeri)
+        sd = np.sqrt(self.variance())
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ch = (self.last - self.mean) / np.where(sd > 1e-6, sd, np.nan)
+        return ch.astype(np.float32)
+
+    def composite(self, kind: str):
+        kind = (kind or "mean").lower()
+        if kind.startswith("med"):
+            return self.median_db()
+        if kind.startswith("chan") or kind.startswith("değ"):
+            return self.change_db()
+        return self.mean_db()
+
+def time_slices(date_from, date_to, n: int):
+    # [from, to] aralığını n eşit zaman dilimine böl (ISO-8601, UTC)
+    t0 = datetime.combine(date_from, datetime.min.time(), tzinfo=timezone.utc)
+    t1 = datetime.combine(date_to, datetime.min.time(), tzinfo=timezone.utc) + timedelta(days=1)
+    n = max(1, int(n))
+    step = (t1 - t0) / n
+    out = []
+    for i in range(n):
+        a = t0 + step * i
+        b = t0 + step * (i + 1)
+        out.append((a.strftime("%Y-%m-%dT%H:%M:%SZ"), b.strftime("%Y-%m-%dT%H:%M:%SZ")))
+    return out
+
+def fetch_stack_stats(fetch, token: str, bbox: list[float], width: int, height: int, slices,
+                      max_workers: int = 4, on_slice=None):
+    # dilimler paralel çekilir ve geldikçe istatistiğe katılır; yığın hiç bellekte tutulmaz
+    stack = StreamingStack((height, width))
+    done = 0
+    fetch_b = metrics.bind(fetch)
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as ex:
+        futs = {}
+        it = iter(enumerate(slices))
+        # bekleyen iş sayısı sınırlı: sonuçlar tüketilmeden yeni raster birikmez
+        for _ in range(max(1, int(max_workers)) * 2):
+            nxt = next(it, None)
+            if nxt is None:
+                break
+            futs[ex.submit(fetch_b, token, bbox, width, height, nxt[1])] = nxt[0]
+        while futs:
+            fut = next(as_completed(futs))
+            i = futs.pop(fut)
+            # float32 doğrusal ya da uint16 nicemlenmiş dB (to_db ikisini de çözer)
+            Z = np.asarray(fut.result())
+            # veri yok → 0 döner; NaN say
+            Z_db = np.where(Z > 0, to_db(Z), np.nan)
+            stack.update(Z_db, t=float(i))
+            done += 1
+            if on_slice is not None:
+                on_slice(done, len(slices))
+            nxt = next(it, None)
+            if nxt is not None:
+                futs[ex.submit(fetch_b, token, bbox, width, height, nxt[1])] = nxt[0]
+    return stack
+
+def run_temporal_scan(
+    fetch,
+    token: str,
+    bbox: list[float],
+    width: int,
+    height: int,
+    slices,
+    composite: str,
+    clip_lo: float,
+    clip_hi: float,
+    smooth_on: bool,
+    smooth_k: int,
+    z_mode: str,
+    thr: float,
+    posneg: bool,
+    smooth_kind: str = "box",
+    topn: int | None = None,
+    cache: StageCache | None = None,
+    max_workers: int = 4,
+    on_slice=None,
+):
+    stack = fetch_stack_stats(fetch, token, bbox, width, height, slices, max_workers, on_slice)
+    if stack.count == 0:
+        raise RuntimeError("Seçilen tarih aralığında Sentinel-1 görüntüsü bulunamadı.")
+    if (composite or "").lower().startswith("chan") and stack.count < 2:
+        raise RuntimeError("Değişim haritası için en az 2 görüntü gerekli.")
+    Z_db = stack.composite(composite)
+    # kapsanmayan pikseller: integral-görüntü blur'unda NaN yayılmasın diye medyanla doldur
+    miss = ~np.isfinite(Z_db)
+    if np.any(miss):
+        Z_db[miss] = np.nanmedian(Z_db)
+    r = run_analysis_from_db(
+        Z_db, bbox, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, thr, posneg,
+        smooth_kind=smooth_kind, topn=topn, cache=cache,
+    )
+    r.extra["n_acq"] = stack.count
+    return r
@@ -0,0 +1,109 @@
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils import metrics
+from utils.pipeline import StageCache
+from utils.analysis import decode_tiff, to_db, run_analysis_from_db
+
+# Process API tek istekte en fazla 2500 px
+MAX_TILE_PX = 2500
+
+@dataclass(frozen=True)
+class Tile:
+    row: int
+    col: int
+    r0: int  # mozaikteki pencere
+    r1: int
+    c0: int
+    c1: int
+    bbox: tuple  # çekilecek bbox (lon/lat)
+    width: int
+    height: int
+
+def mosaic_shape(bbox: list[float], px_m: float):
+    # bbox'u yaklaşık px_m metre/piksel ile kaplayan ızgara boyutu
+    lat_c = 0.5 * (bbox[1] + bbox[3])
+    w_m = (bbox[2] - bbox[0]) * 40075000.0 * math.cos(math.radians(lat_c)) / 360.0
+    h_m = (bbox[3] - bbox[1]) * 111320.0
+    return max(1, int(round(h_m / px_m))), max(1, int(round(w_m / px_m)))
+
+def plan_tiles(bbox: list[float], width: int, height: int, tile_px: int = 512):
+    # analiz tüm mozaikte tek seferde yapılır: döşemeler birbirine bitişik, taşma (halo) çekilmez
+    if tile_px > MAX_TILE_PX:
+        raise ValueError(f"tile_px en fazla {MAX_TILE_PX} olabilir")
+    dx = (bbox[2] - bbox[0]) / width
+    dy = (bbox[3] - bbox[1]) / height
+    tiles = []
+    for ti, r0 in enumerate(range(0, height, tile_px)):
+        r1 = min(height, r0 + tile_px)
+        for tj, c0 in enumerate(range(0, width, tile_px)):
+            c1 = min(width, c0 + tile_px)
+            # satır 0 = kuzey: tek parça çekimdeki TIFF ile aynı yerleşim
+            tb = (
+                bbox[0] + c0 * dx,
+                bbox[3] - r1 * dy,
+                bbox[0] + c1 * dx,
+                bbox[3] - r0 * dy,
+            )
+            tiles.append(Tile(ti, tj, r0, r1, c0, c1, tb, c1 - c0, r1 - r0))
+    return tiles
+
+def paste_tile(mosaic: np.ndarray, tile: Tile, arr: np.ndarray):
+    mosaic[tile.r0:tile.r1, tile.c0:tile.c1] = arr
+
+def fetch_mosaic_db(fetch, token: str, bbox: list[float], width: int, height: int,
+                    tile_px: int = 512, max_workers: int = 4, on_tile=None):
+    # döşemeler paralel çekilir; her biri gelir gelmez decode + dB + yerine yazılır
+    tiles = plan_tiles(bbox, width, height, tile_px)
+    mosaic = np.full((height, width), np.nan, dtype=np.float32)
+    done = 0
+    fetch_b = metrics.bind(fetch)  # döşeme çekimleri çağıranın trace'ine yazılır
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as ex:
+        futs = {ex.submit(fetch_b, token, list(t.bbox), t.width, t.height): t for t in tiles}
+        try:
+            for fut in as_completed(futs):
+                t = futs[fut]
+                raw = fut.result()
+                # fetch TIFF baytı ya da çözülmüş dizi (raster cache) döndürebilir
+                Z = raw if isinstance(raw, np.ndarray) else decode_tiff(raw)
+                if Z.ndim == 3:
+                    Z = Z[..., 0]
+                paste_tile(mosaic, t, to_db(Z))
+                done += 1
+                if on_tile is not None:
+                    on_tile(done, len(tiles), t)
+        except BaseException:
+            # iptal / hatalı döşeme: sıradaki çekimler başlamaz, yalnız uçuştakiler beklenir
+            ex.shutdown(wait=False, cancel_futures=True)
+            raise
+    return mosaic
+
+def run_tiled_scan(
+    fetch,
+    token: str,
+    bbox: list[float],
+    px_m: float,
+    clip_lo: float,
+    clip_hi: float,
+    smooth_on: bool,
+    smooth_k: int,
+    z_mode: str,
+    thr: float,
+    posneg: bool,
+    smooth_kind: str = "box",
+    topn: int | None = None,
+    cache: StageCache | None = None,
+    tile_px: int = 512,
+    max_workers: int = 4,
+    on_tile=None,
+):
+    height, width = mosaic_shape(bbox, px_m)
+    Z_db = fetch_mosaic_db(fetch, token, bbox, width, height, tile_px, max_workers, on_tile)
+    # tek mozaik üzerinde global clip/z + etiketleme: dikiş yerlerinde bileşen bölünmez
+    return run_analysis_from_db(
+        Z_db, bbox, clip_lo, clip_hi, smooth_on, smooth_k, z_mode, thr, posneg,
+        smooth_kind=smooth_kind, topn=topn, cache=cache,
+    )